@@ -18,7 +18,8 @@ as long as you share them when sharing calculation results that use them.
 
 Items that are not on bazaar will have "# not in bazaar" behind the display name,
 some of these are on the auction house and have "(AH)" behind "# not in bazaar",
-these AH only items must have their custom prices updated manually,
+these AH only items are listed in ah_items and their custom prices are updated by the calculator,
+the custom prices written here are used when the auction house cannot be reached,
 custom prices for auction house only item last updated on: 2025-8-31
 
 There are a lot of unknown things here, any unknowns are written next to it in #-comments.
@@ -794,7 +795,7 @@ itemList = {"NONE": {'display': "None",  # not in bazaar (doesn't exist)
                               "prices": {},
                               "upgrade": {'speed': 35, 'drop': 1, 'duration': 0}},
             'INFERNO_FUEL': {'display': 'Inferno Minion Fuel',
-                             "prices": {"custom": 1},  # this custom price will be automatically updated by the calculator based on grade and distilate
+                             "prices": {"custom": 1},  # this custom price is replaced during each calculation based on grade and distilate
                              "upgrade": {'speed': 0, 'drop': 1, 'duration': 86400}},
             'BUDGET_HOPPER': {'display': 'Budget Hopper',
                               "prices": {"custom": 10000}},
@@ -997,6 +998,14 @@ itemList = {"NONE": {'display': "None",  # not in bazaar (doesn't exist)
             # equivalent bazaar price: Exp Share price = Exp Share Core price + 72 * Enchanted Gold price
             }
 
+# Items in itemList with a "custom" price that is taken from the auction house through https://sky.coflnet.com/api/
+# unused items and items that are cheaper to create from bazaar or NPC items are not in here
+ah_items = ['GABAGOOL_THE_FISH', 'KRAMPUS_HELMET', 'POTATO_TALISMAN',
+            'PET_ITEM_MINING_SKILL_BOOST_RARE', 'PET_ITEM_FARMING_SKILL_BOOST_UNCOMMON',
+            'PET_ITEM_FISHING_SKILL_BOOST_UNCOMMON', 'PET_ITEM_FISHING_SKILL_BOOST_RARE', 'PET_ITEM_FISHING_SKILL_BOOST_EPIC',
+            'PET_ITEM_COMBAT_SKILL_BOOST_UNCOMMON', 'PET_ITEM_COMBAT_SKILL_BOOST_RARE', 'PET_ITEM_COMBAT_SKILL_BOOST_EPIC',
+            'PET_ITEM_FORAGING_SKILL_BOOST_EPIC', 'ALL_SKILLS_SUPER_BOOST', 'POSTCARD']
+
 #%% Inferno minion List
 
 infernofuel_data = {'grades': {'HYPERGOLIC_GABAGOOL': 20, 'HEAVY_GABAGOOL': 15, 'FUEL_GABAGOOL': 10},
@@ -1665,7 +1674,7 @@ def minionCostSum(minion_type, final_tier):
             if item not in final_cost:
                 final_cost[item] = 0
             final_cost[item] += amount
-    return deepcopy(final_cost)
+    return final_cost
 
 #%% Minion Costs
 
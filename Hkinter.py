@@ -218,7 +218,7 @@ class Hk():
             var.set(initial)
         return var
 
-    def defVarI(self, dtype, frame, L_text, initial=None, options=[], cmd=None, checkbox_text=None):
+    def defVarI(self, dtype, frame, L_text, initial=None, options=[], cmd=None, checkbox_text=None, var=None):
         """
         defVarI: define variable input
         Generates a Tkinter variable, a label and an input widget.
@@ -242,6 +242,8 @@ class Hk():
             Function that runs when an option in the option menu is. The default is None.
         checkbox_text : str, optional
             Text that will be displayed next to the checkbox if dtype is bool
+        var : tk.BooleanVar, tk.IntVar, tk.StringVar or tk.DoubleVar, optional
+            Existing Tkinter variable for the input widget, its value is kept and initial is not used. None to generate a new one. The default is None.
 
         Returns
         -------
@@ -251,11 +253,14 @@ class Hk():
             List containing the label and the input widget.
 
         """
-        var = self.defVar(dtype, initial=initial)
+        new_var = var is None
+        if new_var:
+            var = self.defVar(dtype, initial=initial)
         if dtype != bool:
             if len(options) != 0:
                 entry = ttk.Combobox(frame, textvariable=var, values=options, state="readonly")
-                entry.set(initial if initial is not None else options[0])
+                if new_var:
+                    entry.set(initial if initial is not None else options[0])
                 if cmd:
                     entry.bind('<<ComboboxSelected>>', lambda event: cmd(var.get()))
             else:
@@ -267,7 +272,7 @@ class Hk():
         label = self.genLabel(frm=frame, txt=L_text)
         return var, [label, entry]
 
-    def defVarO(self, frame, dtype, L_text, initial=None):
+    def defVarO(self, frame, dtype, L_text, initial=None, var=None):
         """
         defVarO: define variable output
         Generates a Tkinter variable, a label and an variable label.
@@ -283,6 +288,8 @@ class Hk():
             String used for the label.
         initial : something of type dtype, optional
             Inital value for the Tkinter variable. Set to None for default initial value. The default is None.
+        var : tk.BooleanVar, tk.IntVar, tk.StringVar or tk.DoubleVar, optional
+            Existing Tkinter variable for the variable label, its value is kept and initial is not used. None to generate a new one. The default is None.
 
         Returns
         -------
@@ -292,12 +299,13 @@ class Hk():
             List containing the label and the variable label.
 
         """
-        var = self.defVar(dtype, initial=initial)
+        if var is None:
+            var = self.defVar(dtype, initial=initial)
         text_label = self.genLabel(frm=frame, txt=L_text)
         var_label = self.genLabel(frm=frame, txt=var, txtvar=True)
         return var, [text_label, var_label]
 
-    def defListO(self, frame, L_text, w=None, h=None):
+    def defListO(self, frame, L_text, w=None, h=None, var=None):
         """
         defListO: define list output
         Generates a Tkinter variable, a label and a list box.
@@ -313,6 +321,8 @@ class Hk():
             Width of the list box. None for default size. The default is None.
         h : int, optional
             Height of the list box. None for default size. The default is None.
+        var : tk.StringVar, optional
+            Existing Tkinter variable for the list box, its value is kept. None to generate a new one. The default is None.
 
         Returns
         -------
@@ -322,7 +332,8 @@ class Hk():
             List containing the label and the list box.
 
         """
-        var = self.defVar(str, initial=[])
+        if var is None:
+            var = self.defVar(str, initial=[])
         text_label = self.genLabel(frm=frame, txt=L_text)
         output_list = tk.Listbox(frame, listvariable=var)
         if w is not None:
@@ -354,11 +365,35 @@ class Hk():
 
         """
         for rowindex, row in enumerate(grid_arr):
-            for colindex, col in enumerate(row):
-                if col is None:
-                    self.genLabel(frm=grid_frame, txt="").grid(row=rowindex, column=colindex)
-                    continue
-                col.grid(row=rowindex, column=colindex, sticky=stick)
+            self.fill_grid_row(row, rowindex, grid_frame, stick=stick)
+        return
+
+    def fill_grid_row(self, row, rowindex, grid_frame, stick='w'):
+        """
+        Places widgets in one row of a grid, see fill_grid.
+        Can be used to fill a row that was left empty by fill_grid.
+
+        Parameters
+        ----------
+        row : list
+            1 dimensional array of widgets, None for an empty cell.
+        rowindex : int
+            Index of the row in the grid.
+        grid_frame : tk.Frame
+            Frame of the grid.
+        stick : str
+            First letter letter of a cardinal direction for which side to align the widgets to. 'n', 'e', 's', 'w'.
+
+        Returns
+        -------
+        None.
+
+        """
+        for colindex, col in enumerate(row):
+            if col is None:
+                self.genLabel(frm=grid_frame, txt="").grid(row=rowindex, column=colindex)
+                continue
+            col.grid(row=rowindex, column=colindex, sticky=stick)
         return
 
     def fill_arr(self, arr, frame, anc="w", rel_start=[0.01, 0.5], rel_next=[1, 0.5], abs_next=[10, 0]):
@@ -400,7 +435,7 @@ class Hk():
                 widget.place(in_=prev_widget, relx=rel_next[0], x=abs_next[0], rely=rel_next[1], y=abs_next[1], anchor=anc)
             prev_widget = widget
 
-    def defSwitch(self, ID, obj, loc, control=None, negate=False, initial=True):
+    def defSwitch(self, ID, obj, loc, control=None, negate=False, initial=True, build=None):
         """
         defSwitch: define switch
         Creates an entry in the switches dict used for turning widgets on and off.
@@ -430,16 +465,21 @@ class Hk():
             For widgets in a grid, it assumes that they are already placed, so initial==True would not do anything extra.
             For widgets outside a grid, it assumes that they are not placed yet, so initial==False would not do anything extra.
             The default is True.
+        build : function, optional
+            Function without arguments that makes the widgets and returns them as obj, for widgets that are only made when they are first shown.
+            Widgets in a grid should be placed in the grid by build. obj can be None if build is given. The default is None.
 
         Returns
         -------
         None.
 
         """
-        self.main.switches[ID] = {"state": initial, "obj": obj, "loc": loc, "control": control, "negate": negate}
+        if obj is None and initial is True:
+            obj = build()
+        self.main.switches[ID] = {"state": initial, "obj": obj, "loc": loc, "control": control, "negate": negate, "build": build}
         if loc != "grid" and initial is True:
             obj.place(**loc)
-        if loc == "grid" and initial is False:
+        if loc == "grid" and initial is False and obj is not None:
             for widget in obj:
                 widget.grid_remove()
         return
@@ -473,6 +513,9 @@ class Hk():
             else:
                 if state is (control == self.main.switches[ID]["control"]):
                     return
+        if self.main.switches[ID]["obj"] is None:
+            # first time the switch turns on, the widgets are made now
+            self.main.switches[ID]["obj"] = self.main.switches[ID]["build"]()
         if type(self.main.switches[ID]["obj"]) == list:
             objs = self.main.switches[ID]["obj"]
         else:
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Herodirk
+
+Benchmark of the calculation engine of the minion calculator.
+Replays a recorded Hypixel bazaar response and evaluates every minion in md.minionList with every template in templateList (see main.py).
+Reports the evaluations per second, the p50 and p99 latency of one evaluation and the peak memory,
+and compares these with a saved baseline.
+
+The committed fixture is generated from the prices in md.itemList, so the benchmark runs the same everywhere without API access.
+
+Usage:
+    python benchmark.py generate  generates the bazaar fixture from the prices in md.itemList
+    python benchmark.py record    records the bazaar fixture from the Hypixel API instead
+    python benchmark.py save      runs the benchmark and saves the results as the new baseline
+    python benchmark.py           runs the benchmark and fails if the throughput regressed past max_regression
+"""
+
+
+#%% imports
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import tracemalloc
+import contextlib
+import numpy as np
+import HSB_minion_data as md
+import minion_engine as engine
+import market_data
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+
+
+#%% Settings
+
+fixture_file = "benchmark_bazaar.json"
+# Bazaar API response that is replayed, made with "python benchmark.py generate" or "python benchmark.py record"
+fixture_seed = 2024
+# Seed of the random order books of a generated fixture
+baseline_file = "benchmark_baseline.json"
+# Results saved with "python benchmark.py save"
+max_regression = 0.1
+# Fraction of the baseline evaluations per second that may be lost before the benchmark fails
+rounds = 3
+# Amount of times every setup is evaluated, the throughput of the fastest round is reported
+
+
+#%% Benchmark
+
+def file_path(file_name):
+    """Returns the path of a file next to this file."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+
+
+def record_fixture(path):
+    """
+    Saves the current bazaar API response unchanged, to be replayed by load_fixture().
+
+    Parameters
+    ----------
+    path : str
+        Path of the fixture file.
+
+    Returns
+    -------
+    None.
+
+    """
+    fetcher = market_data.MarketFetcher("Minion Calculator benchmark (Python)", max_connections=1, timeout=main.api_timeout)
+    try:
+        response = fetcher.get(fetcher.bazaar_url)
+        with open(path, "wb") as file:
+            while chunk := response.read(65536):
+                file.write(chunk)
+    finally:
+        fetcher.close()
+    print(f"BENCHMARK: Recorded bazaar fixture in {path}")
+    return
+
+
+def generate_fixture(path, seed=fixture_seed):
+    """
+    Saves a bazaar API response with random order books around the prices in md.itemList, to be replayed by load_fixture().
+    Every item that is not only sold on the AH gets a product, and a few unknown products are added to be skipped while parsing.
+
+    Parameters
+    ----------
+    path : str
+        Path of the fixture file.
+    seed : int, optional
+        Seed of the random order books. The default is fixture_seed.
+
+    Returns
+    -------
+    None.
+
+    """
+    rng = random.Random(seed)
+    products = {}
+    unknown_IDs = [f"BENCHMARK_UNKNOWN_{index}" for index in range(20)]
+    for ID in [ID for ID in md.itemList if ID != "NONE" and ID not in md.ah_items] + unknown_IDs:
+        item_prices = md.itemList.get(ID, {"prices": {}})["prices"]
+        if "npc" in item_prices:
+            base_price = item_prices["npc"] * rng.uniform(1, 3)
+        elif "custom" in item_prices:
+            base_price = item_prices["custom"] * rng.uniform(0.8, 1.2)
+        else:
+            base_price = rng.uniform(1, 10000)
+        summaries = {}
+        # buy_summary holds the sell offers from low to high, sell_summary the buy orders from high to low
+        for summary, direction in [("buy_summary", 1), ("sell_summary", -1)]:
+            summaries[summary] = [{"amount": rng.randint(1, 2000), "pricePerUnit": round(base_price * (1 + direction * 0.01 * (order + 1)), 1), "orders": rng.randint(1, 10)}
+                                  for order in range(rng.randint(0, 6))]
+        products[ID] = {"product_id": ID, **summaries,
+                        "quick_status": {"productId": ID, "sellPrice": base_price * 0.99, "buyPrice": base_price * 1.01}}
+    with open(path, "w") as file:
+        json.dump({"success": True, "lastUpdated": 1700000000000, "products": products}, file, separators=(",", ":"))
+    print(f"BENCHMARK: Generated bazaar fixture in {path}")
+    return
+
+
+def load_fixture(path):
+    """
+    Builds a PriceSnapshot from a recorded bazaar response, in the same way as Calculator.fetch_prices().
+
+    Parameters
+    ----------
+    path : str
+        Path of the fixture file.
+
+    Returns
+    -------
+    minion_engine.PriceSnapshot
+        Prices of the recorded bazaar.
+
+    """
+    with open(path, "rb") as file:
+        raw_data = market_data.parse_bazaar(file, md.itemList)
+    if raw_data.get("success") is not True:
+        raise ValueError(f"{path} is not a successful bazaar response")
+    prices = engine.item_list_snapshot(raw_data["lastUpdated"] / 1000)
+    market_data.apply_bazaar_prices(prices, raw_data["products"], main.bazaar_top_percent)
+    return prices
+
+
+def benchmark_setups():
+    """
+    Creates the setups of the benchmark, every minion with every template.
+    Templates that set a minion are only used with that minion. The minions are on their highest tier.
+
+    Returns
+    -------
+    list
+        Setups for minion_engine.evaluate().
+
+    """
+    setups = []
+    for template_name, template in main.templateList.items():
+        if template_name == "ID":
+            # loads a setup ID, not a setup
+            continue
+        minions = [template["minion"]] if "minion" in template else list(md.minionList)
+        for minion in minions:
+            setup = {**engine.default_setup, **template, "minion": minion}
+            setup["miniontier"] = max(md.minionList[minion]["speed"])
+            setups.append(setup)
+    return setups
+
+
+def run_benchmark(prices, setups):
+    """
+    Evaluates every setup rounds times and measures the throughput, the latency and the peak memory.
+    The first evaluation of every setup is not measured, it builds the price tables of the snapshot.
+
+    Parameters
+    ----------
+    prices : minion_engine.PriceSnapshot
+        Prices used for all evaluations.
+    setups : list
+        Setups to evaluate.
+
+    Returns
+    -------
+    dict
+        Benchmark results.
+
+    """
+    settings = {"pet_costs": main.pet_costs, "compact_tolerance": main.compact_tolerance}
+    latencies = []
+    round_times = []
+    # the terminal warnings of the evaluations are not part of the benchmark
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        for setup in setups:
+            engine.evaluate(setup, prices, **settings)
+        for benchmark_round in range(rounds):
+            output.seek(0)
+            output.truncate()
+            round_start = time.perf_counter()
+            for setup in setups:
+                start = time.perf_counter()
+                engine.evaluate(setup, prices, **settings)
+                latencies.append(time.perf_counter() - start)
+            round_times.append(time.perf_counter() - round_start)
+        # tracemalloc slows down the evaluations, so memory is measured in a separate round
+        tracemalloc.start()
+        for setup in setups:
+            engine.evaluate(setup, prices, **settings)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"evaluations": len(setups),
+            "evaluations_per_second": len(setups) / min(round_times),
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+            "peak_memory_MB": peak_memory / 1e6,
+            "python": sys.version.split()[0],
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def show_results(results, baseline=None):
+    """Prints the benchmark results, next to the baseline if given."""
+    for key in ["evaluations", "evaluations_per_second", "p50_ms", "p99_ms", "peak_memory_MB"]:
+        line = f"{key}: {results[key]:.6g}"
+        if baseline is not None and key in baseline:
+            line += f" (baseline {baseline[key]:.6g})"
+        print(line)
+    return
+
+
+def check_regression(results, baseline):
+    """
+    Compares the throughput with the baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Results of run_benchmark().
+    baseline : dict
+        Saved results of run_benchmark().
+
+    Returns
+    -------
+    bool
+        True if the evaluations per second did not drop more than max_regression below the baseline.
+
+    """
+    if results["evaluations"] != baseline["evaluations"]:
+        print("WARNING: the baseline was made with a different amount of setups")
+    return results["evaluations_per_second"] >= (1 - max_regression) * baseline["evaluations_per_second"]
+
+
+def start_benchmark(command=None):
+    """
+    Runs a benchmark command, see the usage at the top of this file.
+
+    Parameters
+    ----------
+    command : str, optional
+        "generate", "record", "save" or None. The default is None, for comparing with the baseline.
+
+    Returns
+    -------
+    int
+        Exit code, 1 if the benchmark failed.
+
+    """
+    fixture_path = file_path(fixture_file)
+    baseline_path = file_path(baseline_file)
+    if command == "generate":
+        generate_fixture(fixture_path)
+        return 0
+    if command == "record":
+        record_fixture(fixture_path)
+        return 0
+    if command not in [None, "save"]:
+        print(f"ERROR: unknown command {command}, use generate, record, save or no command")
+        return 1
+    if not os.path.isfile(fixture_path):
+        print(f"ERROR: {fixture_file} not found, generate it with: python benchmark.py generate")
+        return 1
+    prices = load_fixture(fixture_path)
+    setups = benchmark_setups()
+    print(f"BENCHMARK: Evaluating {len(setups)} setups {rounds} times")
+    results = run_benchmark(prices, setups)
+    if command == "save":
+        with open(baseline_path, "w") as file:
+            json.dump(results, file, indent=4)
+        show_results(results)
+        print(f"BENCHMARK: Saved baseline in {baseline_path}")
+        return 0
+    if not os.path.isfile(baseline_path):
+        show_results(results)
+        print("WARNING: no baseline found, save one with: python benchmark.py save")
+        return 0
+    with open(baseline_path, "r") as file:
+        baseline = json.load(file)
+    show_results(results, baseline)
+    if not check_regression(results, baseline):
+        print(f"BENCHMARK: FAILED, evaluations per second dropped more than {max_regression:.0%} below the baseline")
+        return 1
+    print("BENCHMARK: Passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(start_benchmark(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -14,11 +14,11 @@ Visit https://herodirk.github.io/ for an online manual.
 To start the calculator: run this file with a local python interpreter
 
 Bazaar data from https://api.hypixel.net
-AH data from https://sky.coflnet.com/api (currently only Postcard)
+AH data from https://sky.coflnet.com/api (AH only items and pets)
 
 Current major limitations:
     Inferno drop chances might be unaccurate
-    Item prices from AH (like pets) have to be updated manually
+    AH prices of pets that are not in market_data.ah_pets have to be updated manually
     Unconfirmed average wool amount from Enchanted Shears
     For offline calculations of mob minions: Hypixel takes 5 actions to spawn in mobs, this calculator does not account for that
     Not entirely bazaar manipulation proof
@@ -29,7 +29,7 @@ Current major limitations:
 Lesser limitations are listed on the support discord server,
 the invite to that server is at the bottom of https://herodirk.github.io/
 
-This program and related files (Hkinter.py, HSB_minion_data.py and official_calculator_add_ons.py) are protected under a GNU GENERAL PUBLIC LICENSE (Version 3)
+This program and related files (Hkinter.py, HSB_minion_data.py, minion_data_cache.py, minion_engine.py, minion_optimizer.py, market_data.py, benchmark.py and official_calculator_add_ons.py) are protected under a GNU GENERAL PUBLIC LICENSE (Version 3)
 Herodirk: I dont want any legal trouble, just ask me for permission if you want to copy parts of the code for your own public projects. Copying for private projects is fine.
 
 Herodirk is not affiliated with Hypixel Inc.
@@ -41,16 +41,21 @@ Herodirk is not affiliated with Hypixel Inc.
 try:
     import tkinter as tk
     import numpy as np
-    import time
+    import os
     import json
-    import urllib.request
+    import time
+    import threading
     from copy import deepcopy
-    import HSB_minion_data as md
+    import minion_data_cache
+    # loaded from its cache file when HSB_minion_data.py did not change, the other calculator files then import the cached module
+    md = minion_data_cache.load_minion_data()
+    import minion_engine as engine
+    import market_data
     import Hkinter
     import official_calculator_add_ons as Hero_addons
 except ModuleNotFoundError as import_error:
     missing_package = import_error.name
-    if missing_package in ["HSB_minion_data", "Hkinter", "official_calculator_add_ons"]:
+    if missing_package in ["HSB_minion_data", "minion_data_cache", "minion_engine", "minion_optimizer", "market_data", "Hkinter", "official_calculator_add_ons"]:
         print(f"Could not find calculator file {missing_package}.py,\nplease make sure all the calculator files are in the same folder.")
     else:
         print(f"Could not find {missing_package} module,\nplease install this module using PIP")
@@ -67,11 +72,31 @@ external_add_ons = {**Hero_addons.add_ons_package}
 
 # Bazaar settings
 bazaar_auto_update = True
-# If true, bazaar automatically updates before performing calculation
+# If true, bazaar automatically updates in the background every bazaar_cooldown seconds, calculations use the latest finished update
 bazaar_cooldown = 60  # seconds
 # Time limit in seconds between each automatic update
+bazaar_top_percent = 0.1
+# Fraction of the orders (by amount) that is averaged for the bazaar buy and sell prices
+bazaar_stats_history = 100
+# Amount of bazaar updates of which the timings and counters are kept in self.bazaar_stats, see market_data.BazaarStats
+ah_auto_update = True
+# If true, the prices of the AH only items (md.ah_items) and the pets in market_data.ah_pets are taken from Coflnet during each bazaar update
+# If false, only the Postcard price is taken from Coflnet
+api_connections = 32
+# Maximum amount of API calls running at the same time
+api_timeout = 10  # seconds
+# Time limit in seconds for connecting to an API and for each read of its answer
 compact_tolerance = 10000  # coins
 # Minimum coin loss per compacting action for the calculator to make a note of coin loss
+result_cache_size = 256
+# Amount of calculation results that are remembered, calculating a remembered setup again with the same prices skips the calculation
+bazaar_snapshot_file = "bazaar_snapshot.json"
+# File in the calculator folder where the last bazaar and AH prices are saved, set to None to turn off saving.
+# At startup, the prices are loaded from this file and the bazaar_cooldown continues from the saved update time.
+stage_timers = False
+# If true, each calculation measures the time of every calculation stage and shows it in the Add-on Outputs as "Stage Timers"
+stage_timers_file = "stage_timers.json"
+# File in the calculator folder where the stage times of the last calculation are saved when stage_timers is on, set to None to turn off saving.
 
 # Output settings
 output_to_clipboard = True
@@ -81,6 +106,8 @@ output_to_clipboard = True
 color_palette = "dark_red"
 # Color palette of the calculator, current options: "dark", "dark_red", "gray_text"
 # For Apple IOS users, use "gray_text"
+lazy_widgets = True
+# If true, the widgets of hidden options and of the Add-ons Menu are only made when they are first shown, this makes starting the calculator faster
 
 # Setup Templates
 templateList = {
@@ -202,8 +229,8 @@ pet_costs = {
 
 #%% Lists you should not touch
 
-bazaar_buy_types = {"Buy Order": "sellPrice", "Insta Buy": "buyPrice", "Custom": "custom"}
-bazaar_sell_types = {"Sell Offer": "buyPrice", "Insta Sell": "sellPrice", "Custom": "custom"}
+bazaar_buy_types = engine.bazaar_buy_types
+bazaar_sell_types = engine.bazaar_sell_types
 
 reduced_amounts = {0: "", 1: "k", 2: "M", 3: "B", 4: "T", 5: "Qd"}
 
@@ -213,15 +240,17 @@ reduced_amounts = {0: "", 1: "k", 2: "M", 3: "B", 4: "T", 5: "Qd"}
 
 class Calculator(tk.Tk):
     def __init__(self):
+        # seconds since the start of __init__ at the end of each startup step, see show_startup_times
+        self.boot_start = time.perf_counter()
+        self.startup_times = {}
         super().__init__()
         # Use Hkinter to initialize the window and the frames with grids
         self.hk = Hkinter.Hk(main=self, version="MINION", windowTitle="Minion Calculator", windowWidth=1450, windowHeight=750, palette=color_palette)
         print("BOOTING: Hkinter loaded")
         self.hk.createControls()
         self.hk.createFrames(self, frame_keys=[["inputs_minion", "inputs_player", "outputs_setup", "outputs_profit"]], grid_frames=True, grid_size=0.96, border=0.003)
-        self.frames["addons_main"] = tk.Frame(self, background=self.colors["background"])
-        self.hk.createFrames(self.frames["addons_main"], frame_keys=[["addons_buttons", "addons_output"]], grid_frames=True, grid_size=0.96, border=0.005, relControlsHeight=0)
         print("BOOTING: Framework set up")
+        self.startup_times["framework"] = time.perf_counter() - self.boot_start
         self.version = self.hk.defVar(dtype=float, initial=1.1)
         print(f"BOOTING: Calculator version {self.version.get()}")
 
@@ -317,25 +346,23 @@ class Calculator(tk.Tk):
                           "addons_output_container": {"vtype": "list", "display": "Add-on Outputs", "frame": "addons_output_grid", "w": 65, "h": 20, "list": {}, "switch_initial": False, "IDtoDisplay": False},
                           }
 
+        # variables of which the widgets are hidden at startup, per switch (see the switches below)
+        # with lazy_widgets, these widgets and the Add-ons Menu are only made when they are first shown
+        self.hidden_options = {"pet_leveling": ["taming", "petxpboost", "beastmaster", "expsharepet", "expshareitem",
+                                                "pets_levelled", "petProfit", "falcon_attribute", "toucan_attribute"],
+                               "exp_share_diana": ["expsharepetslot2", "expsharepetslot3"],
+                               "infernofuel": ["infernoGrade", "infernoDistillate", "infernoEyedrops"],
+                               "beacon": ["scorched", "B_constant", "B_acquired"],
+                               "potato": ["potatoTalisman"],
+                               "afking": ["afkpet", "afkpetrarity", "afkpetlvl", "enchanted_clock", "specialLayout", "playerHarvests", "playerLooting"],
+                               "fuel_amount": ["fuelamount"],
+                               "free_will": ["freewillcost"]}
+        hidden_keys = {var_key for var_keys in self.hidden_options.values() for var_key in var_keys} | {"addons_output_container"}
+
         # determining input/output types according to "vtype", "noWidget" and "switch_initial"
         # the other values are send to Hkinter. Hkinter creates the Tkinter variable and widgets (stored in "var" and "widget" respectively)
-        for var_key, var_data in self.variables.items():
-            if var_data["vtype"] == "input" and "noWidget" not in var_data:
-                var_data["var"], var_data["widget"] = self.hk.defVarI(dtype=var_data["dtype"], frame=self.frames[var_data["frame"]],
-                                                                      L_text=f"{var_data['display']}:", initial=var_data["initial"],
-                                                                      options=var_data["options"], cmd=var_data["command"])
-            elif var_data["vtype"] == "output":
-                var_data["var"], var_data["widget"] = self.hk.defVarO(dtype=var_data["dtype"], frame=self.frames[var_data["frame"]],
-                                                                      L_text=f"{var_data['display']}:", initial=var_data["initial"])
-            elif var_data["vtype"] == "input" and "noWidget" in var_data:
-                var_data["var"] = self.hk.defVar(dtype=var_data["dtype"], initial=var_data["initial"])
-            elif var_data["vtype"] == "list":
-                var_data["var"], var_data["widget"] = self.hk.defListO(frame=self.frames[var_data["frame"]], L_text=f"{var_data['display']}:", h=var_data["h"], w=var_data["w"])
-            elif var_data["vtype"] == "storage":
-                var_data["var"] = self.hk.defVar(dtype=var_data["dtype"], initial=var_data["initial"])
-            if "switch_initial" in var_data:
-                self.variables[var_key]["output_switch"], widget = self.hk.defVarI(dtype=bool, frame=self.frames[self.variables[var_key]["frame"]], L_text="", initial=self.variables[var_key]["switch_initial"])
-                var_data["widget"].append(widget[-1])
+        for var_key in self.variables.keys():
+            self.define_variable(var_key, widgets=var_key not in hidden_keys)
 
         # define left over Tkinter variables and widgets that didnt fit in self.variables
         self.template, self.templateI = self.hk.defVarI(dtype=str, frame=self.frames["inputs_minion_grid"], L_text="Templates:", initial="Clean", options=templateList.keys(), cmd=self.load_template)
@@ -359,6 +386,7 @@ class Calculator(tk.Tk):
         self.notesAnchor = self.hk.genLabel(frm=self.frames["outputs_setup_grid"], txt="")
 
         print("BOOTING: self.variables initialized")
+        self.startup_times["variables"] = time.perf_counter() - self.boot_start
 
         # Create widgets for controls menu and placing them
         self.creditLB = self.hk.genLabel(frm=self.frames["controls"], txt=f"Minion Calculator V{self.version.get()}\nMade by Herodirk")
@@ -388,8 +416,6 @@ class Calculator(tk.Tk):
         minionprintLB = self.hk.genLabel(frm=self.frames["outputs_setup_grid"], txt="Share")
         profitoutputsLB = self.hk.genLabel(frm=self.frames["outputs_profit_grid"], txt="Profit Outputs")
         profitprintLB = self.hk.genLabel(frm=self.frames["outputs_profit_grid"], txt="Share")
-        addonsprintLB = self.hk.genLabel(frm=self.frames["addons_output_grid"], txt="Share")
-        addonsoutputsLB = self.hk.genLabel(frm=self.frames["addons_output_grid"], txt="Add-on Outputs")
 
         # Defining the order of widgets and placing them for all the grids
         self.grids = {"inputs_minion_grid": {"template": self.templateI,
@@ -479,65 +505,55 @@ class Calculator(tk.Tk):
                                               "fuelcost": self.variables["fuelcost"]["widget"],
                                               "totalProfit": self.variables["totalProfit"]["widget"]
                                               },
-                      "addons_output_grid": {"labels": [None, addonsoutputsLB, addonsprintLB],
-                                             "addons_output_container": [None, self.variables["addons_output_container"]["widget"][1], self.variables["addons_output_container"]["widget"][2]]},
                       }
+        # rows of hidden options are left empty until build_hidden_options fills them
         for grid_key in self.grids.keys():
             self.hk.fill_grid(self.grids[grid_key].values(), self.frames[grid_key])
 
         self.variables["notes"]["widget"][1].place(in_=self.notesAnchor, relx=1, x=5, rely=0, anchor='nw')
         self.variables["notes"]["widget"][1].tkraise()
 
-        # Add-ons buttons
+        # Add-ons, the buttons are made with the Add-ons Menu in build_addons_menu
         self.addons_list = {**external_add_ons}
         self.addons_buttons = {}
-        self.addons_auto_run = {}
-        for number, addon_info in enumerate(self.addons_list.items()):
-            addon_name, addon_function = addon_info
-            button_function = lambda func=addon_function: func(self)
-            self.addons_buttons[addon_name] = tk.Button(self.frames["addons_buttons_grid"], text=addon_name, command=button_function)
-            self.addons_auto_run[addon_name], widget = self.hk.defVarI(dtype=bool, frame=self.frames["addons_buttons_grid"], L_text="", initial=False)
-            widget[-1].place(in_=self.addons_buttons[addon_name], anchor="w", relx=1, rely=0.5, x=10)
-            self.addons_buttons[addon_name].grid(row=number % 8, column=(int(number / 8)) * 2)
+        self.addons_auto_run = {addon_name: self.hk.defVar(dtype=bool, initial=False) for addon_name in self.addons_list.keys()}
 
         print("BOOTING: Widgets placed")
+        self.startup_times["widgets"] = time.perf_counter() - self.boot_start
 
         # Create switches with Hkinter for the extended minion options
-        self.hk.defSwitch("pet_leveling", [*self.variables["taming"]["widget"], *self.variables["petxpboost"]["widget"], *self.variables["beastmaster"]["widget"],
-                                           *self.variables["expsharepet"]["widget"], *self.variables["expshareitem"]["widget"],
-                                           *self.variables["pets_levelled"]["widget"], *self.variables["petProfit"]["widget"],
-                                           *self.variables["falcon_attribute"]["widget"], *self.variables["toucan_attribute"]["widget"]],
+        self.hk.defSwitch("pet_leveling", **self.lazy_switch(lambda: self.build_hidden_options("pet_leveling")),
                           loc="grid", control="None", negate=True, initial=False)
-        self.hk.defSwitch("exp_share_diana", [*self.variables["expsharepetslot2"]["widget"], *self.variables["expsharepetslot3"]["widget"]],
+        self.hk.defSwitch("exp_share_diana", **self.lazy_switch(lambda: self.build_hidden_options("exp_share_diana")),
                           loc="grid", control="DianaTrue", negate=False, initial=False)
         self.hk.defSwitch("NPC_Bazaar", [*self.variables["itemSellLoc"]["widget"]],
                           loc="grid", control="Best (NPC/Bazaar)", negate=False, initial=True)
-        self.hk.defSwitch("infernofuel", [*self.variables["infernoGrade"]["widget"], *self.variables["infernoDistillate"]["widget"], *self.variables["infernoEyedrops"]["widget"]],
+        self.hk.defSwitch("infernofuel", **self.lazy_switch(lambda: self.build_hidden_options("infernofuel")),
                           loc="grid", control="Inferno Minion Fuel", negate=False, initial=False)
-        self.hk.defSwitch("beacon", [*self.variables["scorched"]["widget"], *self.variables["B_constant"]["widget"], *self.variables["B_acquired"]["widget"]],
+        self.hk.defSwitch("beacon", **self.lazy_switch(lambda: self.build_hidden_options("beacon")),
                           loc="grid", control=0, negate=True, initial=False)
-        self.hk.defSwitch("potato", [*self.variables["potatoTalisman"]["widget"]],
+        self.hk.defSwitch("potato", **self.lazy_switch(lambda: self.build_hidden_options("potato")),
                           loc="grid", control="PotatoTrue", negate=False, initial=False)
         self.hk.defSwitch("bazaar_tax", [*self.variables["bazaar_flipper"]["widget"]],
                           loc="grid", control=1, negate=False, initial=True)
-        self.hk.defSwitch("afking", [*self.variables["afkpet"]["widget"], *self.variables["afkpetrarity"]["widget"], *self.variables["afkpetlvl"]["widget"],
-                                     *self.variables["enchanted_clock"]["widget"], *self.variables["specialLayout"]["widget"],
-                                     *self.variables["playerHarvests"]["widget"], *self.variables["playerLooting"]["widget"]],
+        self.hk.defSwitch("afking", **self.lazy_switch(lambda: self.build_hidden_options("afking")),
                           loc="grid", control=True, negate=False, initial=False)
-        self.hk.defSwitch("fuel_amount", [*self.variables["fuelamount"]["widget"]],
+        self.hk.defSwitch("fuel_amount", **self.lazy_switch(lambda: self.build_hidden_options("fuel_amount")),
                           loc="grid", control=0, negate=True, initial=False)
         self.hk.defSwitch("emptytime", [*self.emptytimeamountI, *self.variables["emptytime"]["widget"]],
                           loc="grid", control=True, negate=False, initial=False)
-        self.hk.defSwitch("free_will", [*self.variables["freewillcost"]["widget"]],
+        self.hk.defSwitch("free_will", **self.lazy_switch(lambda: self.build_hidden_options("free_will")),
                           loc="grid", control=True, negate=False, initial=False)
-        self.hk.defSwitch(ID="addons", obj=self.frames["addons_main"],
+        self.hk.defSwitch(ID="addons", **self.lazy_switch(self.build_addons_menu),
                           loc={"anchor": "c", "relx": 0.5, "rely": 0.5, "relwidth": 0.7, "relheight": 0.8}, initial=False)
-        
+
+
         # Show/Hide toggle buttons for large amount of extended options
         self.hk.createShowHideToggle("afk", "afking")
         self.hk.createShowHideToggle("beacon", "beacon")
         
         print("BOOTING: Switches activated")
+        self.startup_times["switches"] = time.perf_counter() - self.boot_start
 
         # Define output orders for Short Output (self.outputOrder) and Share Output (self.fancyOrder)
         self.outputOrder = ['ID', 'fuel', 'hopper', 'upgrade1', 'upgrade2', 'chest',
@@ -590,15 +606,179 @@ class Calculator(tk.Tk):
                            "addons_output_container": None}
         print("BOOTING: Output orders defined")
 
+        # results of calculate, see minion_engine.ResultCache
+        self.result_cache = engine.ResultCache(result_cache_size)
+        # reruns only the calculation stages affected by the changed inputs, see minion_engine.IncrementalEvaluator
+        self.evaluator = engine.IncrementalEvaluator()
+
         # Load bazaar prices
         print("BOOTING: Connecting to bazaar")
         self.bazaar_timer = 0
+        self.bazaar_attempt = 0
+        # seconds taken by the last bazaar update, shown with the stage timers
+        self.bazaar_duration = 0.0
+        # network, parse and processing times and supply counters of the last bazaar updates
+        self.bazaar_stats = market_data.BazaarStats(bazaar_stats_history)
+        self.bazaar_lock = threading.Lock()
+        self.prices = engine.item_list_snapshot()
+        self.fetcher = market_data.MarketFetcher(f"Minion Calculator v{self.version.get()} (Python)", max_connections=api_connections, timeout=api_timeout)
+        if bazaar_snapshot_file is not None:
+            snapshot = market_data.load_snapshot(os.path.join(os.path.dirname(os.path.abspath(__file__)), bazaar_snapshot_file))
+            if snapshot is not None:
+                print("BOOTING: Loaded bazaar snapshot")
+                self.prices = snapshot
+                self.bazaar_timer = snapshot.last_updated
+                self.show_bazaar_time()
         self.update_bazaar(cooldown_warning=False)
-        print("BOOTING: Ready")
+        self.startup_times["bazaar"] = time.perf_counter() - self.boot_start
+        # the refresher thread prepares new prices in the background, calculate only reads self.prices
+        self.refresh_stop = threading.Event()
+        self.refresher = None
+        if bazaar_auto_update:
+            self.refresher = threading.Thread(target=self.refresh_loop, name="bazaar refresher", daemon=True)
+            self.refresher.start()
+            self.after(1000, self.poll_refresher)
+            print("BOOTING: Bazaar refresher started")
+        self.startup_times["ready"] = time.perf_counter() - self.boot_start
+        print(f"BOOTING: Ready after {self.startup_times['ready']:.3f} s")
+        # runs when the main loop first goes idle, after the window has been drawn
+        self.after_idle(self.show_startup_times)
         return
 
 #%% functions
 
+    def define_variable(self, var_key, widgets=True):
+        """
+        Creates the Tkinter variables of a self.variables entry with Hkinter, and its widgets according to "vtype", "noWidget" and "switch_initial".
+        Variables that already exist are kept, so the widgets can be made later by calling this again.
+
+        Parameters
+        ----------
+        var_key : str
+            Key of the variable in self.variables.
+        widgets : bool, optional
+            If False, only the Tkinter variables are made and "widget" is an empty list. The default is True.
+
+        Returns
+        -------
+        None.
+
+        """
+        var_data = self.variables[var_key]
+        if "var" not in var_data:
+            if var_data["vtype"] == "list":
+                var_data["var"] = self.hk.defVar(dtype=str, initial=[])
+            else:
+                var_data["var"] = self.hk.defVar(dtype=var_data["dtype"], initial=var_data["initial"])
+            if "switch_initial" in var_data:
+                var_data["output_switch"] = self.hk.defVar(dtype=bool, initial=var_data["switch_initial"])
+        if var_data["vtype"] == "storage" or "noWidget" in var_data:
+            return
+        if widgets is False:
+            var_data["widget"] = []
+            return
+        if var_data["vtype"] == "input":
+            widget = self.hk.defVarI(dtype=var_data["dtype"], frame=self.frames[var_data["frame"]], L_text=f"{var_data['display']}:",
+                                     options=var_data["options"], cmd=var_data["command"], var=var_data["var"])[1]
+        elif var_data["vtype"] == "output":
+            widget = self.hk.defVarO(dtype=var_data["dtype"], frame=self.frames[var_data["frame"]], L_text=f"{var_data['display']}:", var=var_data["var"])[1]
+        elif var_data["vtype"] == "list":
+            widget = self.hk.defListO(frame=self.frames[var_data["frame"]], L_text=f"{var_data['display']}:", h=var_data["h"], w=var_data["w"], var=var_data["var"])[1]
+        if "switch_initial" in var_data:
+            widget.append(self.hk.defVarI(dtype=bool, frame=self.frames[var_data["frame"]], L_text="", var=var_data["output_switch"])[1][-1])
+        # extended in place, lists made with widgets=False might already be used in self.grids
+        var_data.setdefault("widget", []).extend(widget)
+        return
+
+    def lazy_switch(self, build):
+        """
+        Returns the obj and build arguments of Hkinter.Hk.defSwitch for widgets made by build.
+        With lazy_widgets, build is called when the switch is first turned on, otherwise it is called now.
+
+        Parameters
+        ----------
+        build : function
+            Function without arguments that makes the widgets and returns them.
+
+        Returns
+        -------
+        dict
+            Keyword arguments for Hkinter.Hk.defSwitch.
+
+        """
+        if lazy_widgets:
+            return {"obj": None, "build": build}
+        return {"obj": build(), "build": build}
+
+    def build_hidden_options(self, switch_ID):
+        """
+        Makes the widgets of the variables of a switch in self.hidden_options and places them in their row of self.grids.
+
+        Parameters
+        ----------
+        switch_ID : str
+            Key of the switch in self.hidden_options.
+
+        Returns
+        -------
+        list
+            The made widgets.
+
+        """
+        widgets = []
+        for var_key in self.hidden_options[switch_ID]:
+            grid_key = self.variables[var_key]["frame"]
+            self.define_variable(var_key)
+            self.hk.fill_grid_row(self.variables[var_key]["widget"], list(self.grids[grid_key].keys()).index(var_key), self.frames[grid_key])
+            widgets.extend(self.variables[var_key]["widget"])
+        return widgets
+
+    def build_addons_menu(self):
+        """
+        Makes the Add-ons Menu, with a button and an auto run checkbox for each add-on and the Add-on Outputs.
+
+        Returns
+        -------
+        tk.Frame
+            Frame of the Add-ons Menu, not placed yet.
+
+        """
+        self.frames["addons_main"] = tk.Frame(self, background=self.colors["background"])
+        self.hk.createFrames(self.frames["addons_main"], frame_keys=[["addons_buttons", "addons_output"]], grid_frames=True, grid_size=0.96, border=0.005, relControlsHeight=0)
+        self.define_variable("addons_output_container")
+        addonsprintLB = self.hk.genLabel(frm=self.frames["addons_output_grid"], txt="Share")
+        addonsoutputsLB = self.hk.genLabel(frm=self.frames["addons_output_grid"], txt="Add-on Outputs")
+        self.grids["addons_output_grid"] = {"labels": [None, addonsoutputsLB, addonsprintLB],
+                                            "addons_output_container": [None, self.variables["addons_output_container"]["widget"][1], self.variables["addons_output_container"]["widget"][2]]}
+        self.hk.fill_grid(self.grids["addons_output_grid"].values(), self.frames["addons_output_grid"])
+        for number, addon_info in enumerate(self.addons_list.items()):
+            addon_name, addon_function = addon_info
+            button_function = lambda func=addon_function: func(self)
+            self.addons_buttons[addon_name] = tk.Button(self.frames["addons_buttons_grid"], text=addon_name, command=button_function)
+            widget = self.hk.defVarI(dtype=bool, frame=self.frames["addons_buttons_grid"], L_text="", var=self.addons_auto_run[addon_name])[1]
+            widget[-1].place(in_=self.addons_buttons[addon_name], anchor="w", relx=1, rely=0.5, x=10)
+            self.addons_buttons[addon_name].grid(row=number % 8, column=(int(number / 8)) * 2)
+        return self.frames["addons_main"]
+
+    def show_startup_times(self):
+        """
+        Prints how long each startup step took, from the times in self.startup_times.
+        Runs when the main loop first goes idle, that time is stored as "interactive".
+
+        Returns
+        -------
+        None.
+
+        """
+        self.startup_times["interactive"] = time.perf_counter() - self.boot_start
+        previous = 0.0
+        steps = []
+        for step, seconds in self.startup_times.items():
+            steps.append(f"{step} {seconds - previous:.3f} s")
+            previous = seconds
+        print(f"BOOTING: Interactive after {self.startup_times['interactive']:.3f} s ({', '.join(steps)})")
+        return
+
     def time_number(self, time_length, time_amount, secondsPaction=0.0, actionsPerHarvest=1.0):
         """
         Translates time amount and length into seconds.
@@ -620,21 +800,7 @@ class Calculator(tk.Tk):
             The inputted time amount and length as seconds.
 
         """
-        if time_length == "Years":
-            return 31536000 * time_amount
-        if time_length == "Weeks":
-            return 604800 * time_amount
-        if time_length == "Days":
-            return 86400 * time_amount
-        if time_length == "Hours":
-            return 3600 * time_amount
-        if time_length == "Minutes":
-            return 60 * time_amount
-        if time_length == "Seconds":
-            return 1 * time_amount
-        if time_length == "Harvests":
-            return secondsPaction * actionsPerHarvest * time_amount
-        return 1 * time_amount
+        return engine.time_number(time_length, time_amount, secondsPaction, actionsPerHarvest)
 
     def reduced_number(self, number, decimal=2):
         """
@@ -1056,6 +1222,23 @@ class Calculator(tk.Tk):
                 return {}
         return template
 
+    def get_setup(self):
+        """
+        Collects the current setup from the inputs in self.variables and the time inputs.
+
+        Returns
+        -------
+        dict
+            Setup as {input key: value}, used by minion_engine.evaluate().
+
+        """
+        setup = {var_key: var_data["var"].get() for var_key, var_data in self.variables.items() if var_data["vtype"] == "input"}
+        setup["totaltimeamount"] = self.totaltimeamount.get()
+        setup["totaltimelength"] = self.totaltimelength.get()
+        setup["emptytimeamount"] = self.emptytimeamount.get()
+        setup["emptytimelength"] = self.emptytimelength.get()
+        return setup
+
     def getPrice(self, ID, action="buy", location="bazaar", force=False):
         """
         Returns the price of an item from ID, transaction type and location of transaction.
@@ -1077,35 +1260,7 @@ class Calculator(tk.Tk):
         float
             price of the item.
         """
-        multiplier = 1
-        if location == "bazaar":
-            if action == "buy":
-                location = bazaar_buy_types[self.variables["bazaar_buy_type"]["var"].get()]
-            elif action == "sell":
-                location = bazaar_sell_types[self.variables["bazaar_sell_type"]["var"].get()]
-                if self.variables["bazaar_taxes"]["var"].get():
-                    bazaar_tax = 0.0125 - 0.00125 * self.variables["bazaar_flipper"]["var"].get()
-                    if self.variables["mayor"]["var"].get() == "Derpy":
-                        bazaar_tax *= 4
-                    multiplier = 1 - bazaar_tax
-        elif location == "npc" and action == "buy":
-            multiplier = 2
-        if ID in md.itemList:
-            if location in md.itemList[ID]["prices"]:
-                return multiplier * md.itemList[ID]["prices"][location]
-            elif force:
-                print("WARNING:", ID, "no forced cost found")
-                return 0
-            elif "npc" in md.itemList[ID]["prices"]:
-                return multiplier * md.itemList[ID]["prices"]["npc"]
-            elif "custom" in md.itemList[ID]["prices"]:
-                return md.itemList[ID]["prices"]["custom"]
-            else:
-                print("WARNING:", ID, "no cost found")
-                return 0
-        else:
-            print("WARNING:", ID, "not in itemList")
-            return 0
+        return engine.get_price(self.get_setup(), self.prices, ID, action, location, force)
 
     def getPetXPBoosts(self, pet, xp_type, exp_share=False):
         """
@@ -1130,43 +1285,12 @@ class Calculator(tk.Tk):
             pet xp boost of pet item
 
         """
-        non_matching = 1
-        if md.all_pets[pet]["type"] != "all" and md.all_pets[pet]["type"] != xp_type:
-            if xp_type in ["alchemy", "enchanting"]:
-                non_matching = 1 / 12
-            else:
-                non_matching = 1 / 3
-        if exp_share:
-            return non_matching
-        petxpbonus = (1 + self.variables["taming"]["var"].get() / 100) * (1 + self.variables["beastmaster"]["var"].get() / 100) * non_matching
-        if md.pet_xp_boosts[self.variables["petxpboost"]["var"].get()][0] in [xp_type, "all"]:
-            pet_item = 1 + md.pet_xp_boosts[self.variables["petxpboost"]["var"].get()][1] / 100
-        else:
-            pet_item = 1
-        if self.variables["mayor"]["var"].get() == "Diana":
-            petxpbonus *= 1.35
-        if xp_type in ["mining", "fishing"]:
-            petxpbonus *= 1.5
-        if pet == "Reindeer":
-            petxpbonus *= 2
-        if xp_type in ["combat"] and self.variables["falcon_attribute"]["var"].get() != 0:
-            petxpbonus *= (1 + self.variables["falcon_attribute"]["var"].get() / 100)
-        return petxpbonus, pet_item
+        return engine.get_pet_xp_boosts(self.get_setup(), pet, xp_type, exp_share)
 
     def dragon_xp(self, gained_xp, left_over_pet_xp, pet_xp_boost, xp_boost_pet_item):
         """
         Calculates the pet xp gain on dragon pets (Golden Dragon and Jade Dragon).
-
-        Parameters
-        ----------
-        gained_xp : float
-            Gained skill xp of a specific type.
-        left_over_pet_xp : float
-            Left over pet xp on the pet before applying the gained skill xp.
-        pet_xp_boost : float
-            Combined pet xp boost multiplier without pet item.
-        xp_boost_pet_item : float
-            Pet xp boost multiplier from pet item.
+        See minion_engine.dragon_xp().
 
         Returns
         -------
@@ -1176,23 +1300,7 @@ class Calculator(tk.Tk):
             Left over pet xp on the pet after applying the gained skill xp.
 
         """
-        drag_lvl_100 = 25353230 
-        drag_lvl_200 = 210255385
-        gained_pet_xp = 0.0
-        skill_xp_per_pet = (drag_lvl_200 + drag_lvl_100 * (xp_boost_pet_item - 1)) / (xp_boost_pet_item * pet_xp_boost)
-        gained_pet_xp = - left_over_pet_xp
-        if left_over_pet_xp <= drag_lvl_100:
-            gained_xp += left_over_pet_xp / pet_xp_boost
-        else:
-            gained_xp += (left_over_pet_xp + drag_lvl_100 * (xp_boost_pet_item - 1)) / (pet_xp_boost * xp_boost_pet_item)
-        gained_pet_xp += (gained_xp // skill_xp_per_pet) * drag_lvl_200
-        left_over_xp = gained_xp % skill_xp_per_pet
-        if left_over_xp <= drag_lvl_100 / pet_xp_boost:
-            left_over_pet_xp = left_over_xp * pet_xp_boost
-        else:
-            left_over_pet_xp = left_over_xp * pet_xp_boost * xp_boost_pet_item + drag_lvl_100 * (1 - xp_boost_pet_item)
-        gained_pet_xp += left_over_pet_xp
-        return gained_pet_xp, left_over_pet_xp
+        return engine.dragon_xp(gained_xp, left_over_pet_xp, pet_xp_boost, xp_boost_pet_item)
 
     def catch_warning(self, warning_message):
         """
@@ -1208,14 +1316,13 @@ class Calculator(tk.Tk):
         None.
 
         """
-        if "WARNING" not in self.variables["notes"]["list"]:
-            self.variables["notes"]["list"]["WARNING"] = "Check terminal for warning"
-        print("WARNING: " + warning_message)
+        engine.catch_warning(self.variables["notes"]["list"], warning_message)
         return
 
     def calculate(self, inGUI=False):
         """
-        Main calculation function
+        Main calculation function.
+        Collects the setup, evaluates it with minion_engine.IncrementalEvaluator and sends the results to self.variables.
 
         Parameters
         ----------
@@ -1232,680 +1339,179 @@ class Calculator(tk.Tk):
             self.statusC.configure(bg="yellow")
             self.statusC.update()
 
-        # auto update bazaar
-        if bazaar_auto_update:
-            self.update_bazaar(cooldown_warning=False)
+        # stage times in seconds, only measured with stage_timers on
+        timers = None
+        if stage_timers:
+            timers = {}
+            calculation_start = time.perf_counter()
 
-        # clear list outputs from previous calculation
-        for var_key, var_data in self.variables.items():
-            if var_data["vtype"] == "list":
-                if var_key == "wisdom":
-                    continue
-                var_data["list"].clear()
+        # Construct ID
+        setup_ID = self.constructID()
 
-        # extracting often used minion constants
-        minion_type = self.variables["minion"]["var"].get()
-        minion_tier = self.variables["miniontier"]["var"].get()
-        minion_amount = self.variables["amount"]["var"].get()
-        minion_fuel = md.fuel_options[self.variables["fuel"]["var"].get()]
-        minion_beacon = self.variables["beacon"]["var"].get()
-        mayor = self.variables["mayor"]["var"].get()
-
-        # Enchanted Clock uses offline calculations, but you can be on the island when using it to apply boosts that require a loaded island.
-        # This clock_override replaces afk_toggle for these boosts
-        afk_toggle = self.variables["afk"]["var"].get()
-        clock_toggle = self.variables["enchanted_clock"]["var"].get()
-        clock_override = False
-        if clock_toggle and afk_toggle:
-            afk_toggle = False
-            clock_override = True
-
-        # list upgrades types
-        upgrades = [md.upgrade_options[self.variables["upgrade1"]["var"].get()], md.upgrade_options[self.variables["upgrade2"]["var"].get()]]
-        upgrades_types = []
-        for upgrade in upgrades:
-            for temp_type in md.itemList[upgrade]["upgrade"]["special"]["type"].split(", "):
-                upgrades_types.append(temp_type)
-
-        # adding up minion speed bonus
-        # uses the fact that booleans can be seen as 0 or 1 or false and true resp.
-        speedBonus = 0
-        speedBonus += md.itemList[minion_fuel]["upgrade"]["speed"]
-        speedBonus += md.itemList[upgrades[0]]["upgrade"]["speed"] + md.itemList[upgrades[1]]["upgrade"]["speed"]
-        speedBonus += 2 * minion_beacon + 10 * self.variables["infusion"]["var"].get()
-        speedBonus += 10 * self.variables["free_will"]["var"].get() + 5 * self.variables["postcard"]["var"].get()
-        speedBonus += 5 * self.variables["potatoTalisman"]["var"].get() * (afk_toggle or clock_override) * (minion_type == "Potato")
-        if self.variables["crystal"]["var"].get() != "None":
-            if minion_type in list(md.floating_crystals[self.variables["crystal"]["var"].get()].values())[0]:
-                speedBonus += list(md.floating_crystals[self.variables["crystal"]["var"].get()].keys())[0]
-        if minion_beacon != 0:
-            speedBonus += 1 * self.variables["scorched"]["var"].get()
-        if minion_type == "Inferno":
-            if self.rising_celsius_override:
-                speedBonus += 180
-            else:
-                speedBonus += 18 * min(10, minion_amount)
-        if mayor == "Cole" and (afk_toggle or clock_override) and minion_type in [
-                'Cobblestone', 'Obsidian', 'Glowstone', 'Gravel', 'Sand', 'Ice', 'Coal', 'Iron',
-                'Gold', 'Diamond', 'Lapis', 'Redstone', 'Emerald', 'Quartz', 'End Stone', 'Mithril']:
-            speedBonus += 25
-        afkpet = self.variables["afkpet"]["var"].get()
-        afkpet_rarity = self.variables["afkpetrarity"]["var"].get()
-        afkpet_lvl = self.variables["afkpetlvl"]["var"].get()
-        if (afk_toggle or clock_override) and minion_type in md.boost_pets[afkpet]["affects"] and afkpet_rarity in md.boost_pets[afkpet]:
-            speedBonus += md.boost_pets[afkpet][afkpet_rarity][0] + afkpet_lvl * md.boost_pets[afkpet][afkpet_rarity][1]
-
-        # multiply up minion drop bonus
-        dropMultiplier = 1
-        dropMultiplier *= md.itemList[minion_fuel]["upgrade"]["drop"]
-        dropMultiplier *= md.itemList[upgrades[0]]["upgrade"]["drop"]
-        if afk_toggle and dropMultiplier > 1:
-            # drop multiplier greater than 1 is rounded down while online
-            dropMultiplier = int(dropMultiplier)
-        dropMultiplier *= md.itemList[upgrades[1]]["upgrade"]["drop"]
-        if afk_toggle and dropMultiplier > 1:
-            dropMultiplier = int(dropMultiplier)
-        if mayor == "Derpy":
-            dropMultiplier *= 2
-
-        # AFKing, Special Layouts and Player Harvests influences
-        actionsPerHarvest = 2
-        if minion_type == "Fishing":
-            # only has harvests actions
-            actionsPerHarvest = 1
-        if afk_toggle:
-            if minion_type in ["Pumpkin", "Melon"]:
-                # pumpkins and melons are forced to regrow for minion to harvest
-                actionsPerHarvest = 1
-            if self.variables["playerHarvests"]["var"].get():
-                if minion_type in ["Fishing", "Pumpkin", "Melon"]:
-                    self.variables["notes"]["list"]["Player Harvests"] = "Player Harvesting does not work with this minion"
-                else:
-                    actionsPerHarvest = 1
-                    dropMultiplier = 1
-                    if minion_type in ["Gravel"]:
-                        upgrades.append("FLINT_SHOVEL")
-                        self.variables["notes"]["list"]["Player Tools"] = "Assuming Player is using Flint Shovel"
-                    if minion_type in ["Ice"]:
-                        self.variables["notes"]["list"]["Player Tools"] = "Assuming Player is using Silk Touch"
-                    if minion_type in ["Zombie", "Revenant", "Voidling", "Inferno", "Vampire", "Skeleton", "Creeper", "Spider", "Tarantula", "Cave Spider", "Blaze", "Magma Cube", "Enderman", "Ghast", "Slime", "Cow", "Pig", "Chicken", "Sheep", "Rabbit"]:
-                        dropMultiplier *= 1 + 15 * self.variables["playerLooting"]["var"].get() / 100
-            elif self.variables["specialLayout"]["var"].get():
-                if minion_type in ["Cobblestone", "Mycelium", "Ice"]:
-                    # cobblestone generator, regrowing mycelium, freezing water
-                    actionsPerHarvest = 1
-                if minion_type in ["Flower", "Sand", "Red Sand", "Gravel"]:
-                    # harvests through natural means: water flushing, gravity
-                    actionsPerHarvest = 1
-                    # speedBonus -= 10  # only spawning has 10% action speed reduction, not confirmed yet.
-
-        # AFK loot table changes
-        if minion_type in ['Oak', 'Spruce', 'Birch', 'Dark Oak', 'Acacia', 'Jungle']:
-            if afk_toggle:
-                # chopped trees have 4 blocks of wood, unknown why offline gives 3
-                md.minionList[minion_type]["drops"][md.getID[f"{minion_type} Log"]] = 4
-            else:
-                md.minionList[minion_type]["drops"][md.getID[f"{minion_type} Log"]] = 3
-        if minion_type == "Flower":
-            if afk_toggle and self.variables["specialLayout"]["var"].get():
-                # tall flows blocked by string
-                md.minionList[minion_type]["drops"] = {"YELLOW_FLOWER": 1 / 10, "RED_ROSE": 1 / 10, "SMALL_FLOWER": 8 / 10}
-            else:
-                md.minionList[minion_type]["drops"] = {"YELLOW_FLOWER": 1 / 14, "RED_ROSE": 1 / 14, "SMALL_FLOWER": 8 / 14, "LARGE_FLOWER": 4 / 14}
-
-        # calculate final minion speed
-        base_speed = md.minionList[minion_type]["speed"][minion_tier]
-        secondsPaction = base_speed / (1 + speedBonus / 100)
-        if minion_fuel == "INFERNO_FUEL":
-            secondsPaction /= 1 + md.infernofuel_data["grades"][md.getID[self.variables["infernoGrade"]["var"].get()]]
-
-        # time calculations
-        if self.variables["often_empty"]["var"].get():
-            emptytimeNumber = self.time_number(self.emptytimelength.get(), self.emptytimeamount.get(), secondsPaction, actionsPerHarvest)
-            timeNumber = self.time_number(self.totaltimelength.get(), self.totaltimeamount.get(), secondsPaction, actionsPerHarvest)
-            timeratio = timeNumber / emptytimeNumber
-            self.variables["emptytime"]["var"].set(f"{self.emptytimeamount.get()} {self.emptytimelength.get()}")
-        else:
-            emptytimeNumber = self.time_number(self.totaltimelength.get(), self.totaltimeamount.get(), secondsPaction, actionsPerHarvest)
-            timeratio = 1
-        self.variables["time"]["var"].set(f"{self.totaltimeamount.get()} {self.totaltimelength.get()}")
-        if self.emptytimelength.get() == "Harvests":
-            harvestsPerTime = self.emptytimeamount.get()
-        else:
-            harvestsPerTime = emptytimeNumber / (actionsPerHarvest * secondsPaction)
-        self.variables["actiontime"]["var"].set(secondsPaction)
-        self.variables["harvests"]["var"].set(minion_amount * harvestsPerTime * timeratio)
-
-        # drop multiplier online/offline mode
-        if not afk_toggle:
-            harvestsPerTime *= dropMultiplier
-            dropMultiplier = 1
-
-        # base drops
-        for item, amount in md.minionList[minion_type]["drops"].items():
-            self.variables["items"]["list"][item] = harvestsPerTime * amount * dropMultiplier
-
-        # upgrade drops
-        # create seperate dict to keep it separate from the main drops
-        # because some upgrades use main drops to generate something
-        upgrade_drops = {}
-        spreading_drops = {}
-        cooldown_drops = {}
-        for upgrade in upgrades:
-            upgrade_type = md.itemList[upgrade]["upgrade"]["special"]["type"]
-            if "replace" in upgrade_type:
-                # replacing upgrades are like Auto Smelters
-                items = list(self.variables["items"]["list"].keys())
-                for item in items:
-                    if item in md.itemList[upgrade]["upgrade"]["special"]["list"]:
-                        self.variables["items"]["list"][md.itemList[upgrade]["upgrade"]["special"]["list"][item]] = self.variables["items"]["list"].pop(item)
-            if upgrade_type == "generate":
-                # generating upgrades are like Diamond Spreadings
-                finalAmount = 0
-                spreading_chance = md.itemList[upgrade]["upgrade"]["special"]["chance"]
-                for amount in self.variables["items"]["list"].values():
-                    finalAmount += spreading_chance * amount
-                if minion_fuel == "INFERNO_FUEL" and afk_toggle:
-                    finalAmount /= 5
-                for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
-                    if item not in spreading_drops:
-                        spreading_drops[item] = 0
-                    spreading_drops[item] += finalAmount * amount
-            elif upgrade_type == "add":
-                # adding upgrades are like Corrupt Soils
-                for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
-                    if item not in upgrade_drops:
-                        upgrade_drops[item] = 0
-                    upgrade_drops[item] += harvestsPerTime * amount
-            elif upgrade_type == "timer":
-                # timer upgrades are like Soulflow Engines
-                if afk_toggle and upgrade == "LESSER_SOULFLOW_ENGINE" and "SOULFLOW_ENGINE" in upgrades:
-                    continue  # Soulflow Engine overrides Lesser Soulflow Engine while online
-                effective_cooldown = md.itemList[upgrade]["upgrade"]["special"]["cooldown"]
-                for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
-                    if item not in cooldown_drops:
-                        cooldown_drops[item] = 0
-                    cooldown_drops[item] += amount * emptytimeNumber / effective_cooldown
-
-        # other upgrades behaviours
-        if afk_toggle:
-            if "CORRUPT_SOIL" in upgrades:
-                if "afkcorrupt" in md.minionList[minion_type]:
-                    # Certain mob minions get more corrupt drops when afking
-                    # It is not a constant multiplier, it is equivalent in chance to the main drops of the minion
-                    upgrade_drops["SULPHUR_ORE"] *= md.minionList[minion_type]["afkcorrupt"]
-                    upgrade_drops["CORRUPTED_FRAGMENT"] *= md.minionList[minion_type]["afkcorrupt"]
-                if minion_type == "Chicken" and "ENCHANTED_EGG" not in upgrades:
-                    # Online Chicken minion without Enchanted Egg does not make corrupt drops
-                    upgrade_drops["SULPHUR_ORE"] = 0
-                    upgrade_drops["CORRUPTED_FRAGMENT"] = 0
-            if "ENCHANTED_EGG" in upgrades:
-                # Enchanted Eggs make one laid egg and one egg on kill while AFKing
-                # the egg on spawn is affected by drop multipliers
-                upgrade_drops["EGG"] *= 1 + dropMultiplier
-        else:
-            if "ENCHANTED_SHEARS" in upgrades:
-                # No wool gets added from Enchanted Shears when offline
-                upgrade_drops["WOOL"] = 0
-        if "SOULFLOW_ENGINE" in upgrades and minion_type == "Voidling":
-            cooldown_drops["RAW_SOULFLOW"] *= 1 + 0.03 * minion_tier  # correct most likely, needs testing
-
-        # spreading upgrades triggering from some upgrade drops
-        for upgrade in upgrades:
-            upgrade_type = md.itemList[upgrade]["upgrade"]["special"]["type"]
-            if upgrade_type != "generate":
-                continue
-            else:
-                spreading_chance = md.itemList[upgrade]["upgrade"]["special"]["chance"]
-                if afk_toggle:
-                    if "ENCHANTED_EGG" in upgrades:
-                        # the egg on spawn triggers spreadings
-                        for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
-                            if item not in spreading_drops:
-                                spreading_drops[item] = 0
-                            spreading_drops[item] += harvestsPerTime * dropMultiplier * spreading_chance * amount
-                else:
-                    finalAmount = 0
-                    for amount in upgrade_drops.values():
-                        finalAmount += spreading_chance * amount
-                    for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
-                        if item not in spreading_drops:
-                            spreading_drops[item] = 0
-                        spreading_drops[item] += finalAmount * amount
-
-        # Inferno minion fuel drops
-        # https://wiki.hypixel.net/Inferno_Minion_Fuel
-        if minion_fuel == "INFERNO_FUEL":
-            # distilate drops
-            distilate = md.getID[self.variables["infernoDistillate"]["var"].get()]
-            distilate_item = md.infernofuel_data["distilates"][distilate][0]
-            amount_per = md.infernofuel_data["distilates"][distilate][1]
-            distillate_harvests = (harvestsPerTime * 4) / 5
-            upgrade_drops[distilate_item] = distillate_harvests * amount_per
-            static_items = list(self.variables["items"]["list"].keys())  # create copy to edit list while looping it
-            for item in static_items:  # replacing main drops with distilate drops
-                self.variables["items"]["list"][item] /= 5
-
-            # Hypergolic drops
-            if self.variables["infernoGrade"]["var"].get() == "Hypergolic Gabagool":  # hypergolic fuel stuff
-                multiplier = 1
-                if self.variables["infernoEyedrops"]["var"].get() is True:  # Capsaicin Eyedrops
-                    multiplier = 1.3
-                for item, chance in md.infernofuel_data["drops"].items():
-                    upgrade_drops[item] = 0
-                    if item == "INFERNO_APEX" and minion_tier >= 10:  # Apex Minion perk
-                        chance *= 2
-                    upgrade_drops[item] += multiplier * chance * harvestsPerTime
-                upgrade_drops["HYPERGOLIC_IONIZED_CERAMICS"] = emptytimeNumber / md.itemList[minion_fuel]["upgrade"]["duration"]
-
-            # calculate fuel cost
-            infernofuel_components = {"INFERNO_FUEL_BLOCK": 2,  # 2 inferno fuel blocks
-                                      distilate: 6,  # 6 times distilate item
-                                      md.getID[self.variables["infernoGrade"]["var"].get()]: 1,  # 1 gabagool core
-                                      "CAPSAICIN_EYEDROPS_NO_CHARGES": int(self.variables["infernoEyedrops"]["var"].get())  # capsaicin eyedrops
-                                      }
-            costPerInfernofuel = 0
-            for component_ID, amount in infernofuel_components.items():
-                costPerInfernofuel += amount * self.getPrice(component_ID, action="buy", location="bazaar")
-            md.itemList["INFERNO_FUEL"]["prices"]["custom"] = costPerInfernofuel
-            # the fuel cost is put into the item data to be used later in the general fuel cost calculator
-            pass
-
-
-        # add upgrade drops to main item list
-        upgrade_drops.update(spreading_drops)
-        upgrade_drops.update(cooldown_drops)
-        for item, amount in upgrade_drops.items():
-            if item not in self.variables["items"]["list"]:
-                self.variables["items"]["list"][item] = 0
-            self.variables["items"]["list"][item] += amount
-
-        # (Super) Compactor logic at the end because it applies to all drops
-        # for both compactor types it floors the ratio between items and needed items for one compacted
-        # multiplies the floored ratio if the action creates multiple compacted item
-        # uses modulo to find the left over amount
-        # keeps track of which items have been compacted to check for loss of profit
-        # saves per item the following dict
-        # {"from": item, "makes": compact item, "amount": amount of compacted, "per": amount of item needed}
-        compacted_items = []
-        # Compactors
-        # loops once through item list because there are no double normal compacted items
-        if "compact" in upgrades_types:
-            static_items = list(self.variables["items"]["list"].items())
-            for item, amount in static_items:
-                if item in md.compactorList:
-                    compact_name = md.compactorList[item]["makes"]
-                    percompact = md.compactorList[item]["per"]
-                    compact_amount = int(amount / percompact)
-                    if compact_amount == 0:
-                        continue
-                    if "amount" in md.compactorList[item]:
-                        compact_amount *= md.compactorList[item]["amount"]
-                    left_over = amount % percompact
-                    if left_over == 0.0:  # floating point error may cause extremely small numbers that should have been 0 too not trigger this
-                        del self.variables["items"]["list"][item]
-                    else:
-                        self.variables["items"]["list"][item] = left_over
-                    self.variables["items"]["list"][compact_name] = compact_amount
-                    compacted_items.append({"from": item, **md.compactorList[item]})
-            pass
-
-        # Super compactor
-        # loops continously through the item list until is cannot find something to compact
-        if "enchant" in upgrades_types:
-            found_enchantable = True
-            safety_lock = 0
-            while found_enchantable is True:
-                safety_lock += 1
-                if safety_lock >= 10:  # safety to prevent an infinite while loop
-                    self.catch_warning("While-loop overflow, super compactor 3000")
-                    break
-                found_enchantable = False
-                static_items = list(self.variables["items"]["list"].items())
-                for item, amount in static_items:
-                    if item in md.enchanterList:
-                        enchanted_name = md.enchanterList[item]["makes"]
-                        perenchanted = md.enchanterList[item]["per"]
-                        enchanted_amount = int(amount / perenchanted)
-                        if enchanted_amount == 0:
-                            continue
-                        if "amount" in md.enchanterList[item]:
-                            enchanted_amount *= md.enchanterList[item]["amount"]
-                        left_over = amount % perenchanted
-                        if left_over == 0.0:
-                            del self.variables["items"]["list"][item]
-                        else:
-                            self.variables["items"]["list"][item] = left_over
-                        self.variables["items"]["list"][enchanted_name] = enchanted_amount
-                        compacted_items.append({"from": item, **md.enchanterList[item]})
-                        if enchanted_name in md.enchanterList:
-                            found_enchantable = True
-
-        # storage calculations
-        # amount of storage measured in slots
-        available_storage = md.minion_chests[self.variables["chest"]["var"].get()]
-        if "storage" in md.minionList[minion_type] and minion_tier in md.minionList[minion_type]["storage"]:
-            available_storage += md.minionList[minion_type]["storage"][minion_tier]
-        else:
-            available_storage += md.standard_storage[minion_tier]
-
-        # WARNING: calculation for fill_time does not work with compactors and is not accurate for setup with multiple drops
-        # used_storage_slots calculations work fine.
-        used_storage = 0
-        used_storage_slots = 0
-        for itemtype, amount in self.variables["items"]["list"].items():
-            used_storage += amount / 64  # hypixel does not care about smaller max stack sizes
-            used_storage_slots += np.ceil(amount / 64)
-        fill_time = (emptytimeNumber * available_storage) / used_storage
-        self.variables["filltime"]["var"].set(fill_time)
-        self.variables["used_storage"]["var"].set(used_storage_slots)
-        self.variables["available_storage"]["var"].set(available_storage)
-
-        # multiply drops by minion amount
-        # all processes as calculated above should be linear with minion amount
-        for itemtype in self.variables["items"]["list"].keys():
-            self.variables["items"]["list"][itemtype] *= minion_amount
-
-        # convert items into coins and xp
-        # while keeping track where items get sold
-        # it makes a list of all prices and takes the one that matches the choice of sellLoc
-        minion_hopper = self.variables["hopper"]["var"].get()
-        minion_sellLoc = self.variables["sellLoc"]["var"].get()
-        coinsPerTime = 0.0
-        sellto = "NPC"
-        hopper_multiplier = 1
-        if minion_sellLoc == "Bazaar":
-            sellto = "bazaar"
-        elif minion_sellLoc == "Best (NPC/Bazaar)":
-            sellto = "best"
-        elif minion_sellLoc == "Hopper":
-            hopper_multiplier = md.hopper_data[minion_hopper]
-        prices = {}
-        # Coins
-        if minion_sellLoc != "None":
-            for itemtype, amount in self.variables["items"]["list"].items():
-                prices.clear()
-                prices["NPC"] = self.getPrice(itemtype, "sell", "npc")
-                prices["bazaar"] = self.getPrice(itemtype, "sell", "bazaar")
-                if sellto in prices:
-                    self.variables["itemSellLoc"]["list"][itemtype] = sellto
-                    final_price = prices[sellto]
-                else:
-                    self.variables["itemSellLoc"]["list"][itemtype] = max(prices, key=prices.get)
-                    final_price = prices[self.variables["itemSellLoc"]["list"][itemtype]]
-                self.variables["itemtypeProfit"]["list"][itemtype] = amount * final_price * hopper_multiplier
-                coinsPerTime += amount * final_price
-        # XP
-        for itemtype, amount in self.variables["items"]["list"].items():
-            xptype, value = list(*md.itemList[itemtype]["xp"].items())
-            if value == 0:
-                continue
-            if xptype not in self.variables["xp"]["list"]:
-                self.variables["xp"]["list"][xptype] = 0
-            self.variables["xp"]["list"][xptype] += amount * value * (1 + self.variables["wisdom"]["list"][xptype].get() / 100)
-        if mayor == "Derpy":
-            for xptype in self.variables["xp"]["list"].keys():
-                self.variables["xp"]["list"][xptype] *= 1.5
-        coinsPerTime *= hopper_multiplier
-        self.variables["itemProfit"]["var"].set(coinsPerTime * timeratio)
-        if afk_toggle and self.variables["playerHarvests"]["var"].get() and "combat" in self.variables["xp"]["list"]:
-            del self.variables["xp"]["list"]["combat"]
-
-        # Check for over-compacting
-        if sellto in ["best", "bazaar"]:
-            overcompacting = []
-            for data in compacted_items:
-                item = data["from"]
-                compact_item = data["makes"]
-                per_compact = data["per"]
-                compact_amount = 1
-                if "amount" in data:
-                    compact_amount = data["amount"]
-                cost = self.getPrice(item, "sell", "bazaar") * per_compact
-                compact_cost = self.getPrice(compact_item, "sell", "bazaar") * compact_amount
-                if cost - compact_cost > compact_tolerance:
-                    overcompacting.append(md.itemList[item]['display'])
-            if len(overcompacting) != 0:
-                self.variables["notes"]["list"]["Over-compacting"] = ', '.join(overcompacting)
-
-        # Pet leveling calculations
-        # https://wiki.hypixel.net/Pets#Leveling
-        # for Golden Dragon: special algorithm taking into account that pet items cannot be applied to Golden Dragon Eggs
-        # the pet costs are manually added in pet_data
-        petProfitPerTime = 0.0
-        all_pets = {"levelingpet": {"pet": self.variables["levelingpet"]["var"].get(), "pet_xp": {}, "levelled_pets": 0.0},
-                    "expsharepet": {"pet": self.variables["expsharepet"]["var"].get(), "pet_xp": {"exp_share": 0.0}, "levelled_pets": 0.0},
-                    "expsharepetslot2": {"pet": self.variables["expsharepetslot2"]["var"].get(), "pet_xp": {"exp_share": 0.0}, "levelled_pets": 0.0},
-                    "expsharepetslot3": {"pet": self.variables["expsharepetslot3"]["var"].get(), "pet_xp": {"exp_share": 0.0}, "levelled_pets": 0.0}
-                    }
-        main_pet = self.variables["levelingpet"]["var"].get()
-        main_pet_xp = all_pets["levelingpet"]["pet_xp"]
-        if main_pet != "None":
-            if main_pet in ["Golden Dragon", "Jade Dragon"]:
-                left_over_pet_xp = 0.0
-                for skill, amount in self.variables["xp"]["list"].items():
-                    pet_xp_boost, xp_boost_pet_item = self.getPetXPBoosts(main_pet, skill)
-                    main_pet_xp[skill], left_over_pet_xp = self.dragon_xp(amount, left_over_pet_xp, pet_xp_boost, xp_boost_pet_item)
-            else:
-                for skill, amount in self.variables["xp"]["list"].items():
-                    pet_xp_boost, xp_boost_pet_item = self.getPetXPBoosts(main_pet, skill)
-                    main_pet_xp[skill] = amount * pet_xp_boost * xp_boost_pet_item
-            exp_share_boost = 0.2 * self.variables["taming"]["var"].get() + 10 * (self.variables["mayor"]["var"].get() == "Diana") + self.variables["toucan_attribute"]["var"].get()
-            exp_share_item = 15 * self.variables["expshareitem"]["var"].get()
-            for pet_slot, pet_info in all_pets.items():
-                if pet_slot == "levelingpet":
-                    continue
-                exp_share_pet = pet_info["pet"]
-                if exp_share_pet != "None": 
-                    if exp_share_pet in ["Golden Dragon", "Jade Dragon"]:
-                        if exp_share_boost == 0:
-                            continue
-                        left_over_pet_xp = 0.0
-                        for skill, amount in main_pet_xp.items():
-                            non_matching = self.getPetXPBoosts(exp_share_pet, skill, True)
-                            equiv_pet_xp_boost = non_matching * (exp_share_boost / 100)
-                            equiv_xp_boost_pet_item = 1 + exp_share_item / exp_share_boost
-                            gained_pet_xp, left_over_pet_xp = self.dragon_xp(amount, left_over_pet_xp, equiv_pet_xp_boost, equiv_xp_boost_pet_item)
-                            pet_info["pet_xp"]["exp_share"] += gained_pet_xp
-                    else:
-                        for skill, amount in main_pet_xp.items():
-                            non_matching = self.getPetXPBoosts(exp_share_pet, skill, True)
-                            pet_info["pet_xp"]["exp_share"] += amount * ((exp_share_boost + exp_share_item * (exp_share_pet != "Golden Dragon (lvl 1-100)")) / 100) * non_matching
-                if mayor != "Diana":
-                    break
-            exp_share_price = self.getPrice("PET_ITEM_EXP_SHARE", "buy", "custom", True)
-            if exp_share_price == 0:
-                exp_share_price = self.getPrice("PET_ITEM_EXP_SHARE_DROP", "buy", "bazaar") + 72 * self.getPrice("ENCHANTED_GOLD", "buy", "bazaar")
-            for pet_slot, pet_info in all_pets.items():
-                self.variables["pets_levelled"]["list"][pet_slot] = sum(pet_info["pet_xp"].values()) / md.max_lvl_pet_xp_amounts[md.all_pets[pet_info["pet"]]["rarity"]]
-                if pet_info["pet"] not in pet_costs:
-                    self.variables["notes"]["list"]["Pet Costs"] = f"{pet_info['pet']} is not in pet_costs."
-                else:
-                    petProfitPerTime += self.variables["pets_levelled"]["list"][pet_slot] * (pet_costs[pet_info["pet"]]["max"] - pet_costs[pet_info["pet"]]["min"])
-                if pet_slot == "levelingpet" and (main_pet_item := self.variables["petxpboost"]["var"].get()) != "None":
-                    petProfitPerTime -= self.variables["pets_levelled"]["list"][pet_slot] * self.getPrice(md.getID[main_pet_item], "buy", "custom", True)
-                elif self.variables["expshareitem"]["var"].get():
-                    petProfitPerTime -= self.variables["pets_levelled"]["list"][pet_slot] * exp_share_price
-                self.variables["pets_levelled"]["list"][pet_slot] *= timeratio
-
-        self.variables["petProfit"]["var"].set(petProfitPerTime * timeratio)
-
-        # calculating beacon and limited fuel cost
-        fuelCostPerTime = 0.0
-        neededFuelPerTime = 0.0
-        if minion_beacon != 0:
-            if self.variables["scorched"]["var"].get():
-                beacon_fuel_ID = "SCORCHED_POWER_CRYSTAL"
-            else:
-                beacon_fuel_ID = "POWER_CRYSTAL"
-            costPerCrystal = self.getPrice(beacon_fuel_ID, "buy", "bazaar")
-            fuelCostPerTime += emptytimeNumber * costPerCrystal / md.itemList[beacon_fuel_ID]["duration"] * int(not (self.variables["B_constant"]["var"].get()))
-        if md.itemList[minion_fuel]["upgrade"]["duration"] != 0:
-            costPerFuel = self.getPrice(minion_fuel, "buy", "bazaar")
-            neededFuelPerTime = minion_amount * emptytimeNumber / md.itemList[minion_fuel]["upgrade"]["duration"]
-            fuelCostPerTime += neededFuelPerTime * costPerFuel
-        self.variables["fuelcost"]["var"].set(fuelCostPerTime * timeratio)
-        self.variables["fuelamount"]["var"].set(np.max([neededFuelPerTime * timeratio, minion_amount]))
-
-        # Setup cost
-        total_cost = 0.0
-        # Single minion cost
-        cost_cache = {}
-        tiered_coin_cost = {}
-        tiered_extra_cost = {}
-        tier_loop = np.arange(minion_tier) + 1
-        for tier in tier_loop:
-            tiered_coin_cost[tier] = 0.0
-            if minion_type in md.extraMinionCosts:
-                if tier in md.extraMinionCosts[minion_type]:
-                    if "COINS" in md.extraMinionCosts[minion_type][tier]:
-                        tiered_coin_cost[tier] += md.extraMinionCosts[minion_type][tier]["COINS"]
-                    if len(md.extraMinionCosts[minion_type][tier]) > 1 or "COINS" not in md.extraMinionCosts[minion_type][tier]:
-                        tiered_extra_cost[tier] = {cost_type.replace('_', ' ').title(): amount for cost_type, amount in md.extraMinionCosts[minion_type][tier].items() if cost_type != "COINS"}
-            for item, amount in md.minionCosts[minion_type][tier].items():
-                if item not in cost_cache:
-                    cost_cache[item] = self.getPrice(item, "buy", "bazaar")
-                tiered_coin_cost[tier] += amount * cost_cache[item]
-            if tier != 1:
-                tiered_coin_cost[tier] += tiered_coin_cost[tier - 1]
-            if tier - 1 in tiered_extra_cost:
-                if tier not in tiered_extra_cost:
-                    tiered_extra_cost[tier] = {}
-                for material, amount in tiered_extra_cost[tier - 1].items():
-                    if material not in tiered_extra_cost[tier].items():
-                        tiered_extra_cost[tier][material] = 0
-                    tiered_extra_cost[tier][material] += amount
-        if len(tiered_extra_cost) != 0:
-            self.variables["notes"]["list"]["Extra cost"] = ", ".join([f"{amount} {material}" for material, amount in tiered_extra_cost[minion_tier].items()]) + " per minion"
-            self.variables["extracost"]["var"].set(", ".join([f"{amount * minion_amount} {material}" for material, amount in tiered_extra_cost[minion_tier].items()]))
-        else:
-            self.variables["extracost"]["var"].set("")
-        total_cost += tiered_coin_cost[minion_tier]
-
-        # Infinite fuel cost
-        if minion_fuel != "NONE" and md.itemList[minion_fuel]["upgrade"]["duration"] == 0:
-            if minion_fuel == "EVERBURNING_FLAME" and self.getPrice("EVERBURNING_FLAME", "buy", "custom", True) == 0:
-                for item_ID, amount in md.upgrades_material_cost["EVERBURNING_FLAME"].items():
-                    total_cost += amount * self.getPrice(item_ID, "buy", "bazaar")
-            else:
-                total_cost += self.getPrice(minion_fuel, "buy", "bazaar")
-
-        # Hopper cost
-        if minion_hopper in ["Budget Hopper", "Enchanted Hopper"]:
-            hopper_ID = md.getID[minion_hopper]
-            total_cost += self.getPrice(hopper_ID, "buy", "bazaar")
-
-        # Internal minion upgrades cost
-        for upgrade in upgrades:
-            if upgrade != "NONE":
-                total_cost += self.getPrice(upgrade, "buy", "bazaar")
-
-        # Infusion cost
-        if self.variables["infusion"]["var"].get() is True:
-            total_cost += self.getPrice("MITHRIL_INFUSION", "buy", "bazaar")
-
-        # Free Will costs
-        """
-        Amount of Free Wills needed per minion:
-        Let p be the chance to get a loyal minion.
-        Let X be a r.v. denoting the amount of Free Wills needed.
-        Using first step analysis we get
-        E(X) = (1- p)(E(X) + 1) + p * 1
-        E(X) = (1- p)E(X) + 1 - p + p
-        E(X) = E(X)- pE(X) + 1
-        E(X)= 1/p
-        """
-        free_will_price = self.getPrice("FREE_WILL", "buy", "bazaar")
-        postcard_price = self.getPrice("POSTCARD", "buy", "custom", True)
-        if postcard_price == 0:
-            # If no price found, use the free will price
-            final_postcard_cost = free_will_price
+        # the setup ID does not contain the time inputs
+        prices = self.get_prices()
+        cache_key = (setup_ID, self.totaltimeamount.get(), self.totaltimelength.get(), self.emptytimeamount.get(), self.emptytimelength.get(),
+                     prices.version, self.rising_celsius_override)
+        result = self.result_cache.get(cache_key)
+        cached = result is not None
+        if result is None:
+            result = self.evaluator.evaluate(self.get_setup(), prices, **self.evaluate_settings(prices), timers=timers)
+            self.result_cache.put(cache_key, result)
+        if timers is not None:
+            show_start = time.perf_counter()
+        self.show_result(result)
+        if timers is not None:
+            timers["show_result"] = time.perf_counter() - show_start
+            self.show_stage_timers(setup_ID, timers, cached, time.perf_counter() - calculation_start)
+
+        self.variables["ID"]["var"].set(setup_ID)
+        self.variables["ID_container"]["list"].clear()
+        self.variables["ID_container"]["list"].append(setup_ID)
+
+        # Update listboxes
+        if inGUI is True:
+            for addon_name, auto_run_bool in self.addons_auto_run.items():
+                if auto_run_bool.get():
+                    self.addons_list[addon_name](self)
+            self.update_GUI()
+            self.statusC.configure(bg="green")
+            self.statusC.update()
+        return
+
+    def show_stage_timers(self, setup_ID, timers, cached, total_time):
+        """
+        Shows the stage times of a calculation in the Add-on Outputs and saves them in stage_timers_file.
+
+        Parameters
+        ----------
+        setup_ID : str
+            Setup ID of the calculation.
+        timers : dict
+            Seconds spent per stage, stored as {stage name: seconds}. Stages taken from the previous calculation are not in it.
+        cached : bool
+            True if the result came from the result cache and no stages ran.
+        total_time : float
+            Seconds spent in the whole calculation.
+
+        Returns
+        -------
+        None.
+
+        """
+        report = {"ID": setup_ID,
+                  "result_cache_hit": cached,
+                  "total_ms": total_time * 1000,
+                  "stages_ms": {stage_name: seconds * 1000 for stage_name, seconds in timers.items()},
+                  "last_bazaar_update_ms": self.bazaar_duration * 1000,
+                  "last_bazaar_stats": self.bazaar_stats.last}
+        if cached:
+            output_str = f"{report['total_ms']:.3f} ms, result cache hit"
         else:
-            final_postcard_cost = postcard_price
-        if self.variables["free_will"]["var"].get() is True:
-            tiered_free_will = {}
-            for tier in tier_loop:
-                free_wills_needed = 1 / (0.5 + 0.04 * (tier - 1))
-                # for each failed Free Will we need another minion and we get a postcard
-                # the last Free Will will not give a post card
-                free_wills_failed = free_wills_needed - 1
-                tiered_free_will[tier] = free_wills_failed * (tiered_coin_cost[tier] - final_postcard_cost) + free_wills_needed * free_will_price
-            optimal = min(tiered_free_will, key=tiered_free_will.get)
-            self.variables["optimal_tier_free_will"]["var"].set(optimal)
-            self.variables["notes"]["list"]["Free Will"] = f"per minion, apply {1 / (0.5 + 0.04 * (optimal - 1)):.2} Free Wills on Tier {optimal}"
-            self.variables["freewillcost"]["var"].set(tiered_free_will[optimal] * minion_amount)
-
-        # Storage Chest cost
-        if self.variables["chest"]["var"].get() != "None":
-            chest_ID = md.getID[self.variables["chest"]["var"].get()]
-            total_cost += self.getPrice(chest_ID, "buy", "bazaar")
-        
-        # multiply by minion amount
-        total_cost *= minion_amount
+            output_str = f"{report['total_ms']:.3f} ms, " + ", ".join([f"{stage_name} {ms:.3f}" for stage_name, ms in report["stages_ms"].items()])
+        self.collect_addon_output("Stage Timers", output_str)
+        if stage_timers_file is not None:
+            try:
+                with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), stage_timers_file), "w") as file:
+                    json.dump(report, file, indent=4)
+            except OSError as error:
+                print(f"WARNING: Could not save stage timers\n{error}")
+        return
 
-        # Beacon cost
-        if minion_beacon != 0 and not self.variables["B_acquired"]["var"].get():
-            for i in np.arange(minion_beacon) + 1:
-                for item_ID, amount in md.upgrades_material_cost["beacon"][i].items():
-                    total_cost += amount * self.getPrice(item_ID, "buy", "bazaar")
+    def evaluate_setups(self, setups, workers=1, prices=None):
+        """
+        Evaluates multiple setups with the current prices and calculator settings, without changing self.variables.
+        Meant for add-ons that loop over many setups.
 
-        # Floating Crystal cost
-        if self.variables["crystal"]["var"].get() != "None":
-            for item_ID, amount in md.upgrades_material_cost["crystal"][self.variables["crystal"]["var"].get()].items():
-                total_cost += amount * self.getPrice(item_ID, "buy", "bazaar")
+        Parameters
+        ----------
+        setups : list
+            List of setup dicts, see get_setup().
+        workers : int, optional
+            Amount of worker processes. 1 evaluates on the GUI thread, 0 uses one worker per CPU core. The default is 1.
+        prices : minion_engine.PriceSnapshot, optional
+            Prices used for all setups, for add-ons that evaluate in multiple steps with the same prices. The default is None, for get_prices().
 
-        # Postcard cost
-        if self.variables["postcard"]["var"].get():
-            total_cost += final_postcard_cost
+        Returns
+        -------
+        list
+            List of minion_engine.Result, in the same order as setups.
 
-        # Potato Talisman cost
-        if self.variables["potatoTalisman"]["var"].get():
-            total_cost += self.getPrice("POTATO_TALISMAN", "buy", "custom", True)
+        """
+        # all setups use the same prices, read once because the refresher thread can swap self.prices at any time
+        if prices is None:
+            prices = self.get_prices()
+        return engine.evaluate_many(setups, prices, workers=workers, **self.evaluate_settings(prices))
 
-        # Attribute costs
-        if self.variables["toucan_attribute"]["var"].get() != 0:
-            total_cost += md.attribute_shards["Epic"][self.variables["toucan_attribute"]["var"].get()] * self.getPrice("SHARD_TOUCAN", "buy", "bazaar")
-        if self.variables["falcon_attribute"]["var"].get() != 0:
-            total_cost += md.attribute_shards["Rare"][self.variables["falcon_attribute"]["var"].get()] * self.getPrice("SHARD_FALCON", "buy", "bazaar")
+    def get_prices(self):
+        """
+        Returns the current prices.
+        With bazaar_auto_update on, these are kept up to date by the refresher thread,
+        this never waits on the bazaar and the returned snapshot is never changed afterwards.
 
+        Returns
+        -------
+        minion_engine.PriceSnapshot
+            Current prices.
 
-        # Sending results to self.variables
-        self.variables["setupcost"]["var"].set(total_cost)
-        self.variables["totalProfit"]["var"].set(self.variables["itemProfit"]["var"].get() + self.variables["petProfit"]["var"].get() - self.variables["fuelcost"]["var"].get())
+        """
+        return self.prices
 
-        # multiply final lists by timeratio
-        for loop_key in ["items", "itemtypeProfit", "xp"]:
-            for item in self.variables[loop_key]["list"]:
-                self.variables[loop_key]["list"][item] *= timeratio
+    def evaluate_settings(self, prices):
+        """
+        Returns the calculator settings used by minion_engine.evaluate().
 
-        # Construct ID
-        setup_ID = self.constructID()
-        self.variables["ID"]["var"].set(setup_ID)
-        self.variables["ID_container"]["list"].clear()
-        self.variables["ID_container"]["list"].append(setup_ID)
+        Parameters
+        ----------
+        prices : minion_engine.PriceSnapshot
+            Prices of the evaluation, from get_prices(). With ah_auto_update on, the pet costs are taken from these prices,
+            not from self.prices, which the refresher thread can swap between reading the prices and the settings.
 
-        # Get minion notes
-        if "notes" in md.minionList[self.variables["minion"]["var"].get()]:
-            self.variables["notes"]["list"].update(md.minionList[self.variables["minion"]["var"].get()]["notes"].copy())
+        Returns
+        -------
+        dict
+            Keyword arguments for minion_engine.evaluate(), minion_engine.evaluate_many() and minion_optimizer.
 
+        """
+        used_pet_costs = {**pet_costs, **prices.pet_costs} if ah_auto_update else pet_costs
+        return {"pet_costs": used_pet_costs, "compact_tolerance": compact_tolerance, "rising_celsius_override": self.rising_celsius_override}
 
+    def show_result(self, result):
+        """
+        Sends the outputs of an evaluation to self.variables.
+        List outputs from the previous calculation are cleared.
 
-        # Update listboxes
-        if inGUI is True:
-            for addon_name, auto_run_bool in self.addons_auto_run.items():
-                if auto_run_bool.get():
-                    self.addons_list[addon_name](self)
-            self.update_GUI()
-            self.statusC.configure(bg="green")
-            self.statusC.update()
-        return        
+        Parameters
+        ----------
+        result : minion_engine.Result
+            Result of minion_engine.evaluate().
+
+        Returns
+        -------
+        None.
+
+        """
+        # clear list outputs from previous calculation
+        for var_key, var_data in self.variables.items():
+            if var_data["vtype"] == "list":
+                if var_key == "wisdom":
+                    continue
+                var_data["list"].clear()
+
+        # Sending results to self.variables
+        for var_key, value in result.outputs.items():
+            if self.variables[var_key]["vtype"] == "list":
+                self.variables[var_key]["list"].update(value)
+            else:
+                self.variables[var_key]["var"].set(value)
+        return
 
     def update_bazaar(self, cooldown_warning=True):
         """
         Checks if a bazaar_cooldown amount of seconds has passed,
         calls to Hypixel API for most recent bazaar data,
         handles that data to calculate accurate buy and sell prices.
-        To get accurate prices, it takes a top percentage (top 10% default) of the orders and takes the average of them.
+        To get accurate prices, it takes a top percentage (bazaar_top_percent) of the orders and takes the average of them.
+        Waits for the API calls, see refresh_loop() for updating in the background.
 
         Parameters
         ----------
@@ -1917,83 +1523,131 @@ class Calculator(tk.Tk):
         None
 
         """
-        if time.time() - self.bazaar_timer < bazaar_cooldown and self.bazaar_timer != 0:
-            if cooldown_warning:
-                print("BAZAAR: Bazaar is on cooldown")
-            return
-        print("BAZAAR: Calling Bazaar")
-        try:
-            f = urllib.request.urlopen(r"https://api.hypixel.net/v2/skyblock/bazaar")
-            call_data = f.read().decode('utf-8')
-        except Exception as error:
-            print(f"ERROR: Could not finish API call\n{error}")
-            return
-        raw_data = json.loads(call_data)
-        if "success" not in raw_data or raw_data["success"] is False:
-            print("ERROR: API call was unsuccessful")
+        self.fetch_prices(cooldown_warning)
+        self.show_bazaar_time()
+        return
+
+    def fetch_prices(self, cooldown_warning=True):
+        """
+        Builds a complete new PriceSnapshot from the API data and swaps it in as self.prices.
+        Does not touch the GUI, so it can run on the refresher thread.
+
+        Parameters
+        ----------
+        cooldown_warning : bool
+            Toggle if a terminal message should be printed if the bazaar update cooldown has not passed yet.
+
+        Returns
+        -------
+        None
+
+        """
+        # only one update at a time, a second caller waits and then finds the bazaar on cooldown
+        with self.bazaar_lock:
+            if time.time() - self.bazaar_timer < bazaar_cooldown and self.bazaar_timer != 0:
+                if cooldown_warning:
+                    print("BAZAAR: Bazaar is on cooldown")
+                return
+            self.bazaar_attempt = time.time()
+            print("BAZAAR: Calling Bazaar and Coflnet")
+            # all API calls run at the same time, the bazaar is parsed while downloading and only the products in md.itemList are kept
+            if ah_auto_update:
+                fetched = self.fetcher.fetch_all(md.itemList, md.ah_items, market_data.ah_pets)
+            else:
+                fetched = self.fetcher.fetch_all(md.itemList, ["POSTCARD"])
+            self.bazaar_duration = time.time() - self.bazaar_attempt
+            stats = {"time": self.bazaar_attempt, "success": False, **fetched["bazaar_stats"]}
+            raw_data = fetched["bazaar"]
+            if raw_data is None:
+                self.update_AH(fetched)
+                self.bazaar_stats.record({**stats, "total_time": time.time() - self.bazaar_attempt})
+                return
+            if "success" not in raw_data or raw_data["success"] is False:
+                print("ERROR: API call was unsuccessful")
+                self.update_AH(fetched)
+                self.bazaar_stats.record({**stats, "total_time": time.time() - self.bazaar_attempt})
+                return
+            print("BAZAAR: Bazaar call successful")
+            self.bazaar_timer = raw_data["lastUpdated"] / 1000
+            print("BAZAAR: Processing data")
+            # the prices are written into a new snapshot, md.itemList keeps the base prices
+            prices = engine.item_list_snapshot(self.bazaar_timer)
+            market_data.apply_bazaar_prices(prices, raw_data["products"], bazaar_top_percent, stats)
+            print("BAZAAR: Processing complete")
+            self.update_AH(fetched, prices)
+            # swapping the reference is atomic, calculations keep the snapshot they started with
+            self.prices = prices
+            if bazaar_snapshot_file is not None:
+                market_data.save_snapshot(prices, os.path.join(os.path.dirname(os.path.abspath(__file__)), bazaar_snapshot_file))
+            self.bazaar_duration = time.time() - self.bazaar_attempt
+            stats["success"] = True
+            self.bazaar_stats.record({**stats, "total_time": self.bazaar_duration})
             return
-        print("BAZAAR: Bazaar call successful")
-        self.bazaar_timer = raw_data["lastUpdated"] / 1000
-        self.variables["bazaar_update_txt"]["var"].set(time.strftime("%Y-%m-%d %H:%M:%S UTC%z", time.localtime(self.bazaar_timer)))
-        top_percent = 0.1
-        print("BAZAAR: Processing data")
-        for itemtype, item_data in md.itemList.items():
-            if itemtype not in raw_data["products"]:
-                continue
-            for action in ["buy", "sell"]:
-                top_amount = top_percent * sum([order["amount"] for order in raw_data["products"][itemtype][f"{action}_summary"]])
-                if top_amount == 0:
-                    item_data["prices"][f"{action}Price"] = 0
-                    if "npc" not in item_data["prices"]:
-                        print(f"BAZAAR: no {action} supply for {itemtype}")
-                    continue
-                counter = top_amount
-                top_sum = 0
-                for order in raw_data["products"][itemtype][f"{action}_summary"]:
-                    if counter <= 0:
-                        break
-                    if counter >= order["amount"]:
-                        top_sum += order["amount"] * order["pricePerUnit"]
-                        counter -= order["amount"]
-                    else:
-                        top_sum += counter * order["pricePerUnit"]
-                        counter = 0
-                        break
-                top_percent_avg_price = top_sum / top_amount
-                top_price = raw_data["products"][itemtype][f"{action}_summary"][0]["pricePerUnit"]
-                if top_price / top_percent_avg_price >= 2.5:
-                    item_data["prices"][f"{action}Price"] = top_price
-                    print(f"BAZAAR: bottom heavy {action} supply for {itemtype}, taking top order price")
-                else:
-                    item_data["prices"][f"{action}Price"] = top_percent_avg_price
-        print("BAZAAR: Processing complete")
-        self.update_AH()
+
+    def refresh_loop(self):
+        """
+        Runs on the refresher thread, updates the prices every bazaar_cooldown seconds until self.refresh_stop is set.
+        Failed updates are tried again after bazaar_cooldown seconds.
+
+        Returns
+        -------
+        None.
+
+        """
+        while True:
+            next_update = max(self.bazaar_timer, self.bazaar_attempt) + bazaar_cooldown
+            if self.refresh_stop.wait(max(1, next_update - time.time())):
+                return
+            try:
+                self.fetch_prices(cooldown_warning=False)
+            except Exception as error:
+                print(f"ERROR: Background bazaar update failed\n{error}")
+
+    def poll_refresher(self):
+        """Shows the time of the latest bazaar update made by the refresher thread, repeats every second on the GUI thread."""
+        self.show_bazaar_time()
+        if not self.refresh_stop.is_set():
+            self.after(1000, self.poll_refresher)
+        return
+
+    def show_bazaar_time(self):
+        """Shows the time of the bazaar data of self.prices in the GUI."""
+        if self.prices.last_updated != 0:
+            self.variables["bazaar_update_txt"]["var"].set(time.strftime("%Y-%m-%d %H:%M:%S UTC%z", time.localtime(self.prices.last_updated)))
         return
 
-    def update_AH(self):
+    def update_AH(self, fetched, prices=None):
         """
-        Currently: Updates price of Postcard.
-        In the future: Updates Auction House prices.
+        Writes the AH prices fetched by update_bazaar() into a PriceSnapshot.
+        AH only items and pets that could not be fetched keep their last known price.
 
         AH data from https://sky.coflnet.com/api
 
+        Parameters
+        ----------
+        fetched : dict
+            Return of market_data.MarketFetcher.fetch_all().
+        prices : minion_engine.PriceSnapshot, optional
+            Snapshot to write the AH prices in. The default is None, for a copy of self.prices that replaces self.prices.
+
         Returns
         -------
         None.
 
         """
-        
-        try:
-            postcard_url = r"https://sky.coflnet.com/api/item/price/POSTCARD"
-            req = urllib.request.Request(postcard_url, headers={'User-Agent': f"Minion Calculator v{self.version.get()} (Python)", })
-            f = urllib.request.urlopen(req)
-            call_data = f.read().decode('utf-8')
-        except Exception as error:
-            print(f"ERROR: Could not finish API call to Coflnet\n{error}")
+        pet_prices = {**self.prices.pet_costs, **fetched["pets"]}
+        if prices is None:
+            prices = self.prices.overlay({ID: {market_data.ah_prices[ID]: price} for ID, price in fetched["ah"].items()})
+            self.prices = engine.PriceSnapshot(prices.prices, prices.last_updated, pet_prices)
             return
-        raw_data = json.loads(call_data)
-        md.itemList["POSTCARD"]["prices"]["custom"] = raw_data["mode"]
+        for ID, price in fetched["ah"].items():
+            prices.prices[ID][market_data.ah_prices[ID]] = price
+        for ID in market_data.ah_prices:
+            if ID not in fetched["ah"]:
+                prices.prices[ID][market_data.ah_prices[ID]] = self.prices.prices[ID][market_data.ah_prices[ID]]
+        prices.pet_costs = pet_prices
         return
+
     def update_GUI(self):
         """
         Creates an array for the listbox out of the list storage of self.variables with "vtype" equal to "list"
@@ -2066,6 +1720,7 @@ def start_app():
     App = Calculator()
     App.mainloop()
     print("CLOSING: Exited mainloop")
+    App.refresh_stop.set()
     try:
         App.destroy()
         print("CLOSING: Detroyed application")
@@ -0,0 +1,675 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Herodirk
+
+Market data of the minion calculator.
+Parses the bazaar API response while it streams in, only keeping the order arrays of known items.
+Calculates the bazaar prices of all products in one batch.
+Fetches the bazaar and the auction house prices of AH only items and pets concurrently.
+Saves and loads the processed bazaar and AH prices to a local snapshot file,
+so the calculator can start without calling the APIs while the prices are still fresh.
+Keeps timings and counters of each bazaar update in a BazaarStats.
+"""
+
+import os
+import re
+import json
+import time
+import codecs
+import threading
+import http.client
+import urllib.parse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import HSB_minion_data as md
+import minion_engine as engine
+
+snapshot_version = 1
+# version of the snapshot file layout, snapshots with another version are not loaded
+
+# AH prices stored in the snapshot, stored as {ID: price location}
+ah_prices = {ID: "custom" for ID in md.ah_items}
+
+bazaar_api_url = "https://api.hypixel.net/v2/skyblock/bazaar"
+coflnet_api_url = "https://sky.coflnet.com/api/item/price/"
+# API addresses, can be pointed to a local server for testing
+
+# Coflnet searches for the pets in pet_costs (see main.py), stored as {pet: {"tag": Skyblock ID, "min": filters, "max": filters}}
+# "min" searches for a level 1 pet and "max" for a max level pet, following the notes behind the pets in pet_costs
+ah_pets = {"Golden Dragon": {"tag": "PET_GOLDEN_DRAGON", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "200"}},
+           "Jade Dragon": {"tag": "PET_JADE_DRAGON", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "200"}},
+           "Black Cat": {"tag": "PET_BLACK_CAT", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "100"}},
+           "Elephant": {"tag": "PET_ELEPHANT", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "100"}},
+           "Mooshroom Cow": {"tag": "PET_MOOSHROOM_COW", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "100"}},
+           "Slug": {"tag": "PET_SLUG", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "100"}},
+           "Hedgehog": {"tag": "PET_HEDGEHOG", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "LEGENDARY", "PetLevel": "100"}},
+           "Enderman": {"tag": "PET_ENDERMAN", "min": {"Rarity": "LEGENDARY", "PetLevel": "1"}, "max": {"Rarity": "MYTHIC", "PetLevel": "100"}},
+           }
+
+
+#%% Streaming bazaar parser
+
+# run of characters and complete strings that do not change the nesting depth
+_skip_flat = re.compile(r'(?:[^"{}\[\]]+|"(?:[^"\\]|\\.)*")*', re.DOTALL)
+_whitespace = re.compile(r'\s*')
+
+
+class JSONStream():
+    def __init__(self, stream, chunk_size=65536):
+        """
+        Minimal incremental JSON reader over a binary stream, like an HTTP response.
+        Values can be decoded or skipped without building them, only a small part of the stream is kept in memory.
+
+        Parameters
+        ----------
+        stream : file-like
+            Binary stream with a read(size) method.
+        chunk_size : int, optional
+            Amount of bytes read at a time. The default is 65536.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+        # seconds spent waiting on the stream and decoding, and the amount of bytes read
+        self.read_time = 0.0
+        self.decode_time = 0.0
+        self.bytes_read = 0
+        return
+
+    def fill(self):
+        """Reads the next chunk into the buffer, drops the parsed part of the buffer. Returns False at the end of the stream."""
+        if self.done:
+            return False
+        start = time.perf_counter()
+        chunk = self.stream.read(self.chunk_size)
+        read_end = time.perf_counter()
+        text = self.decoder.decode(chunk, final=not chunk)
+        self.decode_time += time.perf_counter() - read_end
+        self.read_time += read_end - start
+        self.bytes_read += len(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        if not chunk:
+            self.done = True
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character without consuming it, "" at the end of the stream."""
+        while True:
+            self.pos = _whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        """Consumes the next character, which has to be char."""
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at bazaar data position {self.pos}")
+        self.pos += 1
+        return
+
+    def read_value(self):
+        """Decodes the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # a value that ends at the end of the buffer could be cut off, like a number
+                if end < len(self.buffer) or self.done:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self.fill()
+
+    def skip_value(self):
+        """Skips the next JSON value, the value is only decoded if it is completely in the buffer."""
+        if self.peek() not in "{[":
+            self.read_value()
+            return
+        try:
+            # decoding a small value at C speed and dropping it is faster than scanning it
+            self.pos = self.json_decoder.raw_decode(self.buffer, self.pos)[1]
+            return
+        except json.JSONDecodeError:
+            pass
+        # value is cut off by the end of the buffer, scan through it while reading more chunks
+        depth = 0
+        while True:
+            self.pos = _skip_flat.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer) or self.buffer[self.pos] == '"':
+                # end of the buffer, or a string that is cut off by the end of the buffer
+                if not self.fill():
+                    raise ValueError("Bazaar data ended early")
+                continue
+            depth += 1 if self.buffer[self.pos] in "{[" else -1
+            self.pos += 1
+            if depth == 0:
+                return
+
+    def iter_object(self):
+        """Iterates over the keys of the next JSON object, the value of each key has to be read or skipped before the next key."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+
+def parse_bazaar(stream, item_IDs, chunk_size=65536, stats=None):
+    """
+    Parses a Hypixel bazaar API response while it is read.
+    Products that are not in item_IDs are skipped, of the known products only the order arrays are kept.
+
+    Parameters
+    ----------
+    stream : file-like
+        Binary stream of the API response, like the return of urllib.request.urlopen().
+    item_IDs : dict or set
+        Skyblock Item IDs to keep, like md.itemList.
+    chunk_size : int, optional
+        Amount of bytes read at a time. The default is 65536.
+    stats : dict, optional
+        If given, "network_time", "decode_time", "parse_time" (in seconds), "body_bytes" and "products" are written into it.
+        The default is None.
+
+    Returns
+    -------
+    dict
+        Parsed response, stored as {"success": bool, "lastUpdated": int,
+        "products": {ID: {"buy_summary": [orders], "sell_summary": [orders]}}},
+        with each order stored as {"amount": int, "pricePerUnit": float}.
+
+    """
+    start = time.perf_counter()
+    json_stream = JSONStream(stream, chunk_size)
+    raw_data = {"products": {}}
+    for key in json_stream.iter_object():
+        if key == "products":
+            for product_ID in json_stream.iter_object():
+                if product_ID not in item_IDs:
+                    json_stream.skip_value()
+                    continue
+                product = {"buy_summary": [], "sell_summary": []}
+                for product_key in json_stream.iter_object():
+                    if product_key in product:
+                        product[product_key] = [{"amount": order["amount"], "pricePerUnit": order["pricePerUnit"]} for order in json_stream.read_value()]
+                    else:
+                        json_stream.skip_value()
+                raw_data["products"][product_ID] = product
+        elif key in ["success", "lastUpdated", "cause"]:
+            raw_data[key] = json_stream.read_value()
+        else:
+            json_stream.skip_value()
+    if stats is not None:
+        stats["network_time"] = json_stream.read_time
+        stats["decode_time"] = json_stream.decode_time
+        stats["parse_time"] = time.perf_counter() - start - json_stream.read_time - json_stream.decode_time
+        stats["body_bytes"] = json_stream.bytes_read
+        stats["products"] = len(raw_data["products"])
+    return raw_data
+
+
+#%% Bazaar prices
+
+def apply_bazaar_prices(prices, products, top_percent=0.1, stats=None):
+    """
+    Calculates the bazaar buy and sell prices of all products and writes them into a PriceSnapshot.
+    To get accurate prices, it takes a top percentage of the orders (by amount) and takes the average price of them.
+    If the top order price is 2.5 times or more the average, the supply is bottom heavy and the top order price is used.
+    All orders of all products are packed into NumPy arrays and calculated in one batch.
+    Items without supply or with bottom heavy supply are printed as one summary line, the items themselves are only written into stats.
+
+    Parameters
+    ----------
+    prices : minion_engine.PriceSnapshot
+        Snapshot to write the prices in, only items in the snapshot are updated.
+    products : dict
+        Order arrays per product, like the "products" of parse_bazaar().
+    top_percent : float, optional
+        Fraction of the total order amount used for the average. The default is 0.1.
+    stats : dict, optional
+        If given, "processing_time" and "processing_time_per_product" (in seconds),
+        and the "no_supply" and "bottom_heavy" items as lists of "ID action" are written into it. The default is None.
+
+    Returns
+    -------
+    None.
+
+    """
+    start = time.perf_counter()
+    no_supply = []
+    bottom_heavy_items = []
+    # one group per item and action, orders stored flat in group order
+    groups = []
+    amounts = []
+    unit_prices = []
+    group_sizes = []
+    product_count = 0
+    for ID in prices.prices:
+        if ID not in products:
+            continue
+        product_count += 1
+        for action in ["buy", "sell"]:
+            orders = products[ID][f"{action}_summary"]
+            groups.append((ID, action))
+            group_sizes.append(len(orders))
+            amounts.extend(order["amount"] for order in orders)
+            unit_prices.extend(order["pricePerUnit"] for order in orders)
+    if len(groups) == 0:
+        if stats is not None:
+            stats.update({"processing_time": time.perf_counter() - start, "processing_time_per_product": 0.0, "no_supply": no_supply, "bottom_heavy": bottom_heavy_items})
+        return
+    amounts = np.array(amounts, dtype=float)
+    unit_prices = np.array(unit_prices, dtype=float)
+    group_sizes = np.array(group_sizes)
+    group_index = np.repeat(np.arange(len(groups)), group_sizes)
+    group_starts = np.cumsum(group_sizes) - group_sizes
+
+    # amount of each order that falls within the top amount of its group
+    total_amounts = np.bincount(group_index, weights=amounts, minlength=len(groups))
+    top_amounts = top_percent * total_amounts
+    amount_before = np.cumsum(amounts) - amounts - (np.cumsum(total_amounts) - total_amounts)[group_index]
+    top_part = np.clip(top_amounts[group_index] - amount_before, 0, amounts)
+    top_sums = np.bincount(group_index, weights=top_part * unit_prices, minlength=len(groups))
+
+    has_supply = top_amounts != 0
+    top_percent_avg_prices = np.zeros(len(groups))
+    top_percent_avg_prices[has_supply] = top_sums[has_supply] / top_amounts[has_supply]
+    top_order_prices = np.zeros(len(groups))
+    top_order_prices[group_sizes != 0] = unit_prices[group_starts[group_sizes != 0]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bottom_heavy = has_supply & (top_order_prices / top_percent_avg_prices >= 2.5)
+    final_prices = np.where(bottom_heavy, top_order_prices, top_percent_avg_prices)
+
+    # items without an NPC price to fall back to get a price of 0
+    no_fallback = 0
+    for (ID, action), price, supply, heavy in zip(groups, final_prices.tolist(), has_supply.tolist(), bottom_heavy.tolist()):
+        item_prices = prices.prices[ID]
+        item_prices[f"{action}Price"] = price
+        if not supply:
+            no_supply.append(f"{ID} {action}")
+            no_fallback += "npc" not in item_prices
+        elif heavy:
+            bottom_heavy_items.append(f"{ID} {action}")
+    if len(no_supply) != 0 or len(bottom_heavy_items) != 0:
+        print(f"BAZAAR: {len(no_supply)} prices without supply ({no_fallback} without NPC price), {len(bottom_heavy_items)} bottom heavy prices taking the top order price")
+    if stats is not None:
+        processing_time = time.perf_counter() - start
+        stats.update({"processing_time": processing_time, "processing_time_per_product": processing_time / product_count,
+                      "no_supply": no_supply, "bottom_heavy": bottom_heavy_items})
+    return
+
+
+#%% Concurrent fetcher
+
+class MarketFetcher():
+    def __init__(self, user_agent, max_connections=8, timeout=10, bazaar_url=None, coflnet_url=None):
+        """
+        Fetches the bazaar and the Coflnet AH prices concurrently.
+        Each worker thread keeps its connection per host open between requests.
+
+        Parameters
+        ----------
+        user_agent : str
+            User-Agent header sent with every request.
+        max_connections : int, optional
+            Maximum amount of requests running at the same time. The default is 8.
+        timeout : float, optional
+            Seconds before a connection or a read of a request times out. The default is 10.
+        bazaar_url : str, optional
+            Address of the bazaar API. The default is None, for bazaar_api_url.
+        coflnet_url : str, optional
+            Address of the Coflnet item price API, the item ID is added behind it. The default is None, for coflnet_api_url.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.headers = {"User-Agent": user_agent}
+        self.timeout = timeout
+        self.bazaar_url = bazaar_api_url if bazaar_url is None else bazaar_url
+        self.coflnet_url = coflnet_api_url if coflnet_url is None else coflnet_url
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_connections), thread_name_prefix="market")
+        self.local = threading.local()
+        self.all_connections = []
+        self.lock = threading.Lock()
+        return
+
+    def get(self, url):
+        """
+        Sends a GET request over the connection of this thread to the host of url.
+        A kept open connection that was closed by the server is reopened once.
+
+        Parameters
+        ----------
+        url : str
+            Address to request.
+
+        Returns
+        -------
+        http.client.HTTPResponse
+            Response with status 200, has to be read completely before the next request of this thread.
+
+        """
+        parts = urllib.parse.urlsplit(url)
+        host = (parts.scheme, parts.netloc)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        if not hasattr(self.local, "connections"):
+            self.local.connections = {}
+        for attempt in range(2):
+            connection = self.local.connections.get(host)
+            reused = connection is not None
+            if not reused:
+                connection_type = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                connection = connection_type(parts.netloc, timeout=self.timeout)
+                self.local.connections[host] = connection
+                with self.lock:
+                    self.all_connections.append(connection)
+            try:
+                connection.request("GET", path, headers=self.headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.drop(url)
+                if reused:
+                    continue
+                raise
+            except Exception:
+                self.drop(url)
+                raise
+            if response.status != 200:
+                response.read()
+                raise ValueError(f"{url} answered with {response.status} {response.reason}")
+            return response
+
+    def drop(self, url):
+        """Closes the connection of this thread to the host of url, for when a response could not be read completely."""
+        parts = urllib.parse.urlsplit(url)
+        connection = getattr(self.local, "connections", {}).pop((parts.scheme, parts.netloc), None)
+        if connection is not None:
+            connection.close()
+        return
+
+    def fetch_bazaar(self, item_IDs, stats=None):
+        """Requests and parses the bazaar, see parse_bazaar(). With stats, "connect_time" is also written into it."""
+        try:
+            start = time.perf_counter()
+            response = self.get(self.bazaar_url)
+            if stats is not None:
+                stats["connect_time"] = time.perf_counter() - start
+            raw_data = parse_bazaar(response, item_IDs, stats=stats)
+            response.read()
+        except Exception:
+            self.drop(self.bazaar_url)
+            raise
+        return raw_data
+
+    def fetch_ah_price(self, tag, filters=None):
+        """
+        Requests the Coflnet price of an item, the most common price ("mode") is used.
+
+        Parameters
+        ----------
+        tag : str
+            Skyblock Item ID of the item.
+        filters : dict, optional
+            Coflnet search filters, like {"Rarity": "LEGENDARY"}. The default is None, for no filters.
+
+        Returns
+        -------
+        float
+            Price of the item.
+
+        """
+        url = self.coflnet_url + urllib.parse.quote(tag)
+        if filters:
+            url += "?" + urllib.parse.urlencode(filters)
+        try:
+            response = self.get(url)
+            call_data = json.loads(response.read().decode("utf-8"))
+        except Exception:
+            self.drop(url)
+            raise
+        if type(call_data) is not dict or call_data.get("mode") is None:
+            raise ValueError(f"No price of {tag} in Coflnet data")
+        return call_data["mode"]
+
+    def fetch_all(self, item_IDs, ah_IDs=(), pets=None):
+        """
+        Fetches the bazaar and the AH prices at the same time.
+        Failed requests print an error and are left out of the results.
+
+        Parameters
+        ----------
+        item_IDs : dict or set
+            Skyblock Item IDs to keep from the bazaar, like md.itemList.
+        ah_IDs : list, optional
+            Skyblock Item IDs of AH only items, like md.ah_items. The default is ().
+        pets : dict, optional
+            Pet searches, like ah_pets. The default is None, for no pets.
+
+        Returns
+        -------
+        dict
+            Results, stored as {"bazaar": parsed bazaar response or None,
+            "ah": {ID: price}, "pets": {pet: {"min": price, "max": price}}, "bazaar_stats": stats of fetch_bazaar()}.
+
+        """
+        pets = {} if pets is None else pets
+        bazaar_stats = {}
+        bazaar_future = self.executor.submit(self.fetch_bazaar, item_IDs, bazaar_stats)
+        ah_futures = {ID: self.executor.submit(self.fetch_ah_price, ID) for ID in ah_IDs}
+        pet_futures = {pet: {key: self.executor.submit(self.fetch_ah_price, search["tag"], search[key]) for key in ["min", "max"]} for pet, search in pets.items()}
+        results = {"bazaar": None, "ah": {}, "pets": {}, "bazaar_stats": bazaar_stats}
+        try:
+            results["bazaar"] = bazaar_future.result()
+        except Exception as error:
+            print(f"ERROR: Could not finish API call\n{error}")
+        for ID, future in ah_futures.items():
+            try:
+                results["ah"][ID] = future.result()
+            except Exception as error:
+                print(f"ERROR: Could not finish API call to Coflnet for {ID}\n{error}")
+        for pet, futures in pet_futures.items():
+            try:
+                results["pets"][pet] = {key: future.result() for key, future in futures.items()}
+            except Exception as error:
+                print(f"ERROR: Could not finish API call to Coflnet for {pet}\n{error}")
+        return results
+
+    def close(self):
+        """Stops the worker threads and closes all connections."""
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for connection in self.all_connections:
+                connection.close()
+            self.all_connections = []
+        return
+
+
+#%% Bazaar stats
+
+class BazaarStats():
+    def __init__(self, history_size=100):
+        """
+        Timings and counters of the last bazaar updates.
+        Each update is stored as a dict with:
+            "time": Unix time of the update
+
+            "success": False if the bazaar could not be fetched or processed
+
+            "connect_time": seconds until the response headers arrived
+
+            "network_time": seconds spent waiting on the response body
+
+            "decode_time": seconds spent decoding the body from UTF-8
+
+            "parse_time": seconds spent parsing the JSON
+
+            "body_bytes": size of the response body
+
+            "products": amount of known products in the response
+
+            "processing_time" and "processing_time_per_product": seconds spent calculating the prices
+
+            "no_supply" and "bottom_heavy": items that got no bazaar price or the top order price, as "ID action"
+
+            "total_time": seconds of the whole update, including the AH calls
+
+        Keys of steps that were not reached are left out.
+
+        Parameters
+        ----------
+        history_size : int, optional
+            Amount of updates that are kept. The default is 100.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.history_size = history_size
+        self.history = []
+        return
+
+    def record(self, stats):
+        """Adds the stats of an update, the oldest update is dropped when history_size is reached."""
+        stats = dict(stats)
+        for key in ["no_supply", "bottom_heavy"]:
+            if key in stats:
+                stats[f"{key}_count"] = len(stats[key])
+        # replaced instead of appended, so a reader on another thread never sees a changing list
+        self.history = (self.history + [stats])[-self.history_size:]
+        return
+
+    @property
+    def last(self):
+        """Stats of the last update, None if there was no update yet."""
+        history = self.history
+        return history[-1] if len(history) != 0 else None
+
+    def series(self, key):
+        """
+        Returns the values of one stat over the kept updates, oldest first. Updates without the stat are skipped.
+
+        Parameters
+        ----------
+        key : str
+            Name of the stat, like "network_time" or "bottom_heavy_count".
+
+        Returns
+        -------
+        list
+            Values of the stat.
+
+        """
+        return [stats[key] for stats in self.history if key in stats]
+
+    def summary(self):
+        """
+        Returns the minimum, average and maximum of every numeric stat over the kept updates, except "time".
+
+        Returns
+        -------
+        dict
+            Stored as {stat: {"min": value, "average": value, "max": value}}.
+
+        """
+        summary = {}
+        keys = {key for stats in self.history for key, value in stats.items() if type(value) in [int, float] and key != "time"}
+        for key in sorted(keys):
+            values = self.series(key)
+            summary[key] = {"min": min(values), "average": sum(values) / len(values), "max": max(values)}
+        return summary
+
+
+#%% Snapshot file
+
+def save_snapshot(prices, path):
+    """
+    Saves the bazaar buy and sell prices, the AH item and pet prices and the bazaar update time of a PriceSnapshot to a file.
+    The file is written next to the old file first and then swapped, so a failed save never leaves a broken snapshot.
+
+    Parameters
+    ----------
+    prices : minion_engine.PriceSnapshot
+        Snapshot to save.
+    path : str
+        Path of the snapshot file.
+
+    Returns
+    -------
+    None.
+
+    """
+    bazaar = {}
+    for ID, item_prices in prices.prices.items():
+        if "buyPrice" in item_prices and "sellPrice" in item_prices:
+            bazaar[ID] = [item_prices["buyPrice"], item_prices["sellPrice"]]
+    ah = {ID: prices.prices[ID][location] for ID, location in ah_prices.items() if location in prices.prices.get(ID, {})}
+    data = {"version": snapshot_version, "lastUpdated": prices.last_updated, "bazaar": bazaar, "ah": ah, "pets": prices.pet_costs}
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+    except OSError as error:
+        print(f"WARNING: Could not save bazaar snapshot\n{error}")
+    return
+
+
+def load_snapshot(path):
+    """
+    Loads a snapshot file saved by save_snapshot() on top of the base prices in md.itemList.
+
+    Parameters
+    ----------
+    path : str
+        Path of the snapshot file.
+
+    Returns
+    -------
+    minion_engine.PriceSnapshot or None
+        Loaded snapshot, None if there is no valid snapshot file.
+
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as error:
+        print(f"WARNING: Could not load bazaar snapshot\n{error}")
+        return None
+    if type(data) is not dict or data.get("version") != snapshot_version:
+        print("WARNING: Bazaar snapshot has an unknown version, ignoring it")
+        return None
+    prices = engine.item_list_snapshot(data["lastUpdated"])
+    for ID, (buy_price, sell_price) in data["bazaar"].items():
+        if ID in prices.prices:
+            prices.prices[ID]["buyPrice"] = buy_price
+            prices.prices[ID]["sellPrice"] = sell_price
+    for ID, price in data["ah"].items():
+        if ID in prices.prices and ID in ah_prices:
+            prices.prices[ID][ah_prices[ID]] = price
+    prices.pet_costs = data.get("pets", {})
+    return prices
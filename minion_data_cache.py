@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Herodirk
+
+Cached build of HSB_minion_data.
+Importing HSB_minion_data builds the minion costs and other tables every launch.
+load_minion_data() saves the finished tables to a cache file, keyed by the hash of HSB_minion_data.py,
+and later launches load the tables from that file instead of running HSB_minion_data.py.
+The cache is rebuilt when HSB_minion_data.py, Python or numpy changes, so edits to the data (like custom prices) are always used.
+
+Only the finished tables are cached, as a pickle that may only contain plain Python data and NumPy numbers.
+The functions of HSB_minion_data are only used to build the tables, a cached module loads them from HSB_minion_data.py on first use.
+"""
+
+
+#%% imports
+
+import os
+import sys
+import types
+import pickle
+import zlib
+import importlib.util
+import numpy as np
+
+
+#%% Settings
+
+cache_file = "HSB_minion_data.cache"
+# File in the calculator folder where the built HSB_minion_data is saved, set to None to always run HSB_minion_data.py
+cache_version = 2
+# Changing this makes all old cache files invalid, change when the cache layout changes
+
+
+#%% Data cache
+
+# the only classes that a cache file may load, the NumPy numbers in the tables are pickled through these
+allowed_globals = {("numpy", "dtype"), ("numpy._core.multiarray", "scalar"), ("numpy.core.multiarray", "scalar")}
+
+
+class DataUnpickler(pickle.Unpickler):
+    """Unpickler that refuses every class except allowed_globals, so a cache file can only hold data."""
+    def find_class(self, module, name):
+        if (module, name) not in allowed_globals:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a data cache")
+        return super().find_class(module, name)
+
+
+def cache_key(source_path):
+    """
+    Creates the key of the cache of a data module, from the hash of its source file and the versions that the cache depends on.
+
+    Parameters
+    ----------
+    source_path : str
+        Path of the source file of the data module.
+
+    Returns
+    -------
+    str
+        Cache key.
+
+    """
+    with open(source_path, "rb") as file:
+        source = file.read()
+    # a CRC is enough to notice edits, a cryptographic hash would cost more startup time than the cache saves
+    source_hash = f"{len(source)}-{zlib.crc32(source):08x}"
+    return f"{cache_version}-{sys.version_info[0]}.{sys.version_info[1]}-{np.__version__}-{source_hash}"
+
+
+def save_cache(module, key, path):
+    """
+    Saves the tables of a data module to a cache file, modules and functions are left out.
+    The file is written next to the old file first and then swapped, so a failed save never leaves a broken cache.
+
+    Parameters
+    ----------
+    module : module
+        Freshly imported data module.
+    key : str
+        Cache key from cache_key().
+    path : str
+        Path of the cache file.
+
+    Returns
+    -------
+    None.
+
+    """
+    data = {name: value for name, value in vars(module).items()
+            if not name.startswith("__") and type(value) not in [types.ModuleType, types.FunctionType]}
+    try:
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump({"key": key, "data": data}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+    except (OSError, pickle.PicklingError, TypeError) as error:
+        print(f"WARNING: Could not save {module.__name__} cache\n{error}")
+    return
+
+
+def load_cache(module_name, key, path, source_path):
+    """
+    Loads a data module from a cache file saved by save_cache().
+
+    Parameters
+    ----------
+    module_name : str
+        Name of the data module.
+    key : str
+        Cache key from cache_key(), the cache is only used if it was saved with the same key.
+    path : str
+        Path of the cache file.
+    source_path : str
+        Path of the source file of the data module, its functions are loaded from there when they are first used.
+
+    Returns
+    -------
+    module or None
+        Loaded data module, None if there is no valid cache file.
+
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "rb") as file:
+            cache = DataUnpickler(file).load()
+    except Exception as error:
+        # a cache from another version can fail in many ways while unpickling, it is rebuilt in all cases
+        print(f"WARNING: Could not load {module_name} cache\n{error}")
+        return None
+    if type(cache) is not dict or cache.get("key") != key:
+        return None
+    module = types.ModuleType(module_name)
+    module.__dict__.update(cache["data"])
+    module.__file__ = source_path
+    source_module = []
+
+    def load_from_source(name):
+        """Gets the functions and modules of the data module by running its source file, only done once."""
+        if not source_module:
+            source_module.append(import_source(f"{module_name}_source", source_path))
+        if not hasattr(source_module[0], name):
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        return getattr(source_module[0], name)
+    module.__getattr__ = load_from_source
+    return module
+
+
+def import_source(module_name, source_path):
+    """Runs a source file as a new module, without registering it as imported."""
+    spec = importlib.util.spec_from_file_location(module_name, source_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_minion_data(module_name="HSB_minion_data", folder=None):
+    """
+    Imports HSB_minion_data from the cache file, or from HSB_minion_data.py while saving a new cache file when the cache is missing or outdated.
+    The module is registered as imported, so "import HSB_minion_data" in the other calculator files gives the same module.
+
+    Parameters
+    ----------
+    module_name : str, optional
+        Name of the data module. The default is "HSB_minion_data".
+    folder : str, optional
+        Folder of the data module and its cache file. The default is None, for the calculator folder.
+
+    Returns
+    -------
+    module
+        The data module.
+
+    """
+    if module_name in sys.modules:
+        # already imported, the data might already be changed so it is not cached
+        return sys.modules[module_name]
+    if folder is None:
+        folder = os.path.dirname(os.path.abspath(__file__))
+    source_path = os.path.join(folder, f"{module_name}.py")
+    if cache_file is None:
+        module = import_source(module_name, source_path)
+        sys.modules[module_name] = module
+        return module
+    path = os.path.join(folder, cache_file)
+    key = cache_key(source_path)
+    module = load_cache(module_name, key, path, source_path)
+    if module is None:
+        print(f"BOOTING: Building {module_name} cache")
+        module = import_source(module_name, source_path)
+        save_cache(module, key, path)
+    sys.modules[module_name] = module
+    return module
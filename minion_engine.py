@@ -0,0 +1,1888 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Herodirk
+
+Calculation engine of the minion calculator.
+The engine evaluates a minion setup without any Tkinter variables, so it can run without a Tk root.
+
+A setup is a plain dict with the same keys as the inputs in Calculator.variables (see main.py),
+extended with the time inputs "totaltimeamount", "totaltimelength", "emptytimeamount" and "emptytimelength".
+Prices are read from a PriceSnapshot.
+The data in HSB_minion_data is never changed by an evaluation, changes like AFK loot tables and the Inferno fuel price
+are overlays that only exist within one evaluation. This makes it safe to evaluate multiple setups at the same time.
+The calculation is split into stages, each stage reads the setup and the results of earlier stages from a state dict.
+Calculator.calculate() in main.py is a thin adapter that collects the setup from the GUI and shows the Result.
+"""
+
+import os
+import time
+import itertools
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import HSB_minion_data as md
+
+
+#%% Lists you should not touch
+
+bazaar_buy_types = {"Buy Order": "sellPrice", "Insta Buy": "buyPrice", "Custom": "custom"}
+bazaar_sell_types = {"Sell Offer": "buyPrice", "Insta Sell": "sellPrice", "Custom": "custom"}
+
+# outputs of the calculation, the keys match the keys in Calculator.variables
+output_keys = ["time", "emptytime", "actiontime", "harvests", "items", "itemSellLoc", "filltime", "used_storage", "available_storage",
+               "itemtypeProfit", "itemProfit", "xp", "pets_levelled", "petProfit", "fuelcost", "fuelamount", "totalProfit", "notes",
+               "setupcost", "freewillcost", "extracost", "optimal_tier_free_will"]
+
+# initial values of the setup inputs, equal to the "initial" of the inputs in Calculator.variables
+default_setup = {"minion": "Custom", "miniontier": 12, "amount": 1, "fuel": "None",
+                 "infernoGrade": "Hypergolic Gabagool", "infernoDistillate": "Gabagool Distillate", "infernoEyedrops": True,
+                 "hopper": "None", "upgrade1": "None", "upgrade2": "None", "chest": "None",
+                 "beacon": 0, "scorched": False, "B_constant": False, "B_acquired": False,
+                 "infusion": False, "crystal": "None", "free_will": False, "postcard": False,
+                 "afk": False, "afkpet": "None", "afkpetrarity": "Legendary", "afkpetlvl": 0.0, "enchanted_clock": False,
+                 "specialLayout": False, "playerHarvests": False, "playerLooting": 0, "potatoTalisman": False,
+                 "combatWisdom": 0.0, "miningWisdom": 0.0, "farmingWisdom": 0.0, "fishingWisdom": 0.0, "foragingWisdom": 0.0, "alchemyWisdom": 0.0,
+                 "mayor": "None", "levelingpet": "None", "taming": 0.0, "falcon_attribute": 0, "toucan_attribute": 0,
+                 "petxpboost": "None", "beastmaster": 0.0, "expsharepet": "None", "expsharepetslot2": "None", "expsharepetslot3": "None",
+                 "expshareitem": False, "often_empty": False,
+                 "sellLoc": "Best (NPC/Bazaar)", "bazaar_sell_type": "Sell Offer", "bazaar_buy_type": "Buy Order",
+                 "bazaar_taxes": True, "bazaar_flipper": 1,
+                 "totaltimeamount": 1.0, "totaltimelength": "Days", "emptytimeamount": 1.0, "emptytimelength": "Days"}
+
+
+#%% Item registry
+
+# every ID in md.itemList gets a dense integer index, the item data is stored in NumPy columns in the same order
+item_IDs = list(md.itemList.keys())
+item_index = {ID: index for index, ID in enumerate(item_IDs)}
+# skill types with a wisdom input, the xp type column stores the position in this list, -1 for items without xp
+xp_types = ["combat", "mining", "farming", "fishing", "foraging", "alchemy"]
+item_xp_type = np.array([xp_types.index(next(iter(md.itemList[ID]["xp"]))) if "xp" in md.itemList[ID] else -1 for ID in item_IDs], dtype=np.int64)
+item_xp_value = np.array([next(iter(md.itemList[ID]["xp"].values())) if "xp" in md.itemList[ID] else 0.0 for ID in item_IDs], dtype=float)
+# list copies of the columns for reading single items, which is faster from a list than from an array
+item_xp_type_list = item_xp_type.tolist()
+item_xp_value_list = item_xp_value.tolist()
+
+
+#%% Prices
+
+# source of PriceSnapshot.version
+snapshot_versions = itertools.count(1)
+
+
+class PriceSnapshot():
+    def __init__(self, prices, last_updated=0.0, pet_costs=None):
+        """
+        A set of item prices used for one or more evaluations.
+
+        Parameters
+        ----------
+        prices : dict
+            Prices per Skyblock Item ID, stored as {ID: {price location: price}},
+            with the same price locations as "prices" in md.itemList ("npc", "custom", "buyPrice", "sellPrice").
+        last_updated : float, optional
+            Unix time of the bazaar data in the snapshot. 0.0 if no bazaar data is loaded. The default is 0.0.
+        pet_costs : dict, optional
+            Pet prices taken from the auction house, stored as {pet: {"min": price, "max": price}}.
+            The default is None, for no pet prices.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.prices = prices
+        self.last_updated = last_updated
+        self.pet_costs = {} if pet_costs is None else pet_costs
+        # every new snapshot gets a new version, views made by bind() keep the version of their snapshot
+        self.version = next(snapshot_versions)
+        # resolved price tables, the prices of a snapshot are not changed after it is first read
+        # so the tables stay valid for the lifetime of the snapshot, new prices always come in a new snapshot
+        self.price_tables = {}
+        self.resolved_tables = {}
+        self.overlays = {}
+        self.overlay_of = None
+        # cumulative minion costs per tier, see tier_costs()
+        self.tier_cost_tables = {}
+        self.free_will_tables = {}
+        # setup this snapshot is bound to, see bind()
+        self.bound_setup = None
+        self.bound_tables = {}
+        return
+
+    def bind(self, setup):
+        """
+        Creates a view of this snapshot for one setup, sharing the prices and price tables of this snapshot.
+        get_price() with the bound setup finds the price table by only the action and location.
+        The bazaar settings and mayor of the setup should not change while the view is used.
+
+        Parameters
+        ----------
+        setup : dict
+            Setup with at least the bazaar settings and the mayor.
+
+        Returns
+        -------
+        PriceSnapshot
+            View of this snapshot.
+
+        """
+        view = PriceSnapshot(self.prices, self.last_updated, self.pet_costs)
+        view.version = self.version
+        view.price_tables = self.price_tables
+        view.resolved_tables = self.resolved_tables
+        view.overlays = self.overlays
+        view.overlay_of = self.overlay_of
+        view.tier_cost_tables = self.tier_cost_tables
+        view.free_will_tables = self.free_will_tables
+        view.bound_setup = setup
+        return view
+
+    def price_table(self, setup, action, location):
+        """
+        Returns the final prices of every item for a transaction, see get_price().
+        The table is built on first use for each combination of bazaar settings, mayor, action and location.
+
+        Parameters
+        ----------
+        setup : dict
+            Setup with at least the bazaar settings and the mayor.
+        action : str
+            Type of transaction. "buy" or "sell".
+        location : str
+            Location of the transaction, "npc", "bazaar", "custom", "best".
+
+        Returns
+        -------
+        dict
+            Prices stored as {ID: price}, items without any price are left out.
+
+        """
+        key = (action, location, setup["bazaar_buy_type"], setup["bazaar_sell_type"], setup["bazaar_taxes"], setup["bazaar_flipper"], setup["mayor"])
+        table = self.price_tables.get(key)
+        if table is None:
+            resolved = resolve_location(setup, action, location)
+            # settings that resolve to the same location and multiplier share one table
+            table = self.resolved_tables.get(resolved)
+            if table is None:
+                if self.overlay_of is not None:
+                    # the table of an overlay is the table of the original with only the replaced items resolved again
+                    original, replaced = self.overlay_of
+                    table = {**original.price_table(setup, action, location), **resolve_prices(replaced, *resolved)}
+                else:
+                    table = resolve_prices(self.prices, *resolved)
+                self.resolved_tables[resolved] = table
+            self.price_tables[key] = table
+        return table
+
+    def overlay(self, overrides):
+        """
+        Creates a new PriceSnapshot with some prices replaced, this snapshot is not changed.
+        Overlays are remembered, the same overrides return the same snapshot with its already built price tables.
+
+        Parameters
+        ----------
+        overrides : dict
+            Prices to replace, stored as {ID: {price location: price}}.
+            Price locations that are not in overrides keep the price of this snapshot.
+
+        Returns
+        -------
+        PriceSnapshot
+            Snapshot with the replaced prices, bound to the same setup as this snapshot.
+
+        """
+        key = tuple((ID, tuple(item_prices.items())) for ID, item_prices in overrides.items())
+        snapshot = self.overlays.get(key)
+        if snapshot is None:
+            prices = dict(self.prices)
+            for ID, item_prices in overrides.items():
+                prices[ID] = {**prices.get(ID, {}), **item_prices}
+            snapshot = PriceSnapshot(prices, self.last_updated, self.pet_costs)
+            snapshot.overlay_of = (self, {ID: prices[ID] for ID in overrides})
+            self.overlays[key] = snapshot
+        if self.bound_setup is not None:
+            return snapshot.bind(self.bound_setup)
+        return snapshot
+
+
+def item_list_snapshot(last_updated=0.0):
+    """
+    Creates a PriceSnapshot with a copy of the prices stored in md.itemList.
+
+    Parameters
+    ----------
+    last_updated : float, optional
+        Unix time of the bazaar data in md.itemList. The default is 0.0.
+
+    Returns
+    -------
+    PriceSnapshot
+        Snapshot with the prices of every item in md.itemList.
+
+    """
+    return PriceSnapshot({ID: dict(item_data["prices"]) for ID, item_data in md.itemList.items()}, last_updated)
+
+
+def resolve_location(setup, action, location):
+    """
+    Translates a transaction into the price location in md.itemList and the price multiplier for bazaar settings and taxes.
+
+    Parameters
+    ----------
+    setup : dict
+        Setup with at least the bazaar settings and the mayor.
+    action : str
+        Type of transaction. "buy" or "sell".
+    location : str
+        Location of the transaction, "npc", "bazaar", "custom", "best".
+
+    Returns
+    -------
+    tuple
+        (price location, multiplier).
+
+    """
+    multiplier = 1
+    if location == "bazaar":
+        if action == "buy":
+            location = bazaar_buy_types[setup["bazaar_buy_type"]]
+        elif action == "sell":
+            location = bazaar_sell_types[setup["bazaar_sell_type"]]
+            if setup["bazaar_taxes"]:
+                bazaar_tax = 0.0125 - 0.00125 * setup["bazaar_flipper"]
+                if setup["mayor"] == "Derpy":
+                    bazaar_tax *= 4
+                multiplier = 1 - bazaar_tax
+    elif location == "npc" and action == "buy":
+        multiplier = 2
+    return location, multiplier
+
+
+def resolve_prices(prices, location, multiplier):
+    """
+    Resolves the final price of each item for a price location, with the npc and custom price as fallbacks.
+
+    Parameters
+    ----------
+    prices : dict
+        Prices per Skyblock Item ID, like PriceSnapshot.prices.
+    location : str
+        Price location, like the return of resolve_location().
+    multiplier : float
+        Price multiplier, like the return of resolve_location().
+
+    Returns
+    -------
+    dict
+        Prices stored as {ID: price}, items without any price are left out.
+
+    """
+    table = {}
+    for ID, item_prices in prices.items():
+        if location in item_prices:
+            table[ID] = multiplier * item_prices[location]
+        elif "npc" in item_prices:
+            table[ID] = multiplier * item_prices["npc"]
+        elif "custom" in item_prices:
+            table[ID] = item_prices["custom"]
+    return table
+
+
+def get_price(setup, prices, ID, action="buy", location="bazaar", force=False):
+    """
+    Returns the price of an item from ID, transaction type and location of transaction.
+    Uses setup "bazaar_buy_type", "bazaar_sell_type", "bazaar_taxes", "bazaar_flipper" and "mayor" for bazaar specifics.
+    Prices are read from the resolved price tables of the PriceSnapshot, see PriceSnapshot.price_table().
+
+    Parameters
+    ----------
+    setup : dict
+        Setup with at least the bazaar settings and the mayor.
+    prices : PriceSnapshot
+        Prices to read from.
+    ID : str
+        Skyblock Item ID of which the price is needed.
+    action : str, optional
+        Type of transaction. "buy" or "sell". The default is "buy".
+    location : str, optional
+        Location of the transaction, "npc", "bazaar", "custom", "best". The default is "bazaar".
+    force : bool, optional
+        Toggle to force the location and action, if location is not found, this function returns 0
+
+    Returns
+    -------
+    float
+        price of the item.
+    """
+    if not force:
+        if prices.bound_setup is setup:
+            table = prices.bound_tables.get((action, location))
+            if table is None:
+                table = prices.bound_tables[(action, location)] = prices.price_table(setup, action, location)
+        else:
+            table = prices.price_table(setup, action, location)
+        price = table.get(ID)
+        if price is not None:
+            return price
+    location, multiplier = resolve_location(setup, action, location)
+    item_prices = prices.prices.get(ID)
+    if item_prices is None:
+        print("WARNING:", ID, "not in itemList")
+        return 0
+    if location in item_prices:
+        return multiplier * item_prices[location]
+    elif force:
+        print("WARNING:", ID, "no forced cost found")
+        return 0
+    else:
+        print("WARNING:", ID, "no cost found")
+        return 0
+
+
+#%% Helper functions
+
+def time_number(time_length, time_amount, secondsPaction=0.0, actionsPerHarvest=1.0):
+    """
+    Translates time amount and length into seconds.
+
+    Parameters
+    ----------
+    time_length : str
+        A time unit, "Years", "Weeks", "Days", "Hours", "Minutes", "Seconds", "Harvests".
+    time_amount : float
+        Amount of time units.
+    secondsPaction : float, optional
+        Seconds per action. Used to calculate the amount of seconds in one harvest. The default is 0.0.
+    actionsPerHarvest : float, optional
+        Actions per harvest. Used to calculate the amount of seconds in one harvest. The default is 1.0.
+
+    Returns
+    -------
+    float
+        The inputted time amount and length as seconds.
+
+    """
+    if time_length == "Years":
+        return 31536000 * time_amount
+    if time_length == "Weeks":
+        return 604800 * time_amount
+    if time_length == "Days":
+        return 86400 * time_amount
+    if time_length == "Hours":
+        return 3600 * time_amount
+    if time_length == "Minutes":
+        return 60 * time_amount
+    if time_length == "Seconds":
+        return 1 * time_amount
+    if time_length == "Harvests":
+        return secondsPaction * actionsPerHarvest * time_amount
+    return 1 * time_amount
+
+
+def catch_warning(notes, warning_message):
+    """
+    Warning catching system used during calculations.
+
+    Parameters
+    ----------
+    notes : dict
+        Notes of the calculation.
+    warning_message : string
+        Warning text.
+
+    Returns
+    -------
+    None.
+
+    """
+    if "WARNING" not in notes:
+        notes["WARNING"] = "Check terminal for warning"
+    print("WARNING: " + warning_message)
+    return
+
+
+def get_pet_xp_boosts(setup, pet, xp_type, exp_share=False):
+    """
+    Return pet xp boosts for a given skill xp type.
+    All boosts except pet item are multiplied together before returning.
+    If xp_type is given as "exp_share", the additive exp share boosts are returned.
+
+    Parameters
+    ----------
+    setup : dict
+        Setup with the pet leveling inputs.
+    pet : str
+        Pet for the calculation, must be a pet from pet_data.
+    xp_type : str
+        Type of skill XP.
+    exp_share : bool
+        Toggle for if the xp is given through Exp Share. Default is False.
+
+    Returns
+    -------
+    float
+        Combined pet xp boosts of all boosts except pet item
+    float
+        pet xp boost of pet item
+
+    """
+    non_matching = 1
+    if md.all_pets[pet]["type"] != "all" and md.all_pets[pet]["type"] != xp_type:
+        if xp_type in ["alchemy", "enchanting"]:
+            non_matching = 1 / 12
+        else:
+            non_matching = 1 / 3
+    if exp_share:
+        return non_matching
+    petxpbonus = (1 + setup["taming"] / 100) * (1 + setup["beastmaster"] / 100) * non_matching
+    if md.pet_xp_boosts[setup["petxpboost"]][0] in [xp_type, "all"]:
+        pet_item = 1 + md.pet_xp_boosts[setup["petxpboost"]][1] / 100
+    else:
+        pet_item = 1
+    if setup["mayor"] == "Diana":
+        petxpbonus *= 1.35
+    if xp_type in ["mining", "fishing"]:
+        petxpbonus *= 1.5
+    if pet == "Reindeer":
+        petxpbonus *= 2
+    if xp_type in ["combat"] and setup["falcon_attribute"] != 0:
+        petxpbonus *= (1 + setup["falcon_attribute"] / 100)
+    return petxpbonus, pet_item
+
+
+# total pet xp of a level 100 and a level 200 dragon pet
+dragon_lvl_100_xp = 25353230
+dragon_lvl_200_xp = 210255385
+
+
+def dragon_xp(gained_xp, left_over_pet_xp, pet_xp_boost, xp_boost_pet_item):
+    """
+    Calculates the pet xp gain on dragon pets (Golden Dragon and Jade Dragon).
+    With arrays of gained or left over xp, each element is calculated separately by dragon_xp_batch(), see pet_leveling_sweep().
+
+    Parameters
+    ----------
+    gained_xp : float or numpy.ndarray
+        Gained skill xp of a specific type.
+    left_over_pet_xp : float or numpy.ndarray
+        Left over pet xp on the pet before applying the gained skill xp.
+    pet_xp_boost : float
+        Combined pet xp boost multiplier without pet item.
+    xp_boost_pet_item : float
+        Pet xp boost multiplier from pet item.
+
+    Returns
+    -------
+    gained_pet_xp : float or numpy.ndarray
+        Amount of pet xp gained after applying the gained skill xp.
+    left_over_pet_xp : float or numpy.ndarray
+        Left over pet xp on the pet after applying the gained skill xp.
+
+    """
+    if type(gained_xp) is np.ndarray or type(left_over_pet_xp) is np.ndarray:
+        gained_pet_xp, left_over_pet_xp = dragon_xp_batch(np.asarray(gained_xp)[..., None], pet_xp_boost, xp_boost_pet_item, left_over_pet_xp)
+        return gained_pet_xp[..., 0], left_over_pet_xp
+    drag_lvl_100 = dragon_lvl_100_xp
+    drag_lvl_200 = dragon_lvl_200_xp
+    gained_pet_xp = 0.0
+    skill_xp_per_pet = (drag_lvl_200 + drag_lvl_100 * (xp_boost_pet_item - 1)) / (xp_boost_pet_item * pet_xp_boost)
+    gained_pet_xp = - left_over_pet_xp
+    if left_over_pet_xp <= drag_lvl_100:
+        gained_xp += left_over_pet_xp / pet_xp_boost
+    else:
+        gained_xp += (left_over_pet_xp + drag_lvl_100 * (xp_boost_pet_item - 1)) / (pet_xp_boost * xp_boost_pet_item)
+    gained_pet_xp += (gained_xp // skill_xp_per_pet) * drag_lvl_200
+    left_over_xp = gained_xp % skill_xp_per_pet
+    if left_over_xp <= drag_lvl_100 / pet_xp_boost:
+        left_over_pet_xp = left_over_xp * pet_xp_boost
+    else:
+        left_over_pet_xp = left_over_xp * pet_xp_boost * xp_boost_pet_item + drag_lvl_100 * (1 - xp_boost_pet_item)
+    gained_pet_xp += left_over_pet_xp
+    return gained_pet_xp, left_over_pet_xp
+
+
+def dragon_xp_batch(gained_xp, pet_xp_boost, xp_boost_pet_item, left_over_pet_xp=0.0):
+    """
+    Calculates the pet xp gain on dragon pets for many setups or time horizons at once, with the same results as dragon_xp().
+    The skills are on the last axis, the left over pet xp of each skill is carried to the next skill like in pets_stage().
+    A single number is one skill of one setup.
+
+    Parameters
+    ----------
+    gained_xp : array_like
+        Gained skill xp, with shape (..., skills).
+    pet_xp_boost : array_like
+        Combined pet xp boost multipliers without pet item, broadcastable to the shape of gained_xp.
+    xp_boost_pet_item : array_like
+        Pet xp boost multipliers from pet item, broadcastable to the shape of gained_xp.
+    left_over_pet_xp : array_like, optional
+        Left over pet xp on the pet before the first skill, broadcastable to shape (...). The default is 0.0.
+
+    Returns
+    -------
+    gained_pet_xp : numpy.ndarray
+        Amount of pet xp gained per skill, with shape (..., skills).
+    left_over_pet_xp : numpy.ndarray
+        Left over pet xp on the pet after the last skill, with shape (...).
+
+    """
+    gained_xp, pet_xp_boost, xp_boost_pet_item = np.broadcast_arrays(np.asarray(gained_xp, dtype=float), np.asarray(pet_xp_boost, dtype=float), np.asarray(xp_boost_pet_item, dtype=float))
+    if gained_xp.ndim == 0:
+        gained_pet_xp, left_over_pet_xp = dragon_xp_batch(gained_xp[None], pet_xp_boost[None], xp_boost_pet_item[None], left_over_pet_xp)
+        return gained_pet_xp[0, ...], left_over_pet_xp
+    left_over_pet_xp = np.broadcast_to(np.asarray(left_over_pet_xp, dtype=float), gained_xp.shape[:-1]).copy()
+    gained_pet_xp = np.empty(gained_xp.shape)
+    for skill in range(gained_xp.shape[-1]):
+        skill_xp = gained_xp[..., skill]
+        boost = pet_xp_boost[..., skill]
+        item_boost = xp_boost_pet_item[..., skill]
+        skill_xp_per_pet = (dragon_lvl_200_xp + dragon_lvl_100_xp * (item_boost - 1)) / (item_boost * boost)
+        # skill xp equivalent of the left over pet xp, the pet item only boosts xp after level 100
+        skill_xp = skill_xp + np.where(left_over_pet_xp <= dragon_lvl_100_xp, left_over_pet_xp / boost,
+                                       (left_over_pet_xp + dragon_lvl_100_xp * (item_boost - 1)) / (boost * item_boost))
+        left_over_xp = skill_xp % skill_xp_per_pet
+        new_left_over_pet_xp = np.where(left_over_xp <= dragon_lvl_100_xp / boost, left_over_xp * boost,
+                                        left_over_xp * boost * item_boost + dragon_lvl_100_xp * (1 - item_boost))
+        gained_pet_xp[..., skill] = -left_over_pet_xp + (skill_xp // skill_xp_per_pet) * dragon_lvl_200_xp + new_left_over_pet_xp
+        left_over_pet_xp = new_left_over_pet_xp
+    return gained_pet_xp, left_over_pet_xp
+
+
+#%% Compactor transforms
+
+# per item transforms of the Compactor and the Super Compactor, compiled once from md.compactorList and md.enchanterList
+# stored as {ID: (compacted ID, amount needed per action, amount made per action, compacted_items record)}
+compactor_transforms = {item: (data["makes"], data["per"], data.get("amount", 1), {"from": item, **data}) for item, data in md.compactorList.items()}
+enchanter_transforms = {item: (data["makes"], data["per"], data.get("amount", 1), {"from": item, **data}) for item, data in md.enchanterList.items()}
+
+# transforms applied per upgrade pair, stored as {(upgrade1, upgrade2): [(transforms, chained)]}
+compactor_plans = {}
+
+
+def compactor_plan(setup, upgrades_types):
+    """
+    Returns the transforms applied by the upgrades of a setup, memoized per upgrade pair.
+
+    Parameters
+    ----------
+    setup : dict
+        Setup with at least "upgrade1" and "upgrade2".
+    upgrades_types : list
+        Special types of the upgrades, from upgrades_stage().
+
+    Returns
+    -------
+    list
+        Transforms to apply in order, as (transforms, chained) tuples.
+        Chained transforms are applied again to the items they make, like the Super Compactor.
+
+    """
+    key = (setup["upgrade1"], setup["upgrade2"])
+    plan = compactor_plans.get(key)
+    if plan is None:
+        plan = []
+        # Compactors go once through item list because there are no double normal compacted items
+        if "compact" in upgrades_types:
+            plan.append((compactor_transforms, False))
+        if "enchant" in upgrades_types:
+            plan.append((enchanter_transforms, True))
+        compactor_plans[key] = plan
+    return plan
+
+
+def apply_transforms(items, transforms, chained, compacted_items, notes):
+    """
+    Compacts the items in place.
+    For each item it floors the ratio between items and needed items for one compacted,
+    multiplies the floored ratio if the action creates multiple compacted item and uses modulo to find the left over amount.
+    Chained transforms are repeated for the compacted items, in the same order as repeated passes over the whole item list,
+    but only the items made by the previous pass are looked at again.
+
+    Parameters
+    ----------
+    items : dict
+        Amounts per Skyblock Item ID.
+    transforms : dict
+        Transforms per item, like compactor_transforms.
+    chained : bool
+        Toggle to repeat the transforms on the compacted items.
+    compacted_items : list
+        List that the compacted_items records of the applied transforms are added to.
+    notes : dict
+        Notes of the evaluation, for warnings.
+
+    Returns
+    -------
+    None.
+
+    """
+    # the amounts are read from a copy of the item list of the start of the pass, like the earlier while-loop did
+    to_check = list(items.items())
+    passes = 0
+    while True:
+        passes += 1
+        if passes >= 10:  # safety to prevent an infinite loop
+            catch_warning(notes, "While-loop overflow, super compactor 3000")
+            return
+        made = set()
+        found_chained = False
+        for item, amount in to_check:
+            transform = transforms.get(item)
+            if transform is None:
+                continue
+            compact_name, per_compact, per_action, record = transform
+            compact_amount = int(amount / per_compact)
+            if compact_amount == 0:
+                continue
+            compact_amount *= per_action
+            left_over = amount % per_compact
+            if left_over == 0.0:  # floating point error may cause extremely small numbers that should have been 0 too not trigger this
+                del items[item]
+            else:
+                items[item] = left_over
+            items[compact_name] = compact_amount
+            made.add(compact_name)
+            compacted_items.append(record)
+            if compact_name in transforms:
+                found_chained = True
+        if not chained or not found_chained:
+            return
+        # all other items are left overs that are too few to compact again
+        to_check = [(item, amount) for item, amount in items.items() if item in made]
+
+
+#%% Calculation stages
+# every stage reads the setup, the prices and the results of earlier stages in the state dict s,
+# and writes its own results into s
+# a stage can replace the prices for the next stages by writing a new PriceSnapshot to s["prices"]
+
+def speed_stage(setup, prices, s):
+    """Extracts often used minion constants and adds up the minion speed bonus."""
+    # extracting often used minion constants
+    minion_type = s["minion_type"] = setup["minion"]
+    minion_tier = s["minion_tier"] = setup["miniontier"]
+    minion_amount = s["minion_amount"] = setup["amount"]
+    minion_fuel = s["minion_fuel"] = md.fuel_options[setup["fuel"]]
+    minion_beacon = s["minion_beacon"] = setup["beacon"]
+    mayor = s["mayor"] = setup["mayor"]
+
+    # Enchanted Clock uses offline calculations, but you can be on the island when using it to apply boosts that require a loaded island.
+    # This clock_override replaces afk_toggle for these boosts
+    afk_toggle = setup["afk"]
+    clock_toggle = setup["enchanted_clock"]
+    clock_override = False
+    if clock_toggle and afk_toggle:
+        afk_toggle = False
+        clock_override = True
+    s["afk_toggle"] = afk_toggle
+    s["clock_override"] = clock_override
+
+    # list upgrades types
+    upgrades = [md.upgrade_options[setup["upgrade1"]], md.upgrade_options[setup["upgrade2"]]]
+    upgrades_types = []
+    for upgrade in upgrades:
+        for temp_type in md.itemList[upgrade]["upgrade"]["special"]["type"].split(", "):
+            upgrades_types.append(temp_type)
+    s["upgrades"] = upgrades
+    s["upgrades_types"] = upgrades_types
+
+    # adding up minion speed bonus
+    # uses the fact that booleans can be seen as 0 or 1 or false and true resp.
+    speedBonus = 0
+    speedBonus += md.itemList[minion_fuel]["upgrade"]["speed"]
+    speedBonus += md.itemList[upgrades[0]]["upgrade"]["speed"] + md.itemList[upgrades[1]]["upgrade"]["speed"]
+    speedBonus += 2 * minion_beacon + 10 * setup["infusion"]
+    speedBonus += 10 * setup["free_will"] + 5 * setup["postcard"]
+    speedBonus += 5 * setup["potatoTalisman"] * (afk_toggle or clock_override) * (minion_type == "Potato")
+    if setup["crystal"] != "None":
+        if minion_type in list(md.floating_crystals[setup["crystal"]].values())[0]:
+            speedBonus += list(md.floating_crystals[setup["crystal"]].keys())[0]
+    if minion_beacon != 0:
+        speedBonus += 1 * setup["scorched"]
+    if minion_type == "Inferno":
+        if s["rising_celsius_override"]:
+            speedBonus += 180
+        else:
+            speedBonus += 18 * min(10, minion_amount)
+    if mayor == "Cole" and (afk_toggle or clock_override) and minion_type in [
+            'Cobblestone', 'Obsidian', 'Glowstone', 'Gravel', 'Sand', 'Ice', 'Coal', 'Iron',
+            'Gold', 'Diamond', 'Lapis', 'Redstone', 'Emerald', 'Quartz', 'End Stone', 'Mithril']:
+        speedBonus += 25
+    afkpet = setup["afkpet"]
+    afkpet_rarity = setup["afkpetrarity"]
+    afkpet_lvl = setup["afkpetlvl"]
+    if (afk_toggle or clock_override) and minion_type in md.boost_pets[afkpet]["affects"] and afkpet_rarity in md.boost_pets[afkpet]:
+        speedBonus += md.boost_pets[afkpet][afkpet_rarity][0] + afkpet_lvl * md.boost_pets[afkpet][afkpet_rarity][1]
+    s["speedBonus"] = speedBonus
+
+    # calculate final minion speed
+    base_speed = md.minionList[minion_type]["speed"][minion_tier]
+    secondsPaction = base_speed / (1 + speedBonus / 100)
+    if minion_fuel == "INFERNO_FUEL":
+        secondsPaction /= 1 + md.infernofuel_data["grades"][md.getID[setup["infernoGrade"]]]
+    s["secondsPaction"] = secondsPaction
+    s["actiontime"] = secondsPaction
+    return
+
+
+def drop_multiplier_stage(setup, prices, s):
+    """Multiplies up the minion drop bonus and applies AFKing, Special Layouts and Player Harvests influences."""
+    minion_type = s["minion_type"]
+    minion_fuel = s["minion_fuel"]
+    afk_toggle = s["afk_toggle"]
+    upgrades = s["upgrades"]
+
+    # multiply up minion drop bonus
+    dropMultiplier = 1
+    dropMultiplier *= md.itemList[minion_fuel]["upgrade"]["drop"]
+    dropMultiplier *= md.itemList[upgrades[0]]["upgrade"]["drop"]
+    if afk_toggle and dropMultiplier > 1:
+        # drop multiplier greater than 1 is rounded down while online
+        dropMultiplier = int(dropMultiplier)
+    dropMultiplier *= md.itemList[upgrades[1]]["upgrade"]["drop"]
+    if afk_toggle and dropMultiplier > 1:
+        dropMultiplier = int(dropMultiplier)
+    if s["mayor"] == "Derpy":
+        dropMultiplier *= 2
+
+    # AFKing, Special Layouts and Player Harvests influences
+    actionsPerHarvest = 2
+    if minion_type == "Fishing":
+        # only has harvests actions
+        actionsPerHarvest = 1
+    if afk_toggle:
+        if minion_type in ["Pumpkin", "Melon"]:
+            # pumpkins and melons are forced to regrow for minion to harvest
+            actionsPerHarvest = 1
+        if setup["playerHarvests"]:
+            if minion_type in ["Fishing", "Pumpkin", "Melon"]:
+                s["notes"]["Player Harvests"] = "Player Harvesting does not work with this minion"
+            else:
+                actionsPerHarvest = 1
+                dropMultiplier = 1
+                if minion_type in ["Gravel"]:
+                    upgrades = upgrades + ["FLINT_SHOVEL"]
+                    s["notes"]["Player Tools"] = "Assuming Player is using Flint Shovel"
+                if minion_type in ["Ice"]:
+                    s["notes"]["Player Tools"] = "Assuming Player is using Silk Touch"
+                if minion_type in ["Zombie", "Revenant", "Voidling", "Inferno", "Vampire", "Skeleton", "Creeper", "Spider", "Tarantula", "Cave Spider", "Blaze", "Magma Cube", "Enderman", "Ghast", "Slime", "Cow", "Pig", "Chicken", "Sheep", "Rabbit"]:
+                    dropMultiplier *= 1 + 15 * setup["playerLooting"] / 100
+        elif setup["specialLayout"]:
+            if minion_type in ["Cobblestone", "Mycelium", "Ice"]:
+                # cobblestone generator, regrowing mycelium, freezing water
+                actionsPerHarvest = 1
+            if minion_type in ["Flower", "Sand", "Red Sand", "Gravel"]:
+                # harvests through natural means: water flushing, gravity
+                actionsPerHarvest = 1
+                # speedBonus -= 10  # only spawning has 10% action speed reduction, not confirmed yet.
+    s["dropMultiplier"] = dropMultiplier
+    s["actionsPerHarvest"] = actionsPerHarvest
+    s["upgrades"] = upgrades
+    return
+
+
+def base_drops_stage(setup, prices, s):
+    """Applies the AFK loot table changes, does the time calculations and calculates the base drops."""
+    minion_type = s["minion_type"]
+    afk_toggle = s["afk_toggle"]
+    secondsPaction = s["secondsPaction"]
+    actionsPerHarvest = s["actionsPerHarvest"]
+    dropMultiplier = s["dropMultiplier"]
+
+    # AFK loot table changes
+    # applied on a copy of the loot table of the minion
+    drops = md.minionList[minion_type]["drops"]
+    if minion_type in ['Oak', 'Spruce', 'Birch', 'Dark Oak', 'Acacia', 'Jungle']:
+        drops = dict(drops)
+        if afk_toggle:
+            # chopped trees have 4 blocks of wood, unknown why offline gives 3
+            drops[md.getID[f"{minion_type} Log"]] = 4
+        else:
+            drops[md.getID[f"{minion_type} Log"]] = 3
+    if minion_type == "Flower":
+        if afk_toggle and setup["specialLayout"]:
+            # tall flows blocked by string
+            drops = {"YELLOW_FLOWER": 1 / 10, "RED_ROSE": 1 / 10, "SMALL_FLOWER": 8 / 10}
+        else:
+            drops = {"YELLOW_FLOWER": 1 / 14, "RED_ROSE": 1 / 14, "SMALL_FLOWER": 8 / 14, "LARGE_FLOWER": 4 / 14}
+
+    # time calculations
+    if setup["often_empty"]:
+        emptytimeNumber = time_number(setup["emptytimelength"], setup["emptytimeamount"], secondsPaction, actionsPerHarvest)
+        timeNumber = time_number(setup["totaltimelength"], setup["totaltimeamount"], secondsPaction, actionsPerHarvest)
+        timeratio = timeNumber / emptytimeNumber
+        s["emptytime"] = f"{setup['emptytimeamount']} {setup['emptytimelength']}"
+    else:
+        emptytimeNumber = time_number(setup["totaltimelength"], setup["totaltimeamount"], secondsPaction, actionsPerHarvest)
+        timeratio = 1
+    s["time"] = f"{setup['totaltimeamount']} {setup['totaltimelength']}"
+    if setup["emptytimelength"] == "Harvests":
+        harvestsPerTime = setup["emptytimeamount"]
+    else:
+        harvestsPerTime = emptytimeNumber / (actionsPerHarvest * secondsPaction)
+    s["minionHarvestsPerTime"] = s["minion_amount"] * harvestsPerTime
+    s["harvests"] = s["minionHarvestsPerTime"] * timeratio
+
+    # drop multiplier online/offline mode
+    if not afk_toggle:
+        harvestsPerTime *= dropMultiplier
+        dropMultiplier = 1
+
+    # base drops
+    for item, amount in drops.items():
+        s["items"][item] = harvestsPerTime * amount * dropMultiplier
+    s["emptytimeNumber"] = emptytimeNumber
+    s["timeratio"] = timeratio
+    s["harvestsPerTime"] = harvestsPerTime
+    s["dropMultiplier"] = dropMultiplier
+    return
+
+
+def upgrades_stage(setup, prices, s):
+    """Calculates the drops generated by the internal minion upgrades."""
+    minion_type = s["minion_type"]
+    minion_fuel = s["minion_fuel"]
+    afk_toggle = s["afk_toggle"]
+    upgrades = s["upgrades"]
+    harvestsPerTime = s["harvestsPerTime"]
+    dropMultiplier = s["dropMultiplier"]
+    items = s["items"]
+
+    # upgrade drops
+    # create seperate dict to keep it separate from the main drops
+    # because some upgrades use main drops to generate something
+    upgrade_drops = {}
+    spreading_drops = {}
+    cooldown_drops = {}
+    for upgrade in upgrades:
+        upgrade_type = md.itemList[upgrade]["upgrade"]["special"]["type"]
+        if "replace" in upgrade_type:
+            # replacing upgrades are like Auto Smelters
+            for item in list(items.keys()):
+                if item in md.itemList[upgrade]["upgrade"]["special"]["list"]:
+                    items[md.itemList[upgrade]["upgrade"]["special"]["list"][item]] = items.pop(item)
+        if upgrade_type == "generate":
+            # generating upgrades are like Diamond Spreadings
+            finalAmount = 0
+            spreading_chance = md.itemList[upgrade]["upgrade"]["special"]["chance"]
+            for amount in items.values():
+                finalAmount += spreading_chance * amount
+            if minion_fuel == "INFERNO_FUEL" and afk_toggle:
+                finalAmount /= 5
+            for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
+                if item not in spreading_drops:
+                    spreading_drops[item] = 0
+                spreading_drops[item] += finalAmount * amount
+        elif upgrade_type == "add":
+            # adding upgrades are like Corrupt Soils
+            for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
+                if item not in upgrade_drops:
+                    upgrade_drops[item] = 0
+                upgrade_drops[item] += harvestsPerTime * amount
+        elif upgrade_type == "timer":
+            # timer upgrades are like Soulflow Engines
+            if afk_toggle and upgrade == "LESSER_SOULFLOW_ENGINE" and "SOULFLOW_ENGINE" in upgrades:
+                continue  # Soulflow Engine overrides Lesser Soulflow Engine while online
+            effective_cooldown = md.itemList[upgrade]["upgrade"]["special"]["cooldown"]
+            for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
+                if item not in cooldown_drops:
+                    cooldown_drops[item] = 0
+                cooldown_drops[item] += amount * s["emptytimeNumber"] / effective_cooldown
+
+    # other upgrades behaviours
+    if afk_toggle:
+        if "CORRUPT_SOIL" in upgrades:
+            if "afkcorrupt" in md.minionList[minion_type]:
+                # Certain mob minions get more corrupt drops when afking
+                # It is not a constant multiplier, it is equivalent in chance to the main drops of the minion
+                upgrade_drops["SULPHUR_ORE"] *= md.minionList[minion_type]["afkcorrupt"]
+                upgrade_drops["CORRUPTED_FRAGMENT"] *= md.minionList[minion_type]["afkcorrupt"]
+            if minion_type == "Chicken" and "ENCHANTED_EGG" not in upgrades:
+                # Online Chicken minion without Enchanted Egg does not make corrupt drops
+                upgrade_drops["SULPHUR_ORE"] = 0
+                upgrade_drops["CORRUPTED_FRAGMENT"] = 0
+        if "ENCHANTED_EGG" in upgrades:
+            # Enchanted Eggs make one laid egg and one egg on kill while AFKing
+            # the egg on spawn is affected by drop multipliers
+            upgrade_drops["EGG"] *= 1 + dropMultiplier
+    else:
+        if "ENCHANTED_SHEARS" in upgrades:
+            # No wool gets added from Enchanted Shears when offline
+            upgrade_drops["WOOL"] = 0
+    if "SOULFLOW_ENGINE" in upgrades and minion_type == "Voidling":
+        cooldown_drops["RAW_SOULFLOW"] *= 1 + 0.03 * s["minion_tier"]  # correct most likely, needs testing
+
+    # spreading upgrades triggering from some upgrade drops
+    for upgrade in upgrades:
+        upgrade_type = md.itemList[upgrade]["upgrade"]["special"]["type"]
+        if upgrade_type != "generate":
+            continue
+        else:
+            spreading_chance = md.itemList[upgrade]["upgrade"]["special"]["chance"]
+            if afk_toggle:
+                if "ENCHANTED_EGG" in upgrades:
+                    # the egg on spawn triggers spreadings
+                    for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
+                        if item not in spreading_drops:
+                            spreading_drops[item] = 0
+                        spreading_drops[item] += harvestsPerTime * dropMultiplier * spreading_chance * amount
+            else:
+                finalAmount = 0
+                for amount in upgrade_drops.values():
+                    finalAmount += spreading_chance * amount
+                for item, amount in md.itemList[upgrade]["upgrade"]["special"]["item"].items():
+                    if item not in spreading_drops:
+                        spreading_drops[item] = 0
+                    spreading_drops[item] += finalAmount * amount
+    s["upgrade_drops"] = upgrade_drops
+    s["spreading_drops"] = spreading_drops
+    s["cooldown_drops"] = cooldown_drops
+    return
+
+
+def inferno_fuel_stage(setup, prices, s):
+    """Calculates the Inferno minion fuel drops and the price of the fuel."""
+    # Inferno minion fuel drops
+    # https://wiki.hypixel.net/Inferno_Minion_Fuel
+    if s["minion_fuel"] != "INFERNO_FUEL":
+        return
+    harvestsPerTime = s["harvestsPerTime"]
+    upgrade_drops = s["upgrade_drops"]
+    items = s["items"]
+    # distilate drops
+    distilate = md.getID[setup["infernoDistillate"]]
+    distilate_item = md.infernofuel_data["distilates"][distilate][0]
+    amount_per = md.infernofuel_data["distilates"][distilate][1]
+    distillate_harvests = (harvestsPerTime * 4) / 5
+    upgrade_drops[distilate_item] = distillate_harvests * amount_per
+    for item in list(items.keys()):  # replacing main drops with distilate drops
+        items[item] /= 5
+
+    # Hypergolic drops
+    if setup["infernoGrade"] == "Hypergolic Gabagool":  # hypergolic fuel stuff
+        multiplier = 1
+        if setup["infernoEyedrops"] is True:  # Capsaicin Eyedrops
+            multiplier = 1.3
+        for item, chance in md.infernofuel_data["drops"].items():
+            upgrade_drops[item] = 0
+            if item == "INFERNO_APEX" and s["minion_tier"] >= 10:  # Apex Minion perk
+                chance *= 2
+            upgrade_drops[item] += multiplier * chance * harvestsPerTime
+        upgrade_drops["HYPERGOLIC_IONIZED_CERAMICS"] = s["emptytimeNumber"] / md.itemList[s["minion_fuel"]]["upgrade"]["duration"]
+
+    # calculate fuel cost
+    infernofuel_components = {"INFERNO_FUEL_BLOCK": 2,  # 2 inferno fuel blocks
+                              distilate: 6,  # 6 times distilate item
+                              md.getID[setup["infernoGrade"]]: 1,  # 1 gabagool core
+                              "CAPSAICIN_EYEDROPS_NO_CHARGES": int(setup["infernoEyedrops"])  # capsaicin eyedrops
+                              }
+    costPerInfernofuel = 0
+    for component_ID, amount in infernofuel_components.items():
+        costPerInfernofuel += amount * get_price(setup, prices, component_ID, action="buy", location="bazaar")
+    s["prices"] = prices.overlay({"INFERNO_FUEL": {"custom": costPerInfernofuel}})
+    # the fuel cost is put into the prices of this evaluation to be used later in the general fuel cost calculator
+    return
+
+
+def compactors_stage(setup, prices, s):
+    """Adds the upgrade drops to the main item list and applies the (Super) Compactor logic."""
+    items = s["items"]
+
+    # add upgrade drops to main item list
+    upgrade_drops = s["upgrade_drops"]
+    upgrade_drops.update(s["spreading_drops"])
+    upgrade_drops.update(s["cooldown_drops"])
+    for item, amount in upgrade_drops.items():
+        if item not in items:
+            items[item] = 0
+        items[item] += amount
+
+    # (Super) Compactor logic at the end because it applies to all drops
+    # keeps track of which items have been compacted to check for loss of profit
+    # saves per item the following dict
+    # {"from": item, "makes": compact item, "amount": amount of compacted, "per": amount of item needed}
+    compacted_items = []
+    for transforms, chained in compactor_plan(setup, s["upgrades_types"]):
+        apply_transforms(items, transforms, chained, compacted_items, s["notes"])
+    s["compacted_items"] = compacted_items
+    return
+
+
+def storage_stage(setup, prices, s):
+    """Calculates the available and used storage and the fill time."""
+    minion_type = s["minion_type"]
+    minion_tier = s["minion_tier"]
+    # storage calculations
+    # amount of storage measured in slots
+    available_storage = md.minion_chests[setup["chest"]]
+    if "storage" in md.minionList[minion_type] and minion_tier in md.minionList[minion_type]["storage"]:
+        available_storage += md.minionList[minion_type]["storage"][minion_tier]
+    else:
+        available_storage += md.standard_storage[minion_tier]
+
+    # WARNING: calculation for fill_time does not work with compactors and is not accurate for setup with multiple drops
+    # used_storage_slots calculations work fine.
+    used_storage = 0
+    used_storage_slots = 0
+    for itemtype, amount in s["items"].items():
+        used_storage += amount / 64  # hypixel does not care about smaller max stack sizes
+        used_storage_slots += np.ceil(amount / 64)
+    s["filltime"] = (s["emptytimeNumber"] * available_storage) / used_storage
+    s["used_storage"] = used_storage_slots
+    s["available_storage"] = available_storage
+    return
+
+
+def coins_stage(setup, prices, s):
+    """Multiplies the drops by the minion amount, converts the items into coins and checks for over-compacting."""
+    items = s["items"]
+    # multiply drops by minion amount
+    # all processes as calculated above should be linear with minion amount
+    for itemtype in items.keys():
+        items[itemtype] *= s["minion_amount"]
+
+    # convert items into coins
+    # while keeping track where items get sold
+    # it makes a list of all prices and takes the one that matches the choice of sellLoc
+    minion_hopper = setup["hopper"]
+    minion_sellLoc = setup["sellLoc"]
+    coinsPerTime = 0.0
+    sellto = "NPC"
+    hopper_multiplier = 1
+    if minion_sellLoc == "Bazaar":
+        sellto = "bazaar"
+    elif minion_sellLoc == "Best (NPC/Bazaar)":
+        sellto = "best"
+    elif minion_sellLoc == "Hopper":
+        hopper_multiplier = md.hopper_data[minion_hopper]
+    item_prices = {}
+    # Coins
+    if minion_sellLoc != "None":
+        for itemtype, amount in items.items():
+            item_prices.clear()
+            item_prices["NPC"] = get_price(setup, prices, itemtype, "sell", "npc")
+            item_prices["bazaar"] = get_price(setup, prices, itemtype, "sell", "bazaar")
+            if sellto in item_prices:
+                s["itemSellLoc"][itemtype] = sellto
+                final_price = item_prices[sellto]
+            else:
+                s["itemSellLoc"][itemtype] = max(item_prices, key=item_prices.get)
+                final_price = item_prices[s["itemSellLoc"][itemtype]]
+            s["itemtypeProfit"][itemtype] = amount * final_price * hopper_multiplier
+            coinsPerTime += amount * final_price
+    coinsPerTime *= hopper_multiplier
+    s["coinsPerTime"] = coinsPerTime
+    s["itemProfit"] = coinsPerTime * s["timeratio"]
+
+    # Check for over-compacting
+    if sellto in ["best", "bazaar"]:
+        overcompacting = []
+        for data in s["compacted_items"]:
+            item = data["from"]
+            compact_item = data["makes"]
+            per_compact = data["per"]
+            compact_amount = 1
+            if "amount" in data:
+                compact_amount = data["amount"]
+            cost = get_price(setup, prices, item, "sell", "bazaar") * per_compact
+            compact_cost = get_price(setup, prices, compact_item, "sell", "bazaar") * compact_amount
+            if cost - compact_cost > s["compact_tolerance"]:
+                overcompacting.append(md.itemList[item]['display'])
+        if len(overcompacting) != 0:
+            s["notes"]["Over-compacting"] = ', '.join(overcompacting)
+    return
+
+
+def xp_stage(setup, prices, s):
+    """Converts the items into skill xp."""
+    xp = s["xp"]
+    for itemtype, amount in s["items"].items():
+        index = item_index[itemtype]
+        value = item_xp_value_list[index]
+        if value == 0:
+            continue
+        xptype = xp_types[item_xp_type_list[index]]
+        if xptype not in xp:
+            xp[xptype] = 0
+        xp[xptype] += amount * value * (1 + setup[f"{xptype}Wisdom"] / 100)
+    if s["mayor"] == "Derpy":
+        for xptype in xp.keys():
+            xp[xptype] *= 1.5
+    if s["afk_toggle"] and setup["playerHarvests"] and "combat" in xp:
+        del xp["combat"]
+    return
+
+
+def pets_stage(setup, prices, s):
+    """Calculates the pet leveling of the leveling pet and the Exp Share pets."""
+    # Pet leveling calculations
+    # https://wiki.hypixel.net/Pets#Leveling
+    # for Golden Dragon: special algorithm taking into account that pet items cannot be applied to Golden Dragon Eggs
+    # the pet costs are manually added in pet_costs
+    pet_costs = s["pet_costs"]
+    timeratio = s["timeratio"]
+    pets_levelled = s["pets_levelled"]
+    levelledPetsPerTime = s["levelledPetsPerTime"] = {}
+    petProfitPerTime = 0.0
+    all_pets = {"levelingpet": {"pet": setup["levelingpet"], "pet_xp": {}, "levelled_pets": 0.0},
+                "expsharepet": {"pet": setup["expsharepet"], "pet_xp": {"exp_share": 0.0}, "levelled_pets": 0.0},
+                "expsharepetslot2": {"pet": setup["expsharepetslot2"], "pet_xp": {"exp_share": 0.0}, "levelled_pets": 0.0},
+                "expsharepetslot3": {"pet": setup["expsharepetslot3"], "pet_xp": {"exp_share": 0.0}, "levelled_pets": 0.0}
+                }
+    main_pet = setup["levelingpet"]
+    main_pet_xp = all_pets["levelingpet"]["pet_xp"]
+    if main_pet != "None":
+        if main_pet in ["Golden Dragon", "Jade Dragon"]:
+            left_over_pet_xp = 0.0
+            for skill, amount in s["xp"].items():
+                pet_xp_boost, xp_boost_pet_item = get_pet_xp_boosts(setup, main_pet, skill)
+                main_pet_xp[skill], left_over_pet_xp = dragon_xp(amount, left_over_pet_xp, pet_xp_boost, xp_boost_pet_item)
+        else:
+            for skill, amount in s["xp"].items():
+                pet_xp_boost, xp_boost_pet_item = get_pet_xp_boosts(setup, main_pet, skill)
+                main_pet_xp[skill] = amount * pet_xp_boost * xp_boost_pet_item
+        exp_share_boost = 0.2 * setup["taming"] + 10 * (setup["mayor"] == "Diana") + setup["toucan_attribute"]
+        exp_share_item = 15 * setup["expshareitem"]
+        for pet_slot, pet_info in all_pets.items():
+            if pet_slot == "levelingpet":
+                continue
+            exp_share_pet = pet_info["pet"]
+            if exp_share_pet != "None":
+                if exp_share_pet in ["Golden Dragon", "Jade Dragon"]:
+                    if exp_share_boost == 0:
+                        continue
+                    left_over_pet_xp = 0.0
+                    for skill, amount in main_pet_xp.items():
+                        non_matching = get_pet_xp_boosts(setup, exp_share_pet, skill, True)
+                        equiv_pet_xp_boost = non_matching * (exp_share_boost / 100)
+                        equiv_xp_boost_pet_item = 1 + exp_share_item / exp_share_boost
+                        gained_pet_xp, left_over_pet_xp = dragon_xp(amount, left_over_pet_xp, equiv_pet_xp_boost, equiv_xp_boost_pet_item)
+                        pet_info["pet_xp"]["exp_share"] += gained_pet_xp
+                else:
+                    for skill, amount in main_pet_xp.items():
+                        non_matching = get_pet_xp_boosts(setup, exp_share_pet, skill, True)
+                        pet_info["pet_xp"]["exp_share"] += amount * ((exp_share_boost + exp_share_item * (exp_share_pet != "Golden Dragon (lvl 1-100)")) / 100) * non_matching
+            if s["mayor"] != "Diana":
+                break
+        exp_share_price = get_price(setup, prices, "PET_ITEM_EXP_SHARE", "buy", "custom", True)
+        if exp_share_price == 0:
+            exp_share_price = get_price(setup, prices, "PET_ITEM_EXP_SHARE_DROP", "buy", "bazaar") + 72 * get_price(setup, prices, "ENCHANTED_GOLD", "buy", "bazaar")
+        for pet_slot, pet_info in all_pets.items():
+            pets_levelled[pet_slot] = sum(pet_info["pet_xp"].values()) / md.max_lvl_pet_xp_amounts[md.all_pets[pet_info["pet"]]["rarity"]]
+            if pet_info["pet"] not in pet_costs:
+                s["notes"]["Pet Costs"] = f"{pet_info['pet']} is not in pet_costs."
+            else:
+                petProfitPerTime += pets_levelled[pet_slot] * (pet_costs[pet_info["pet"]]["max"] - pet_costs[pet_info["pet"]]["min"])
+            if pet_slot == "levelingpet" and (main_pet_item := setup["petxpboost"]) != "None":
+                petProfitPerTime -= pets_levelled[pet_slot] * get_price(setup, prices, md.getID[main_pet_item], "buy", "custom", True)
+            elif setup["expshareitem"]:
+                petProfitPerTime -= pets_levelled[pet_slot] * exp_share_price
+            levelledPetsPerTime[pet_slot] = pets_levelled[pet_slot]
+            pets_levelled[pet_slot] *= timeratio
+
+    s["petProfitPerTime"] = petProfitPerTime
+    s["petProfit"] = petProfitPerTime * timeratio
+    return
+
+
+def fuel_cost_stage(setup, prices, s):
+    """Calculates the beacon and limited fuel cost."""
+    minion_fuel = s["minion_fuel"]
+    emptytimeNumber = s["emptytimeNumber"]
+    # calculating beacon and limited fuel cost
+    fuelCostPerTime = 0.0
+    neededFuelPerTime = 0.0
+    if s["minion_beacon"] != 0:
+        if setup["scorched"]:
+            beacon_fuel_ID = "SCORCHED_POWER_CRYSTAL"
+        else:
+            beacon_fuel_ID = "POWER_CRYSTAL"
+        costPerCrystal = get_price(setup, prices, beacon_fuel_ID, "buy", "bazaar")
+        fuelCostPerTime += emptytimeNumber * costPerCrystal / md.itemList[beacon_fuel_ID]["duration"] * int(not (setup["B_constant"]))
+    if md.itemList[minion_fuel]["upgrade"]["duration"] != 0:
+        costPerFuel = get_price(setup, prices, minion_fuel, "buy", "bazaar")
+        neededFuelPerTime = s["minion_amount"] * emptytimeNumber / md.itemList[minion_fuel]["upgrade"]["duration"]
+        fuelCostPerTime += neededFuelPerTime * costPerFuel
+    s["fuelCostPerTime"] = fuelCostPerTime
+    s["neededFuelPerTime"] = neededFuelPerTime
+    s["fuelcost"] = fuelCostPerTime * s["timeratio"]
+    s["fuelamount"] = np.max([neededFuelPerTime * s["timeratio"], s["minion_amount"]])
+    return
+
+
+def tier_costs(setup, prices, minion_type):
+    """
+    Returns the cumulative cost of a minion for every tier, from crafting tier 1 up to that tier.
+    The tables are built once per price snapshot and bazaar buy setting, and stored in the snapshot.
+    The returned dicts are shared between evaluations and should not be changed.
+
+    Parameters
+    ----------
+    setup : dict
+        Setup with at least the bazaar settings and the mayor.
+    prices : PriceSnapshot
+        Prices to read from.
+    minion_type : str
+        Name of the minion.
+
+    Returns
+    -------
+    tiered_coin_cost : dict
+        Coin cost per tier, stored as {tier: coins}.
+    tiered_extra_cost : dict
+        Costs that are not bought with coins per tier, stored as {tier: {material: amount}}.
+        Tiers without extra costs are left out.
+
+    """
+    key = (minion_type, resolve_location(setup, "buy", "bazaar"))
+    tables = prices.tier_cost_tables.get(key)
+    if tables is not None:
+        return tables
+    cost_cache = {}
+    tiered_coin_cost = {}
+    tiered_extra_cost = {}
+    tier_loop = np.arange(max(md.minionCosts[minion_type])) + 1
+    for tier in tier_loop:
+        tiered_coin_cost[tier] = 0.0
+        if minion_type in md.extraMinionCosts:
+            if tier in md.extraMinionCosts[minion_type]:
+                if "COINS" in md.extraMinionCosts[minion_type][tier]:
+                    tiered_coin_cost[tier] += md.extraMinionCosts[minion_type][tier]["COINS"]
+                if len(md.extraMinionCosts[minion_type][tier]) > 1 or "COINS" not in md.extraMinionCosts[minion_type][tier]:
+                    tiered_extra_cost[tier] = {cost_type.replace('_', ' ').title(): amount for cost_type, amount in md.extraMinionCosts[minion_type][tier].items() if cost_type != "COINS"}
+        for item, amount in md.minionCosts[minion_type][tier].items():
+            if item not in cost_cache:
+                cost_cache[item] = get_price(setup, prices, item, "buy", "bazaar")
+            tiered_coin_cost[tier] += amount * cost_cache[item]
+        if tier != 1:
+            tiered_coin_cost[tier] += tiered_coin_cost[tier - 1]
+        if tier - 1 in tiered_extra_cost:
+            if tier not in tiered_extra_cost:
+                tiered_extra_cost[tier] = {}
+            for material, amount in tiered_extra_cost[tier - 1].items():
+                if material not in tiered_extra_cost[tier].items():
+                    tiered_extra_cost[tier][material] = 0
+                tiered_extra_cost[tier][material] += amount
+    tables = prices.tier_cost_tables[key] = (tiered_coin_cost, tiered_extra_cost)
+    return tables
+
+
+def free_will_table(setup, prices):
+    """
+    Calculates the expected Free Will cost of every minion on every tier, and the tier with the lowest cost.
+    The table is built once per price snapshot and bazaar buy setting, and stored in the snapshot.
+
+    Amount of Free Wills needed per minion:
+    Let p be the chance to get a loyal minion.
+    Let X be a r.v. denoting the amount of Free Wills needed.
+    Using first step analysis we get
+    E(X) = (1- p)(E(X) + 1) + p * 1
+    E(X) = (1- p)E(X) + 1 - p + p
+    E(X) = E(X)- pE(X) + 1
+    E(X)= 1/p
+
+    Parameters
+    ----------
+    setup : dict
+        Setup with at least the bazaar settings and the mayor.
+    prices : PriceSnapshot
+        Prices to read from.
+
+    Returns
+    -------
+    dict
+        "minion_types": list of minion names, the rows of the arrays.
+        "minion_index": dict of {minion name: row}.
+        "tiers": numpy.ndarray of the tiers, the columns of the arrays.
+        "tier_cost": numpy.ndarray of the cumulative cost of each minion and tier, inf for tiers a minion does not have.
+        "free_will_cost": numpy.ndarray of the expected cost of one loyal minion for each minion and tier.
+        "optimal_tier": numpy.ndarray of the tier with the lowest Free Will cost per minion.
+        "optimal_cost": numpy.ndarray of the Free Will cost on the optimal tier per minion.
+        The returned dict is shared between evaluations and should not be changed.
+
+    """
+    key = resolve_location(setup, "buy", "bazaar")
+    table = prices.free_will_tables.get(key)
+    if table is not None:
+        return table
+    free_will_price = get_price(setup, prices, "FREE_WILL", "buy", "bazaar")
+    postcard_price = get_price(setup, prices, "POSTCARD", "buy", "custom", True)
+    if postcard_price == 0:
+        # If no price found, use the free will price
+        final_postcard_cost = free_will_price
+    else:
+        final_postcard_cost = postcard_price
+    minion_types = list(md.minionCosts)
+    tiers = np.arange(max(max(costs) for costs in md.minionCosts.values())) + 1
+    tier_cost = np.full((len(minion_types), len(tiers)), np.inf)
+    for row, minion_type in enumerate(minion_types):
+        tiered_coin_cost = tier_costs(setup, prices, minion_type)[0]
+        tier_cost[row, :len(tiered_coin_cost)] = list(tiered_coin_cost.values())
+    free_wills_needed = 1 / (0.5 + 0.04 * (tiers - 1))
+    # for each failed Free Will we need another minion and we get a postcard
+    # the last Free Will will not give a post card
+    free_wills_failed = free_wills_needed - 1
+    free_will_cost = free_wills_failed * (tier_cost - final_postcard_cost) + free_wills_needed * free_will_price
+    optimal = np.argmin(free_will_cost, axis=1)
+    table = prices.free_will_tables[key] = {"minion_types": minion_types,
+                                            "minion_index": {minion_type: row for row, minion_type in enumerate(minion_types)},
+                                            "tiers": tiers,
+                                            "tier_cost": tier_cost,
+                                            "free_will_cost": free_will_cost,
+                                            "optimal_tier": tiers[optimal],
+                                            "optimal_cost": free_will_cost[np.arange(len(minion_types)), optimal]}
+    return table
+
+
+def setup_cost_stage(setup, prices, s):
+    """Calculates the setup cost and the Free Will cost."""
+    minion_type = s["minion_type"]
+    minion_tier = s["minion_tier"]
+    minion_amount = s["minion_amount"]
+    minion_fuel = s["minion_fuel"]
+    minion_beacon = s["minion_beacon"]
+    # Setup cost
+    total_cost = 0.0
+    # Single minion cost
+    tiered_coin_cost, tiered_extra_cost = tier_costs(setup, prices, minion_type)
+    if minion_tier in tiered_extra_cost:
+        s["notes"]["Extra cost"] = ", ".join([f"{amount} {material}" for material, amount in tiered_extra_cost[minion_tier].items()]) + " per minion"
+        s["extracost"] = ", ".join([f"{amount * minion_amount} {material}" for material, amount in tiered_extra_cost[minion_tier].items()])
+    else:
+        s["extracost"] = ""
+    total_cost += tiered_coin_cost[minion_tier]
+
+    # Infinite fuel cost
+    if minion_fuel != "NONE" and md.itemList[minion_fuel]["upgrade"]["duration"] == 0:
+        if minion_fuel == "EVERBURNING_FLAME" and get_price(setup, prices, "EVERBURNING_FLAME", "buy", "custom", True) == 0:
+            for item_ID, amount in md.upgrades_material_cost["EVERBURNING_FLAME"].items():
+                total_cost += amount * get_price(setup, prices, item_ID, "buy", "bazaar")
+        else:
+            total_cost += get_price(setup, prices, minion_fuel, "buy", "bazaar")
+
+    # Hopper cost
+    if setup["hopper"] in ["Budget Hopper", "Enchanted Hopper"]:
+        hopper_ID = md.getID[setup["hopper"]]
+        total_cost += get_price(setup, prices, hopper_ID, "buy", "bazaar")
+
+    # Internal minion upgrades cost
+    for upgrade in s["upgrades"]:
+        if upgrade != "NONE":
+            total_cost += get_price(setup, prices, upgrade, "buy", "bazaar")
+
+    # Infusion cost
+    if setup["infusion"] is True:
+        total_cost += get_price(setup, prices, "MITHRIL_INFUSION", "buy", "bazaar")
+
+    # Free Will costs, see free_will_table()
+    free_will_price = get_price(setup, prices, "FREE_WILL", "buy", "bazaar")
+    postcard_price = get_price(setup, prices, "POSTCARD", "buy", "custom", True)
+    if postcard_price == 0:
+        # If no price found, use the free will price
+        final_postcard_cost = free_will_price
+    else:
+        final_postcard_cost = postcard_price
+    if setup["free_will"] is True:
+        free_wills = free_will_table(setup, prices)
+        # only tiers up to the tier of the setup are options
+        tiered_free_will = free_wills["free_will_cost"][free_wills["minion_index"][minion_type], :minion_tier]
+        optimal = np.argmin(tiered_free_will) + 1
+        s["optimal_tier_free_will"] = optimal
+        s["notes"]["Free Will"] = f"per minion, apply {1 / (0.5 + 0.04 * (optimal - 1)):.2} Free Wills on Tier {optimal}"
+        s["freewillcost"] = tiered_free_will[optimal - 1] * minion_amount
+
+    # Storage Chest cost
+    if setup["chest"] != "None":
+        chest_ID = md.getID[setup["chest"]]
+        total_cost += get_price(setup, prices, chest_ID, "buy", "bazaar")
+
+    # multiply by minion amount
+    total_cost *= minion_amount
+
+    # Beacon cost
+    if minion_beacon != 0 and not setup["B_acquired"]:
+        for i in np.arange(minion_beacon) + 1:
+            for item_ID, amount in md.upgrades_material_cost["beacon"][i].items():
+                total_cost += amount * get_price(setup, prices, item_ID, "buy", "bazaar")
+
+    # Floating Crystal cost
+    if setup["crystal"] != "None":
+        for item_ID, amount in md.upgrades_material_cost["crystal"][setup["crystal"]].items():
+            total_cost += amount * get_price(setup, prices, item_ID, "buy", "bazaar")
+
+    # Postcard cost
+    if setup["postcard"]:
+        total_cost += final_postcard_cost
+
+    # Potato Talisman cost
+    if setup["potatoTalisman"]:
+        total_cost += get_price(setup, prices, "POTATO_TALISMAN", "buy", "custom", True)
+
+    # Attribute costs
+    if setup["toucan_attribute"] != 0:
+        total_cost += md.attribute_shards["Epic"][setup["toucan_attribute"]] * get_price(setup, prices, "SHARD_TOUCAN", "buy", "bazaar")
+    if setup["falcon_attribute"] != 0:
+        total_cost += md.attribute_shards["Rare"][setup["falcon_attribute"]] * get_price(setup, prices, "SHARD_FALCON", "buy", "bazaar")
+    s["setupcost"] = total_cost
+    return
+
+
+def totals_stage(setup, prices, s):
+    """Adds up the total profit, applies the time ratio to the final lists and adds the minion notes."""
+    s["totalProfit"] = s["itemProfit"] + s["petProfit"] - s["fuelcost"]
+
+    # amounts per emptytimeNumber seconds, for Result.rescale()
+    s["rates"] = {"emptytimeNumber": s["emptytimeNumber"], "secondsPaction": s["secondsPaction"], "actionsPerHarvest": s["actionsPerHarvest"],
+                  "minion_amount": s["minion_amount"], "harvests": s["minionHarvestsPerTime"],
+                  "items": dict(s["items"]), "itemtypeProfit": dict(s["itemtypeProfit"]), "xp": dict(s["xp"]), "pets_levelled": s["levelledPetsPerTime"],
+                  "coinsPerTime": s["coinsPerTime"], "petProfitPerTime": s["petProfitPerTime"],
+                  "fuelCostPerTime": s["fuelCostPerTime"], "neededFuelPerTime": s["neededFuelPerTime"]}
+
+    # multiply final lists by timeratio
+    for loop_key in ["items", "itemtypeProfit", "xp"]:
+        for item in s[loop_key]:
+            s[loop_key][item] *= s["timeratio"]
+
+    # Get minion notes
+    if "notes" in md.minionList[s["minion_type"]]:
+        s["notes"].update(md.minionList[s["minion_type"]]["notes"].copy())
+    return
+
+
+# stages in order of execution
+stages = [("speed", speed_stage),
+          ("drop_multiplier", drop_multiplier_stage),
+          ("base_drops", base_drops_stage),
+          ("upgrades", upgrades_stage),
+          ("inferno_fuel", inferno_fuel_stage),
+          ("compactors", compactors_stage),
+          ("storage", storage_stage),
+          ("coins", coins_stage),
+          ("xp", xp_stage),
+          ("pets", pets_stage),
+          ("fuel_cost", fuel_cost_stage),
+          ("setup_cost", setup_cost_stage),
+          ("totals", totals_stage)]
+
+# inputs of each stage, used by IncrementalEvaluator to rerun only the stages affected by a change
+# "inputs" are the setup keys read by the stage, stages that get prices also list the bazaar settings and the mayor
+# "reads" are the state keys read by the stage, "writes" are the state keys set or changed by the stage
+# notes are not listed, the notes added by each stage are tracked separately
+price_inputs = ["bazaar_buy_type", "bazaar_sell_type", "bazaar_taxes", "bazaar_flipper", "mayor"]
+stage_dependencies = {
+    "speed": {"inputs": ["minion", "miniontier", "amount", "fuel", "beacon", "mayor", "afk", "enchanted_clock", "upgrade1", "upgrade2", "infusion",
+                         "free_will", "postcard", "potatoTalisman", "crystal", "scorched", "afkpet", "afkpetrarity", "afkpetlvl", "infernoGrade"],
+              "reads": ["rising_celsius_override"],
+              "writes": ["minion_type", "minion_tier", "minion_amount", "minion_fuel", "minion_beacon", "mayor", "afk_toggle", "clock_override",
+                         "upgrades", "upgrades_types", "speedBonus", "secondsPaction", "actiontime"]},
+    "drop_multiplier": {"inputs": ["playerHarvests", "playerLooting", "specialLayout"],
+                        "reads": ["minion_type", "minion_fuel", "afk_toggle", "upgrades", "mayor"],
+                        "writes": ["dropMultiplier", "actionsPerHarvest", "upgrades"]},
+    "base_drops": {"inputs": ["specialLayout", "often_empty", "totaltimeamount", "totaltimelength", "emptytimeamount", "emptytimelength"],
+                   "reads": ["minion_type", "afk_toggle", "secondsPaction", "actionsPerHarvest", "dropMultiplier", "minion_amount", "items"],
+                   "writes": ["emptytime", "time", "minionHarvestsPerTime", "harvests", "items", "emptytimeNumber", "timeratio", "harvestsPerTime", "dropMultiplier"]},
+    "upgrades": {"inputs": [],
+                 "reads": ["minion_type", "minion_fuel", "minion_tier", "afk_toggle", "upgrades", "harvestsPerTime", "dropMultiplier", "items", "emptytimeNumber"],
+                 "writes": ["items", "upgrade_drops", "spreading_drops", "cooldown_drops"]},
+    "inferno_fuel": {"inputs": ["infernoDistillate", "infernoGrade", "infernoEyedrops"] + price_inputs,
+                     "reads": ["minion_fuel", "minion_tier", "harvestsPerTime", "upgrade_drops", "items", "emptytimeNumber", "prices"],
+                     "writes": ["upgrade_drops", "items", "prices"]},
+    "compactors": {"inputs": ["upgrade1", "upgrade2"],
+                   "reads": ["items", "upgrade_drops", "spreading_drops", "cooldown_drops", "upgrades_types"],
+                   "writes": ["items", "upgrade_drops", "compacted_items"]},
+    "storage": {"inputs": ["chest"],
+                "reads": ["minion_type", "minion_tier", "items", "emptytimeNumber"],
+                "writes": ["filltime", "used_storage", "available_storage"]},
+    "coins": {"inputs": ["hopper", "sellLoc"] + price_inputs,
+              "reads": ["items", "minion_amount", "itemSellLoc", "itemtypeProfit", "timeratio", "compacted_items", "compact_tolerance", "prices"],
+              "writes": ["items", "itemSellLoc", "itemtypeProfit", "coinsPerTime", "itemProfit"]},
+    "xp": {"inputs": ["combatWisdom", "miningWisdom", "farmingWisdom", "fishingWisdom", "foragingWisdom", "alchemyWisdom", "playerHarvests"],
+           "reads": ["xp", "items", "mayor", "afk_toggle"],
+           "writes": ["xp"]},
+    "pets": {"inputs": ["levelingpet", "expsharepet", "expsharepetslot2", "expsharepetslot3", "taming", "beastmaster", "expshareitem", "petxpboost",
+                        "toucan_attribute", "falcon_attribute"] + price_inputs,
+             "reads": ["pet_costs", "timeratio", "pets_levelled", "xp", "mayor", "prices"],
+             "writes": ["pets_levelled", "levelledPetsPerTime", "petProfitPerTime", "petProfit"]},
+    "fuel_cost": {"inputs": ["scorched", "B_constant"] + price_inputs,
+                  "reads": ["minion_fuel", "minion_amount", "minion_beacon", "emptytimeNumber", "timeratio", "prices"],
+                  "writes": ["fuelCostPerTime", "neededFuelPerTime", "fuelcost", "fuelamount"]},
+    "setup_cost": {"inputs": ["hopper", "infusion", "free_will", "chest", "B_acquired", "crystal", "postcard", "potatoTalisman",
+                              "toucan_attribute", "falcon_attribute"] + price_inputs,
+                   "reads": ["minion_type", "minion_tier", "minion_amount", "minion_fuel", "minion_beacon", "upgrades", "prices"],
+                   "writes": ["extracost", "optimal_tier_free_will", "freewillcost", "setupcost"]},
+    "totals": {"inputs": [],
+               "reads": ["itemProfit", "petProfit", "fuelcost", "items", "itemtypeProfit", "xp", "timeratio", "minion_type",
+                         "emptytimeNumber", "secondsPaction", "actionsPerHarvest", "minion_amount", "minionHarvestsPerTime",
+                         "levelledPetsPerTime", "coinsPerTime", "petProfitPerTime", "fuelCostPerTime", "neededFuelPerTime"],
+               "writes": ["totalProfit", "rates", "items", "itemtypeProfit", "xp"]}
+}
+
+
+#%% Evaluation
+
+class Result():
+    def __init__(self, outputs, rates=None, evaluation=None):
+        """
+        Outputs of one evaluation of a setup.
+
+        Parameters
+        ----------
+        outputs : dict
+            Outputs as {Calculator.variables key: value}.
+            Only contains the outputs that were calculated for this setup, for example "freewillcost" only exists with Free Will.
+        rates : dict, optional
+            The time dependent outputs as amounts per emptytimeNumber seconds, with the minion speed, see totals_stage().
+            Used by rescale(). The default is None.
+        evaluation : tuple, optional
+            The setup, PriceSnapshot and keyword arguments of the evaluation, as (setup, prices, evaluate_kwargs).
+            Used by rescale() for setups without "often_empty". The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.outputs = outputs
+        self.rates = rates
+        self.evaluation = evaluation
+        return
+
+    def rescale(self, time_length, time_amount):
+        """
+        Returns the outputs for another total time span, equal to evaluating the setup with the new total time span.
+        With "often_empty", storage, compacting and pet leveling happen per empty time and the empty time is kept,
+        so the time dependent outputs are scaled from the rates without evaluating the setup again.
+        Without "often_empty" the empty time is the total time span, so the setup is evaluated again.
+        A Result without evaluation is always scaled from the rates,
+        then without "often_empty" the storage outputs (like "filltime" and "used_storage") and the compacted amounts are those of the original time span.
+
+        Parameters
+        ----------
+        time_length : str
+            A time unit, "Years", "Weeks", "Days", "Hours", "Minutes", "Seconds", "Harvests".
+        time_amount : float
+            Amount of time units.
+
+        Returns
+        -------
+        Result
+            Outputs for the new total time span.
+
+        """
+        if self.evaluation is not None and not self.evaluation[0]["often_empty"]:
+            setup, prices, evaluate_kwargs = self.evaluation
+            return evaluate({**setup, "totaltimelength": time_length, "totaltimeamount": time_amount}, prices, **evaluate_kwargs)
+        rates = self.rates
+        timeratio = time_number(time_length, time_amount, rates["secondsPaction"], rates["actionsPerHarvest"]) / rates["emptytimeNumber"]
+        outputs = dict(self.outputs)
+        outputs["time"] = f"{time_amount} {time_length}"
+        outputs["harvests"] = rates["harvests"] * timeratio
+        for key in ["items", "itemtypeProfit", "xp", "pets_levelled"]:
+            outputs[key] = {item: amount * timeratio for item, amount in rates[key].items()}
+        outputs["itemProfit"] = rates["coinsPerTime"] * timeratio
+        outputs["petProfit"] = rates["petProfitPerTime"] * timeratio
+        outputs["fuelcost"] = rates["fuelCostPerTime"] * timeratio
+        outputs["fuelamount"] = np.max([rates["neededFuelPerTime"] * timeratio, rates["minion_amount"]])
+        outputs["totalProfit"] = outputs["itemProfit"] + outputs["petProfit"] - outputs["fuelcost"]
+        return Result(outputs, rates, self.evaluation)
+
+    def __getitem__(self, key):
+        return self.outputs[key]
+
+    def __contains__(self, key):
+        return key in self.outputs
+
+    def get(self, key, default=None):
+        return self.outputs.get(key, default)
+
+
+def evaluate(setup, prices, pet_costs=None, compact_tolerance=10000, rising_celsius_override=False, timers=None):
+    """
+    Main calculation function. Evaluates one setup with the given prices.
+
+    Parameters
+    ----------
+    setup : dict
+        Setup inputs, see default_setup for all keys and their initial values.
+    prices : PriceSnapshot
+        Prices used for the evaluation.
+    pet_costs : dict, optional
+        Prices of lvl 1 and max lvl pets, stored as {pet: {"min": price, "max": price}}. The default is None, for no pet costs.
+    compact_tolerance : float, optional
+        Minimum coin loss per compacting action for a note of coin loss. The default is 10000.
+    rising_celsius_override : bool, optional
+        Toggle to force the Rising Celsius boost of the Inferno minion to max. The default is False.
+    timers : dict, optional
+        If given, the seconds spent in each stage are added to it, stored as {stage name: seconds}.
+        The default is None, for no timing.
+
+    Returns
+    -------
+    Result
+        Outputs of the evaluation.
+
+    """
+    s = initial_state(setup, prices, pet_costs, compact_tolerance, rising_celsius_override)
+    if timers is None:
+        for stage_name, stage in stages:
+            stage(setup, s["prices"], s)
+    else:
+        for stage_name, stage in stages:
+            start = time.perf_counter()
+            stage(setup, s["prices"], s)
+            timers[stage_name] = timers.get(stage_name, 0.0) + time.perf_counter() - start
+    return Result({key: s[key] for key in output_keys if key in s}, s["rates"],
+                  (dict(setup), prices, {"pet_costs": pet_costs, "compact_tolerance": compact_tolerance, "rising_celsius_override": rising_celsius_override}))
+
+
+def pet_leveling_sweep(setup, prices, xp_scales, pet_costs=None, compact_tolerance=10000, rising_celsius_override=False):
+    """
+    Evaluates a setup once and calculates the pet leveling for the skill xp of the setup multiplied by each of xp_scales.
+    The pet leveling of all scales is calculated at once, with dragon_xp_batch() for dragon pets.
+    With outputs that are linear in the minion amount (like the Inferno minion with a max Rising Celsius boost),
+    this gives the pet profit of the setup for many minion amounts.
+
+    Parameters
+    ----------
+    setup : dict
+        Setup inputs, see default_setup.
+    prices : PriceSnapshot
+        Prices used for the evaluation.
+    xp_scales : array_like
+        Multipliers of the skill xp.
+    pet_costs, compact_tolerance, rising_celsius_override
+        See evaluate().
+
+    Returns
+    -------
+    numpy.ndarray
+        Pet profit ("petProfit") per xp scale.
+
+    """
+    xp_scales = np.asarray(xp_scales, dtype=float)
+    s = initial_state(setup, prices, pet_costs, compact_tolerance, rising_celsius_override)
+    for stage_name, stage in stages:
+        if stage_name == "pets":
+            break
+        stage(setup, s["prices"], s)
+    s["xp"] = {skill: amount * xp_scales for skill, amount in s["xp"].items()}
+    pets_stage(setup, s["prices"], s)
+    return np.broadcast_to(s["petProfit"], xp_scales.shape).copy()
+
+
+def initial_state(setup, prices, pet_costs=None, compact_tolerance=10000, rising_celsius_override=False):
+    """Creates the state dict s of an evaluation, see evaluate() for the parameters."""
+    return {"prices": prices.bind(setup), "pet_costs": {} if pet_costs is None else pet_costs, "compact_tolerance": compact_tolerance, "rising_celsius_override": rising_celsius_override,
+            "items": {}, "itemSellLoc": {}, "itemtypeProfit": {}, "xp": {}, "pets_levelled": {}, "notes": {}}
+
+
+def copy_value(value):
+    """Copies a dict or list of the state one level deep, they only contain numbers, strings and records that are not changed."""
+    if isinstance(value, (dict, list)):
+        return value.copy()
+    return value
+
+
+class IncrementalEvaluator():
+    def __init__(self):
+        """
+        Evaluates setups like evaluate(), but remembers the results of each stage of the previous evaluation.
+        When the next setup uses the same prices and evaluation settings, only the stages that depend on a changed input are run again,
+        the results of the other stages are taken from the previous evaluation. See stage_dependencies.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.setup = None
+        self.settings = None
+        # per stage: (state keys written by the stage, notes added by the stage)
+        self.checkpoints = []
+        # names of the stages that ran during the last evaluation, the other stages were taken from the previous evaluation
+        self.last_run = []
+        # per stage: (setup inputs, state reads and writes, state writes)
+        self.dependencies = [(frozenset(stage_dependencies[stage_name]["inputs"]),
+                              frozenset(stage_dependencies[stage_name]["reads"] + stage_dependencies[stage_name]["writes"]),
+                              frozenset(stage_dependencies[stage_name]["writes"])) for stage_name, stage in stages]
+        # the dicts and lists in the state are changed in place by later stages, stage results of those are stored as copies
+        self.changed_later = []
+        later_writes = set()
+        for inputs, used, writes in reversed(self.dependencies):
+            self.changed_later.insert(0, later_writes & writes)
+            later_writes |= writes
+        return
+
+    def evaluate(self, setup, prices, pet_costs=None, compact_tolerance=10000, rising_celsius_override=False, timers=None):
+        """
+        Evaluates one setup with the given prices, see evaluate().
+        With timers, only the stages that ran again are timed.
+
+        Returns
+        -------
+        Result
+            Outputs of the evaluation.
+
+        """
+        settings = (prices.version, pet_costs, compact_tolerance, rising_celsius_override)
+        if self.setup is None or settings != self.settings:
+            changed = None
+        else:
+            changed = {key for key, value in setup.items() if self.setup.get(key) != value}
+        # a stage runs again if one of its inputs changed, or if it reads or writes state that is written by a stage that runs again
+        rerun = []
+        dirty = set()
+        for inputs, used, writes in self.dependencies:
+            if changed is None or not changed.isdisjoint(inputs) or not dirty.isdisjoint(used):
+                rerun.append(True)
+                dirty |= writes
+            else:
+                rerun.append(False)
+        # the state taken from the previous evaluation is copied when a stage that runs again changes it in place
+        rerun_writes = []
+        later_writes = frozenset()
+        for index in reversed(range(len(stages))):
+            rerun_writes.insert(0, later_writes)
+            if rerun[index]:
+                later_writes = later_writes | self.dependencies[index][2]
+
+        s = initial_state(setup, prices, pet_costs, compact_tolerance, rising_celsius_override)
+        notes = s["notes"]
+        checkpoints = []
+        self.last_run = []
+        for index, (stage_name, stage) in enumerate(stages):
+            if rerun[index]:
+                notes_before = dict(notes)
+                if timers is None:
+                    stage(setup, s["prices"], s)
+                else:
+                    start = time.perf_counter()
+                    stage(setup, s["prices"], s)
+                    timers[stage_name] = timers.get(stage_name, 0.0) + time.perf_counter() - start
+                changed_later = self.changed_later[index]
+                written = {key: (copy_value(s[key]) if key in changed_later else s[key]) for key in self.dependencies[index][2] if key in s}
+                added_notes = {key: note for key, note in notes.items() if key not in notes_before or notes_before[key] != note}
+                self.last_run.append(stage_name)
+            else:
+                written, added_notes = self.checkpoints[index]
+                for key, value in written.items():
+                    s[key] = copy_value(value) if key in rerun_writes[index] else value
+                notes.update(added_notes)
+                if "prices" in written:
+                    s["prices"] = s["prices"].bind(setup)
+            checkpoints.append((written, added_notes))
+        self.setup = dict(setup)
+        self.settings = settings
+        self.checkpoints = checkpoints
+        return Result({key: s[key] for key in output_keys if key in s}, s["rates"],
+                      (dict(setup), prices, {"pet_costs": pet_costs, "compact_tolerance": compact_tolerance, "rising_celsius_override": rising_celsius_override}))
+
+
+class ResultCache():
+    def __init__(self, max_size=256):
+        """
+        Bounded cache of evaluation Results, the least recently used Result is removed first.
+        The key should contain everything the Result depends on,
+        for example the setup ID, the PriceSnapshot version and the evaluation settings.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            Maximum amount of stored Results. The default is 256.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.max_size = max_size
+        # dicts keep insertion order, the first key is the least recently used
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+        return
+
+    def get(self, key):
+        """
+        Returns the stored Result of key and marks it as most recently used, None if key is not stored.
+        """
+        result = self.results.pop(key, None)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.results[key] = result
+        return result
+
+    def put(self, key, result):
+        """
+        Stores a Result, removes the least recently used Result if the cache is full.
+        """
+        self.results.pop(key, None)
+        self.results[key] = result
+        if len(self.results) > self.max_size:
+            del self.results[next(iter(self.results))]
+        return
+
+    def clear(self):
+        """
+        Removes all stored Results, the hit and miss counters are kept.
+        """
+        self.results.clear()
+        return
+
+
+#%% Parallel evaluation
+
+# evaluation settings of a worker process, set once per worker by _init_worker
+_worker_args = {}
+
+
+def _init_worker(prices, evaluate_kwargs):
+    """Stores the shared PriceSnapshot and evaluation settings in a worker process."""
+    _worker_args["prices"] = prices
+    _worker_args["kwargs"] = evaluate_kwargs
+    return
+
+
+def _evaluate_in_worker(setup):
+    """Evaluates one setup in a worker process and returns the outputs and rates of the Result."""
+    result = evaluate(setup, _worker_args["prices"], **_worker_args["kwargs"])
+    return result.outputs, result.rates
+
+
+def evaluate_many(setups, prices, workers=1, **evaluate_kwargs):
+    """
+    Evaluates multiple setups with the same prices, optionally spread over a pool of worker processes.
+    The prices are sent to each worker once, not with every setup.
+    The workers are started with the "spawn" method, forking is not safe in the calculator with its Tkinter window and bazaar threads.
+
+    Parameters
+    ----------
+    setups : list
+        List of setup dicts, see evaluate().
+    prices : PriceSnapshot
+        Prices used for all evaluations.
+    workers : int, optional
+        Amount of worker processes. 1 evaluates in this process, 0 uses one worker per CPU core. The default is 1.
+    **evaluate_kwargs
+        Other keyword arguments for evaluate(), like pet_costs and compact_tolerance.
+
+    Returns
+    -------
+    list
+        List of Result, in the same order as setups, independent of the amount of workers.
+
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(setups))
+    if workers <= 1:
+        return [evaluate(setup, prices, **evaluate_kwargs) for setup in setups]
+    chunksize = max(1, len(setups) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(prices, evaluate_kwargs)) as pool:
+        # map keeps the order of setups
+        results = pool.map(_evaluate_in_worker, setups, chunksize=chunksize)
+        return [Result(outputs, rates, (dict(setup), prices, evaluate_kwargs)) for setup, (outputs, rates) in zip(setups, results)]
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Herodirk
+
+Setup optimizer of the minion calculator.
+Searches the fuel, upgrades, beacon, chest and hopper of a minion setup for the highest total profit within a setup cost budget.
+Finds the Pareto frontier of profit against cost of many setups.
+All evaluations are done by minion_engine.
+
+The search space is reduced before evaluating:
+    Symmetric upgrade pairs are only evaluated once
+    Setups of which the setup cost is over budget are skipped
+    Dominated options are skipped, see dominated_options()
+    Upgrade pairs with a compacting upgrade search all fuels and upgrades, see compacting_upgrade()
+"""
+
+import bisect
+import numpy as np
+import HSB_minion_data as md
+import minion_engine as engine
+
+
+# setup inputs that are searched, with the value that is used as "nothing"
+search_inputs = {"fuel": "None", "upgrade1": "None", "upgrade2": "None", "beacon": 0, "chest": "None", "hopper": "None"}
+beacon_options = [0, 1, 2, 3, 4, 5]
+
+
+def order_sensitive(upgrade):
+    """
+    Checks if the result of an upgrade can depend on the slot it is in.
+    Upgrades with a drop multiplier are rounded per slot while AFKing,
+    replacing and generating upgrades change or read the drops of earlier slots.
+
+    Parameters
+    ----------
+    upgrade : str
+        Display name of the upgrade, key of md.upgrade_options.
+
+    Returns
+    -------
+    bool
+        True if the upgrade is order sensitive.
+
+    """
+    upgrade_data = md.itemList[md.upgrade_options[upgrade]]["upgrade"]
+    upgrade_type = upgrade_data["special"]["type"]
+    return upgrade_data["drop"] != 1 or "replace" in upgrade_type or upgrade_type == "generate"
+
+
+def upgrade_pairs(upgrades):
+    """
+    Lists the upgrade1 and upgrade2 pairs to search.
+    A pair and its swapped pair give the same result, unless both upgrades are order sensitive.
+
+    Parameters
+    ----------
+    upgrades : list
+        Display names of the upgrades.
+
+    Returns
+    -------
+    list
+        List of (upgrade1, upgrade2) tuples.
+
+    """
+    pairs = []
+    for index1, upgrade1 in enumerate(upgrades):
+        for index2, upgrade2 in enumerate(upgrades):
+            if index2 < index1 and not (order_sensitive(upgrade1) and order_sensitive(upgrade2)):
+                continue
+            pairs.append((upgrade1, upgrade2))
+    return pairs
+
+
+def compacting_upgrade(upgrade):
+    """
+    Checks if an upgrade compacts items, like the Compactor and the Super Compactor.
+    Compacting rounds the compacted amounts down, so with a compacting upgrade the total profit can drop when the speed goes up,
+    for example when more items reach a compacting threshold and the compacted item sells for less than the items.
+
+    Parameters
+    ----------
+    upgrade : str
+        Display name of the upgrade, key of md.upgrade_options.
+
+    Returns
+    -------
+    bool
+        True if the upgrade compacts items.
+
+    """
+    upgrade_types = md.itemList[md.upgrade_options[upgrade]]["upgrade"]["special"]["type"].split(", ")
+    return "compact" in upgrade_types or "enchant" in upgrade_types
+
+
+def component_costs(base_setup, prices, **evaluate_kwargs):
+    """
+    Calculates how much each option of the searched inputs adds to the setup cost.
+    The setup cost is a sum of separate parts, so the setup cost of any combination of options
+    is the cost without any options plus the added costs of the chosen options.
+
+    Parameters
+    ----------
+    base_setup : dict
+        Setup to search from.
+    prices : minion_engine.PriceSnapshot
+        Prices used for all evaluations.
+    **evaluate_kwargs
+        Other keyword arguments for minion_engine.evaluate().
+
+    Returns
+    -------
+    empty_cost : float
+        Setup cost without any of the searched options.
+    added_costs : dict
+        Added cost per option, stored as {input key: {option: added cost}}.
+
+    """
+    empty_setup = {**base_setup, **search_inputs}
+    empty_cost = engine.evaluate(empty_setup, prices, **evaluate_kwargs)["setupcost"]
+    options = {"fuel": list(md.fuel_options.keys()), "upgrade1": list(md.upgrade_options.keys()),
+               "beacon": beacon_options, "chest": list(md.minion_chests.keys()), "hopper": list(md.hopper_data.keys())}
+    added_costs = {}
+    for key, key_options in options.items():
+        added_costs[key] = {}
+        for option in key_options:
+            if option == search_inputs[key]:
+                added_costs[key][option] = 0.0
+                continue
+            added_costs[key][option] = engine.evaluate({**empty_setup, key: option}, prices, **evaluate_kwargs)["setupcost"] - empty_cost
+    added_costs["upgrade2"] = added_costs["upgrade1"]
+    return empty_cost, added_costs
+
+
+def dominated_options(base_setup, prices, added_costs):
+    """
+    Finds the options that can be skipped because another option is at least as good for the same or lower cost.
+    Chests only change the storage, so only the cheapest chest is kept.
+    Hoppers only change the profit when selling to the hopper, otherwise only the cheapest hopper is kept.
+    Fuels and upgrades that only add speed are compared on speed, running cost and setup cost.
+    This assumes that the total profit does not decrease with more speed, which holds as long as nothing is compacted,
+    so candidate_setups() only skips the dominated fuels and upgrades in upgrade pairs without a compacting upgrade.
+
+    Parameters
+    ----------
+    base_setup : dict
+        Setup to search from.
+    prices : minion_engine.PriceSnapshot
+        Prices used for all evaluations.
+    added_costs : dict
+        Added setup cost per option, see component_costs().
+
+    Returns
+    -------
+    dict
+        Skipped options, stored as {input key: [options]}.
+
+    """
+    dominated = {"fuel": [], "upgrade1": [], "chest": [], "hopper": []}
+    cheapest_chest = min(added_costs["chest"], key=added_costs["chest"].get)
+    dominated["chest"] = [chest for chest in added_costs["chest"] if chest != cheapest_chest]
+    if base_setup["sellLoc"] != "Hopper":
+        cheapest_hopper = min(added_costs["hopper"], key=added_costs["hopper"].get)
+        dominated["hopper"] = [hopper for hopper in added_costs["hopper"] if hopper != cheapest_hopper]
+
+    # speed-only fuels, grouped by drop multiplier
+    fuel_stats = {}
+    for fuel, fuel_ID in md.fuel_options.items():
+        if fuel_ID == "INFERNO_FUEL":
+            continue
+        fuel_data = md.itemList[fuel_ID]["upgrade"]
+        running_cost = 0.0
+        if fuel_data["duration"] != 0:
+            running_cost = engine.get_price(base_setup, prices, fuel_ID, "buy", "bazaar") / fuel_data["duration"]
+        fuel_stats[fuel] = (fuel_data["drop"], fuel_data["speed"], running_cost, added_costs["fuel"][fuel])
+    # speed-only upgrades
+    upgrade_stats = {}
+    for upgrade, upgrade_ID in md.upgrade_options.items():
+        upgrade_data = md.itemList[upgrade_ID]["upgrade"]
+        if upgrade_data["drop"] != 1 or upgrade_data["special"]["type"] not in ["None", "expand"]:
+            continue
+        upgrade_stats[upgrade] = (1, upgrade_data["speed"], 0.0, added_costs["upgrade1"][upgrade])
+
+    for key, stats in [("fuel", fuel_stats), ("upgrade1", upgrade_stats)]:
+        options = list(stats.keys())
+        for index, option in enumerate(options):
+            drop, speed, running_cost, setup_cost = stats[option]
+            for other_index, other in enumerate(options):
+                other_drop, other_speed, other_running_cost, other_setup_cost = stats[other]
+                if other == option or other in dominated[key] or other_drop != drop:
+                    continue
+                if other_speed >= speed and other_running_cost <= running_cost and other_setup_cost <= setup_cost:
+                    if (other_speed, -other_running_cost, -other_setup_cost) != (speed, -running_cost, -setup_cost) or other_index < index:
+                        dominated[key].append(option)
+                        break
+    dominated["upgrade2"] = dominated["upgrade1"]
+    return dominated
+
+
+def candidate_setups(base_setup, prices, budget, prune=True, **evaluate_kwargs):
+    """
+    Lists all setups to evaluate, after removing symmetric upgrade pairs, setups over budget and dominated options.
+    Dominated fuels and upgrades are kept in upgrade pairs with a compacting upgrade, see compacting_upgrade().
+
+    Parameters
+    ----------
+    base_setup : dict
+        Setup to search from, the searched inputs are replaced.
+    prices : minion_engine.PriceSnapshot
+        Prices used for all evaluations.
+    budget : float
+        Maximum setup cost.
+    prune : bool, optional
+        Toggle to skip dominated options. The default is True.
+    **evaluate_kwargs
+        Other keyword arguments for minion_engine.evaluate().
+
+    Returns
+    -------
+    list
+        List of setup dicts.
+
+    """
+    empty_cost, added_costs = component_costs(base_setup, prices, **evaluate_kwargs)
+    dominated = {"fuel": [], "upgrade1": [], "upgrade2": [], "chest": [], "hopper": []}
+    if prune:
+        dominated = dominated_options(base_setup, prices, added_costs)
+    options = {key: [option for option in key_options if option not in dominated.get(key, [])] for key, key_options in added_costs.items()}
+    # small margin for the rounding of the summed costs, the final setup cost is checked after evaluating
+    cost_limit = budget + 1e-9 * abs(budget)
+    setups = []
+    for upgrade1, upgrade2 in upgrade_pairs(list(added_costs["upgrade1"].keys())):
+        # the speed dominance only holds without compacting
+        compacting = compacting_upgrade(upgrade1) or compacting_upgrade(upgrade2)
+        if not compacting and (upgrade1 in dominated["upgrade1"] or upgrade2 in dominated["upgrade2"]):
+            continue
+        upgrades_cost = empty_cost + added_costs["upgrade1"][upgrade1] + added_costs["upgrade2"][upgrade2]
+        if upgrades_cost > cost_limit:
+            continue
+        for fuel in (added_costs["fuel"].keys() if compacting else options["fuel"]):
+            fuel_cost = upgrades_cost + added_costs["fuel"][fuel]
+            if fuel_cost > cost_limit:
+                continue
+            for beacon in options["beacon"]:
+                beacon_cost = fuel_cost + added_costs["beacon"][beacon]
+                if beacon_cost > cost_limit:
+                    continue
+                for chest in options["chest"]:
+                    chest_cost = beacon_cost + added_costs["chest"][chest]
+                    if chest_cost > cost_limit:
+                        continue
+                    for hopper in options["hopper"]:
+                        if chest_cost + added_costs["hopper"][hopper] > cost_limit:
+                            continue
+                        setups.append({**base_setup, "fuel": fuel, "upgrade1": upgrade1, "upgrade2": upgrade2,
+                                       "beacon": beacon, "chest": chest, "hopper": hopper})
+    return setups
+
+
+def optimize_upgrades(base_setup, prices, budget, prune=True, workers=1, **evaluate_kwargs):
+    """
+    Searches every fuel, upgrade pair, beacon tier, chest and hopper for the setup with the highest total profit
+    with a setup cost within budget.
+
+    Parameters
+    ----------
+    base_setup : dict
+        Setup to search from, the other inputs like minion, tier and amount are kept.
+    prices : minion_engine.PriceSnapshot
+        Prices used for all evaluations.
+    budget : float
+        Maximum setup cost.
+    prune : bool, optional
+        Toggle to skip dominated options, see dominated_options(). The default is True.
+    workers : int, optional
+        Amount of worker processes, see minion_engine.evaluate_many(). The default is 1.
+    **evaluate_kwargs
+        Other keyword arguments for minion_engine.evaluate().
+
+    Returns
+    -------
+    best_setup : dict or None
+        Setup with the highest total profit, None if no setup fits in the budget.
+    best_result : minion_engine.Result or None
+        Result of best_setup.
+    searched : int
+        Amount of evaluated setups.
+
+    """
+    setups = candidate_setups(base_setup, prices, budget, prune, **evaluate_kwargs)
+    results = engine.evaluate_many(setups, prices, workers=workers, **evaluate_kwargs)
+    best_setup = None
+    best_result = None
+    for setup, result in zip(setups, results):
+        if result["setupcost"] > budget:
+            continue
+        # ties keep the first setup in search order
+        if best_result is None or result["totalProfit"] > best_result["totalProfit"]:
+            best_setup = setup
+            best_result = result
+    return best_setup, best_result, len(setups)
+
+
+#%% Pareto frontier
+
+def pareto_frontier(profits, costs, fill_times=None):
+    """
+    Finds the setups that are not dominated on profit (higher is better) and cost (lower is better),
+    optionally with fill time (higher is better) as a third axis.
+    A setup is dominated if another setup is at least as good on every axis, of equal setups only the first is kept.
+    Uses a sort-filter skyline: after sorting on all axes, a setup can only be dominated by setups before it,
+    so each setup is only compared to the frontier found so far.
+    With fill time, the frontier so far is kept as a staircase that is searched with bisect, so the whole search is O(n log n) for typical inputs.
+
+    Parameters
+    ----------
+    profits : array_like
+        Profit per setup.
+    costs : array_like
+        Cost per setup.
+    fill_times : array_like, optional
+        Fill time per setup. The default is None, for only profit and cost.
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices of the setups on the frontier, sorted from low to high cost.
+
+    """
+    profits = np.asarray(profits, dtype=float)
+    costs = np.asarray(costs, dtype=float)
+    indices = np.arange(len(profits))
+    if fill_times is None:
+        # sort on cost (low first), then profit (high first), then input order
+        order = np.lexsort((indices, -profits, costs))
+        sorted_profits = profits[order]
+        best_before = np.concatenate(([-np.inf], np.maximum.accumulate(sorted_profits)[:-1]))
+        return order[sorted_profits > best_before]
+    fill_times = np.asarray(fill_times, dtype=float)
+    order = np.lexsort((indices, -fill_times, -profits, costs))
+    # the setups before a setup all cost the same or less, so it is dominated if one of them has at least its profit and fill time
+    # the frontier so far is kept as a staircase of (profit, fill time), with profit going up and fill time going down
+    stair_profits = []
+    stair_fill_times = []  # negative fill times, so both lists are sorted from low to high for bisect
+    on_frontier = np.zeros(len(order), dtype=bool)
+    for sorted_index, (profit, fill_time) in enumerate(zip(profits[order].tolist(), fill_times[order].tolist())):
+        # the first stair with at least this profit has the highest fill time of those stairs
+        stair = bisect.bisect_left(stair_profits, profit)
+        if stair < len(stair_profits) and -stair_fill_times[stair] >= fill_time:
+            continue
+        # remove the stairs with at most this profit and fill time, they are dominated by this setup from now on
+        first = bisect.bisect_left(stair_fill_times, -fill_time)
+        last = bisect.bisect_right(stair_profits, profit)
+        if first < last:
+            del stair_profits[first:last]
+            del stair_fill_times[first:last]
+        stair = bisect.bisect_left(stair_profits, profit)
+        stair_profits.insert(stair, profit)
+        stair_fill_times.insert(stair, -fill_time)
+        on_frontier[sorted_index] = True
+    return order[on_frontier]
+
+
+def explore_frontier(setups, prices, use_fill_time=False, workers=1, **evaluate_kwargs):
+    """
+    Evaluates setups and returns the setups on the Pareto frontier of total profit against setup cost plus Free Will cost.
+
+    Parameters
+    ----------
+    setups : list
+        List of setup dicts.
+    prices : minion_engine.PriceSnapshot
+        Prices used for all evaluations.
+    use_fill_time : bool, optional
+        Toggle to add fill time as third axis of the frontier. The default is False.
+    workers : int, optional
+        Amount of worker processes, see minion_engine.evaluate_many(). The default is 1.
+    **evaluate_kwargs
+        Other keyword arguments for minion_engine.evaluate().
+
+    Returns
+    -------
+    list
+        List of (setup, result, cost) tuples on the frontier, sorted from low to high cost.
+
+    """
+    results = engine.evaluate_many(setups, prices, workers=workers, **evaluate_kwargs)
+    profits = [result["totalProfit"] for result in results]
+    costs = [result["setupcost"] + result.get("freewillcost", 0.0) for result in results]
+    fill_times = None
+    if use_fill_time:
+        fill_times = [result["filltime"] for result in results]
+    return [(setups[index], results[index], costs[index]) for index in pareto_frontier(profits, costs, fill_times)]
@@ -6,8 +6,23 @@ Official Minion Calculator Add-ons.
 A collection of add-ons made by Herodirk.
 """
 
+import threading
 import numpy as np
 import HSB_minion_data as md
+import minion_engine as engine
+import minion_optimizer
+
+loop_workers = 1
+# amount of worker processes for the Basic Minion Loop, 1 calculates on the GUI thread, 0 uses one worker per CPU core
+# saving this file and restarting the calculator is needed to apply changes.
+
+frontier_fill_time = False
+# if True, the Profit Frontier add-on also uses the fill time as third axis
+# saving this file and restarting the calculator is needed to apply changes.
+
+optimizer_budget = 100000000
+# maximum setup cost for the Upgrade Optimizer, input the full number so no abbreviations like "100M"
+# saving this file and restarting the calculator is needed to apply changes.
 
 
 def old_corrupted_frags(calculator):
@@ -59,9 +74,12 @@ def setup_repay_time(calculator):
 def rising_celsius_override(calculator):
     """Forces the rising celsius boost to max"""
     calculator.rising_celsius_override = True
-    calculator.calculate()
-    calculator.update_GUI()
-    calculator.rising_celsius_override = False
+    # turned off even if the calculation fails, it is part of the result cache key of calculate
+    try:
+        calculator.calculate()
+        calculator.update_GUI()
+    finally:
+        calculator.rising_celsius_override = False
     calculator.collect_addon_output("Rising Celsius Override", "Forced Rising Celsius boost to max")
     return
 
@@ -73,30 +91,39 @@ def basic_minion_loop(calculator):
     loop_minion_skip = ["Custom"]
     loop_minion_smelting = ["Iron", "Gold", "Cactus"]
     loop_minion_combat = ["Zombie", "Revenant", "Voidling", "Inferno", "Vampire", "Skeleton", "Creeper", "Spider", "Tarantula", "Cave Spider", "Blaze", "Magma Cube", "Enderman", "Ghast", "Slime", "Cow", "Pig", "Chicken", "Sheep", "Rabbit"]
+    base_setup = calculator.get_setup()
     super_compactor = False
-    if calculator.variables["upgrade1"]["var"].get() in ["Super Compactor 3000", "Dwarven Super Compactor"]:
+    if base_setup["upgrade1"] in ["Super Compactor 3000", "Dwarven Super Compactor"]:
         super_compactor = True
-    if calculator.variables["upgrade2"]["var"].get() in ["Super Compactor 3000", "Dwarven Super Compactor"]:
+    if base_setup["upgrade2"] in ["Super Compactor 3000", "Dwarven Super Compactor"]:
         super_compactor = True
-        calculator.variables["upgrade2"]["var"].set(calculator.variables["upgrade1"]["var"].get())
-        calculator.variables["upgrade1"]["var"].set("Super Compactor 3000")
-    
-    upgrades = [calculator.variables["upgrade1"]["var"].get(), calculator.variables["upgrade2"]["var"].get()]
+        base_setup["upgrade2"] = base_setup["upgrade1"]
+        base_setup["upgrade1"] = "Super Compactor 3000"
+
+    upgrades = [base_setup["upgrade1"], base_setup["upgrade2"]]
+    loop_minions = []
+    loop_setups = []
     for loop_minion in loop_minion_options:
         if loop_minion in loop_minion_skip:
             continue
         if loop_minion not in loop_minion_combat and "Corrupt Soil" in upgrades:
             continue
-        calculator.variables["minion"]["var"].set(loop_minion)
-        calculator.multiswitch(multi_ID="minion", control=loop_minion)
+        loop_setup = dict(base_setup)
+        loop_setup["minion"] = loop_minion
+        loop_setup["miniontier"] = list(md.minionList[loop_minion]["speed"].keys())[-1]
         if super_compactor:
             if loop_minion in loop_minion_smelting:
-                calculator.variables["upgrade1"]["var"].set("Dwarven Super Compactor")
+                loop_setup["upgrade1"] = "Dwarven Super Compactor"
             else:
-                calculator.variables["upgrade1"]["var"].set("Super Compactor 3000")
-        calculator.calculate()
-        calculated_setup_profits[loop_minion] = calculator.variables["totalProfit"]["var"].get()
-        calculated_setup_costs[loop_minion] = calculator.variables["setupcost"]["var"].get()
+                loop_setup["upgrade1"] = "Super Compactor 3000"
+        loop_minions.append(loop_minion)
+        loop_setups.append(loop_setup)
+
+    # all setups are evaluated with the same bazaar prices
+    results = calculator.evaluate_setups(loop_setups, workers=loop_workers)
+    for loop_minion, result in zip(loop_minions, results):
+        calculated_setup_profits[loop_minion] = result["totalProfit"]
+        calculated_setup_costs[loop_minion] = result["setupcost"]
     print("Minion : profit , setup cost")
     for _ in range(10):
         top_minion = max(calculated_setup_profits, key=calculated_setup_profits.get)
@@ -107,42 +134,178 @@ def basic_minion_loop(calculator):
 
 
 def inferno_minion_loop(calculator):
-    calculated_setup_profits = {}
-    calculated_setup_bad_luck_profits = {}
-    calculated_setup_costs = {}
-
     cost_filter = 10000000000
     # input the full number as filter, so no abbreviations like "6B"
     # saving this file and restarting the calculator is needed to apply changes.
     # will make this into a good working input in the GUI later.
 
-    calculator.variables["minion"]["var"].set("Inferno")
-    calculator.variables["fuel"]["var"].set("Inferno Minion Fuel")
-    calculator.variables["chest"]["var"].set("XX-Large")
-
-    loop_tiers = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
-    loop_amounts = list(np.arange(1, 32))
-    for loop_tier in loop_tiers:
-        calculator.variables["miniontier"]["var"].set(loop_tier)
-        for loop_amount in loop_amounts:
-            calculator.variables["amount"]["var"].set(loop_amount)
-            rising_celsius_override(calculator)
-            bad_luck_profit = bad_luck_inferno(calculator, return_value=True)
-            cost = calculator.variables["setupcost"]["var"].get()
-            if calculator.variables["free_will"]["var"].get():
-                cost += calculator.variables["freewillcost"]["var"].get()
-            if cost < cost_filter:
-                calculated_setup_costs[f"{loop_tier}, {loop_amount}"] = cost
-                calculated_setup_profits[f"{loop_tier}, {loop_amount}"] = calculator.variables["totalProfit"]["var"].get()
-                calculated_setup_bad_luck_profits[f"{loop_tier}, {loop_amount}"] = bad_luck_profit
+    base_setup = calculator.get_setup()
+    base_setup["minion"] = "Inferno"
+    base_setup["fuel"] = "Inferno Minion Fuel"
+    base_setup["chest"] = "XX-Large"
+    bad_luck_items = ["INFERNO_APEX", "REAPER_PEPPER", "INFERNO_VERTEX", "GABAGOOL_THE_FISH"]
+
+    loop_tiers = np.arange(1, 12)
+    loop_amounts = np.arange(1, 32)
+
+    def grid_values(result):
+        # [true average profit, bad luck profit, minion cost]
+        profit = result["totalProfit"]
+        bad_luck_profit = profit - sum(result["itemtypeProfit"].get(item, 0.0) for item in bad_luck_items)
+        cost = result["setupcost"]
+        if base_setup["free_will"]:
+            cost += result["freewillcost"]
+        return [profit, bad_luck_profit, cost]
+
+    # with the Rising Celsius boost forced to max, all values are linear in the minion amount
+    # so the grid is made from 1 and 2 minions per tier, and checked with the max amount of minions
+    sample_amounts = [1, 2, loop_amounts[-1]]
+    sample_setups = [{**base_setup, "miniontier": int(loop_tier), "amount": int(loop_amount)} for loop_tier in loop_tiers for loop_amount in sample_amounts]
+    prices = calculator.get_prices()
+    calculator.rising_celsius_override = True
+    # turned off even if an evaluation fails, later calculations would use the override
+    try:
+        sample_results = calculator.evaluate_setups(sample_setups, prices=prices)
+        samples = np.array([grid_values(result) for result in sample_results]).reshape(len(loop_tiers), len(sample_amounts), 3)
+        grid = samples[:, 0, None, :] + (loop_amounts - 1)[None, :, None] * (samples[:, 1] - samples[:, 0])[:, None, :]  # [tier, amount, value]
+        non_linear_tiers = np.nonzero(~np.all(np.isclose(grid[:, -1], samples[:, 2], rtol=1e-9), axis=1))[0]
+
+        # leveling a dragon pet is not linear in the amount, the rest of the profit is
+        # so the pet profit of all amounts is calculated at once from one evaluation per tier
+        pet_profits = np.array([result["petProfit"] for result in sample_results]).reshape(len(loop_tiers), len(sample_amounts))
+        pet_columns = np.array([1.0, 1.0, 0.0])  # the pet profit is part of both profits, not of the cost
+        settings = calculator.evaluate_settings(prices)
+        for tier_index in non_linear_tiers:
+            pet_free = samples[tier_index] - pet_profits[tier_index, :, None] * pet_columns
+            pet_sweep = engine.pet_leveling_sweep({**base_setup, "miniontier": int(loop_tiers[tier_index]), "amount": 1}, prices, loop_amounts, **settings)
+            tier_grid = pet_free[0] + (loop_amounts - 1)[:, None] * (pet_free[1] - pet_free[0]) + pet_sweep[:, None] * pet_columns
+            if np.all(np.isclose(tier_grid[-1], samples[tier_index, 2], rtol=1e-9)):
+                grid[tier_index] = tier_grid
+        non_linear_tiers = np.nonzero(~np.all(np.isclose(grid[:, -1], samples[:, 2], rtol=1e-9), axis=1))[0]
+
+        # tiers that are still non-linear are calculated for every amount
+        if len(non_linear_tiers) != 0:
+            full_setups = [{**base_setup, "miniontier": int(loop_tiers[tier_index]), "amount": int(loop_amount)} for tier_index in non_linear_tiers for loop_amount in loop_amounts]
+            full_values = np.array([grid_values(result) for result in calculator.evaluate_setups(full_setups, workers=loop_workers, prices=prices)])
+            grid[non_linear_tiers] = full_values.reshape(len(non_linear_tiers), len(loop_amounts), 3)
+    finally:
+        calculator.rising_celsius_override = False
+
+    # rank by bad luck profit, ties keep tier and amount order
+    tier_grid, amount_grid = np.meshgrid(loop_tiers, loop_amounts, indexing="ij")
+    in_budget = grid[:, :, 2] < cost_filter
+    ranked = np.argsort(-grid[:, :, 1][in_budget], kind="stable")[:10]
     print("Tier, Amount : bad luck profit , minion cost, true average profit")
-    for _ in range(10):
-        top_minion = max(calculated_setup_bad_luck_profits, key=calculated_setup_bad_luck_profits.get)
-        print(top_minion, ":", calculator.reduced_number(calculated_setup_bad_luck_profits[top_minion]), ",", calculator.reduced_number(calculated_setup_costs[top_minion]), ",", calculator.reduced_number(calculated_setup_profits[top_minion]))
-        del calculated_setup_bad_luck_profits[top_minion]
+    for index in ranked:
+        profit, bad_luck_profit, cost = grid[in_budget][index]
+        print(f"{tier_grid[in_budget][index]}, {amount_grid[in_budget][index]}", ":", calculator.reduced_number(bad_luck_profit), ",", calculator.reduced_number(cost), ",", calculator.reduced_number(profit))
     print(f"Bad Luck Profit: + {calculator.reduced_number(calculator.getPrice('INFERNO_VERTEX', 'sell', 'bazaar'), 2)} per Inferno Vertex")
     print("\n")
 
 
-add_ons_package = {"Days to Repay Setup": setup_repay_time, "Basic Minion Loop": basic_minion_loop, "Bad Luck Inferno": bad_luck_inferno, "Rising Celsius Override": rising_celsius_override, "Inferno Minion Loop": inferno_minion_loop}
+# add-on name: thread of a running search, see run_in_background
+background_tasks = {}
+
+
+def run_in_background(calculator, addon_name, work, show):
+    """
+    Runs work() on a background thread so the calculator window keeps responding during long searches.
+    The thread is checked every 100 ms on the GUI thread with calculator.after, like Calculator.poll_refresher,
+    when it is done show(output of work) runs on the GUI thread.
+    work() should not use the Tkinter variables, read the setup, prices and settings before starting it.
+    """
+    if addon_name in background_tasks:
+        calculator.collect_addon_output(addon_name, "Still running")
+        return
+    outcome = {}
+
+    def target():
+        try:
+            outcome["output"] = work()
+        except Exception as error:
+            outcome["error"] = error
+
+    def poll():
+        if background_tasks[addon_name].is_alive():
+            calculator.after(100, poll)
+            return
+        del background_tasks[addon_name]
+        if "error" in outcome:
+            print(f"ERROR: {addon_name} failed\n{outcome['error']}")
+            calculator.collect_addon_output(addon_name, "Failed, see the console")
+            return
+        show(outcome["output"])
+
+    background_tasks[addon_name] = threading.Thread(target=target, name=addon_name, daemon=True)
+    calculator.collect_addon_output(addon_name, "Running")
+    background_tasks[addon_name].start()
+    calculator.after(100, poll)
+    return
+
+
+def upgrade_optimizer(calculator):
+    """Outputs the fuel, upgrades, beacon, chest and hopper with the highest profit within optimizer_budget"""
+    setup = calculator.get_setup()
+    prices = calculator.get_prices()
+    settings = calculator.evaluate_settings(prices)
+    # the search takes about a second, so it runs in the background
+    run_in_background(calculator, "Upgrade Optimizer",
+                      lambda: minion_optimizer.optimize_upgrades(setup, prices, optimizer_budget, workers=loop_workers, **settings),
+                      lambda output: show_upgrade_optimizer(calculator, *output))
+    return
+
+
+def show_upgrade_optimizer(calculator, best_setup, best_result, searched):
+    """Outputs the result of the Upgrade Optimizer search"""
+    if best_setup is None:
+        calculator.collect_addon_output("Upgrade Optimizer", "No setup fits in the budget")
+        return
+    print(f"Upgrade Optimizer: searched {searched} setups")
+    for key in minion_optimizer.search_inputs:
+        print(calculator.variables[key]["display"], ":", best_setup[key])
+    print("Profit :", calculator.reduced_number(best_result["totalProfit"]), ", setup cost :", calculator.reduced_number(best_result["setupcost"]))
+    print("\n")
+    chosen = ", ".join(str(best_setup[key]) for key in minion_optimizer.search_inputs)
+    calculator.collect_addon_output("Upgrade Optimizer", f"{chosen}: {calculator.reduced_number(best_result['totalProfit'])} profit")
+    return
+
+
+def profit_frontier(calculator):
+    """Prints the minion, tier and fuel setups for which no other setup has both more profit and less cost"""
+    loop_minion_skip = ["Custom"]
+    base_setup = calculator.get_setup()
+    loop_setups = []
+    for loop_minion, minion_data in md.minionList.items():
+        if loop_minion in loop_minion_skip:
+            continue
+        for loop_tier in minion_data["speed"].keys():
+            for loop_fuel in md.fuel_options.keys():
+                loop_setups.append({**base_setup, "minion": loop_minion, "miniontier": loop_tier, "fuel": loop_fuel})
+    prices = calculator.get_prices()
+    settings = calculator.evaluate_settings(prices)
+    # evaluating every minion, tier and fuel takes about a second, so it runs in the background
+    run_in_background(calculator, "Profit Frontier",
+                      lambda: minion_optimizer.explore_frontier(loop_setups, prices, use_fill_time=frontier_fill_time, workers=loop_workers, **settings),
+                      lambda frontier: show_profit_frontier(calculator, frontier, len(loop_setups)))
+    return
+
+
+def show_profit_frontier(calculator, frontier, searched):
+    """Prints the result of the Profit Frontier search"""
+    print(f"Profit Frontier: {len(frontier)} of {searched} setups")
+    if frontier_fill_time:
+        print("Minion, Tier, Fuel : profit , setup + Free Will cost , fill time")
+    else:
+        print("Minion, Tier, Fuel : profit , setup + Free Will cost")
+    for setup, result, cost in frontier:
+        line = f"{setup['minion']}, {setup['miniontier']}, {setup['fuel']} : {calculator.reduced_number(result['totalProfit'])} , {calculator.reduced_number(cost)}"
+        if frontier_fill_time:
+            line += f" , {calculator.reduced_number(result['filltime'] / 3600)} hours"
+        print(line)
+    print("\n")
+    calculator.collect_addon_output("Profit Frontier", f"{len(frontier)} of {searched} setups, see the console")
+    return
+
+
+add_ons_package = {"Days to Repay Setup": setup_repay_time, "Basic Minion Loop": basic_minion_loop, "Bad Luck Inferno": bad_luck_inferno, "Rising Celsius Override": rising_celsius_override, "Inferno Minion Loop": inferno_minion_loop, "Upgrade Optimizer": upgrade_optimizer, "Profit Frontier": profit_frontier}
 # "Old Corrupted Frags": old_corrupted_frags
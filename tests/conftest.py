@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# the calculator files are flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import minion_engine as engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def prices():
+    """Base prices of md.itemList, no API calls."""
+    return engine.item_list_snapshot()
+
+
+@pytest.fixture
+def setups():
+    """A few setups that go through the different calculation stages."""
+    base = {**engine.default_setup, "often_empty": True}
+    return [{**base, "minion": "Cobblestone", "miniontier": 12, "upgrade1": "Super Compactor 3000"},
+            {**base, "minion": "Snow", "miniontier": 11, "upgrade1": "Compactor", "chest": "Large", "emptytimeamount": 3.0, "emptytimelength": "Hours"},
+            {**base, "minion": "Tarantula", "miniontier": 11, "levelingpet": "Griffin", "totaltimeamount": 2.0, "totaltimelength": "Weeks"},
+            {**base, "minion": "Clay", "miniontier": 12, "fuel": "Enchanted Charcoal", "afk": True, "mayor": "Derpy"},
+            {**base, "minion": "Sand", "miniontier": 11, "often_empty": False, "free_will": True, "postcard": True}]
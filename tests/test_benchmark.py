@@ -0,0 +1,15 @@
+import benchmark
+import minion_engine as engine
+
+
+def test_committed_fixture_replays(capsys):
+    prices = benchmark.load_fixture(benchmark.file_path(benchmark.fixture_file))
+    assert prices.last_updated == 1700000000
+    setup = {**engine.default_setup, "minion": "Cobblestone", "miniontier": 12, "sellLoc": "Bazaar"}
+    assert engine.evaluate(setup, prices)["totalProfit"] > 0
+
+
+def test_generated_fixture_is_reproducible(tmp_path, capsys):
+    benchmark.generate_fixture(str(tmp_path / "first.json"))
+    benchmark.generate_fixture(str(tmp_path / "second.json"))
+    assert (tmp_path / "first.json").read_bytes() == (tmp_path / "second.json").read_bytes()
@@ -0,0 +1,50 @@
+import tkinter as tk
+
+import pytest
+
+import main
+
+
+def start_calculator(monkeypatch, lazy):
+    """Calculator without bazaar updates, with or without lazy_widgets."""
+    monkeypatch.setattr(main, "lazy_widgets", lazy)
+    monkeypatch.setattr(main, "bazaar_auto_update", False)
+    monkeypatch.setattr(main, "bazaar_snapshot_file", None)
+    monkeypatch.setattr(main.Calculator, "fetch_prices", lambda self, cooldown_warning=True: None)
+    calculator = main.Calculator()
+    calculator.withdraw()
+    return calculator
+
+
+def widget_layout(calculator, var_key):
+    """Class, grid row and grid column of the widgets of a variable."""
+    layout = []
+    for widget in calculator.variables[var_key]["widget"]:
+        grid_info = widget.grid_info()
+        layout.append((widget.winfo_class(), grid_info.get("row"), grid_info.get("column")))
+    return layout
+
+
+def test_lazy_hidden_options_match_the_eager_widgets(monkeypatch):
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        pytest.skip("no display for Tkinter")
+    eager = start_calculator(monkeypatch, False)
+    lazy = start_calculator(monkeypatch, True)
+    try:
+        for switch_ID, var_keys in eager.hidden_options.items():
+            # the widgets of a lazy switch are only made when it is first shown
+            assert lazy.switches[switch_ID]["obj"] is None
+            assert all(lazy.variables[var_key].get("widget", []) == [] for var_key in var_keys)
+            for calculator in [eager, lazy]:
+                calculator.hk.toggleSwitch(switch_ID)
+            assert lazy.switches[switch_ID]["obj"] is not None
+            for var_key in var_keys:
+                assert widget_layout(lazy, var_key) == widget_layout(eager, var_key)
+                assert lazy.variables[var_key]["var"].get() == eager.variables[var_key]["var"].get()
+        # the variables exist from the start, so calculations work before the widgets are made
+        assert lazy.get_setup() == eager.get_setup()
+    finally:
+        eager.destroy()
+        lazy.destroy()
@@ -0,0 +1,36 @@
+import types
+
+import main
+import market_data
+import minion_engine as engine
+
+
+def test_stage_timers_warn_when_the_file_cannot_be_written(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(main, "stage_timers_file", str(tmp_path / "missing folder" / "stage_timers.json"))
+    outputs = {}
+    calculator = types.SimpleNamespace(bazaar_duration=0.0, bazaar_stats=market_data.BazaarStats(),
+                                       collect_addon_output=lambda name, output: outputs.update({name: output}))
+    main.Calculator.show_stage_timers(calculator, "ID", {"setup": 0.001}, False, 0.002)
+    assert "WARNING: Could not save stage timers" in capsys.readouterr().out
+    assert outputs["Stage Timers"].startswith("2.000 ms")
+
+
+def test_evaluate_setups_uses_one_price_snapshot(setups, prices, monkeypatch):
+    monkeypatch.setattr(main, "ah_auto_update", True)
+    old_prices = engine.PriceSnapshot(prices.prices, prices.last_updated, {"Griffin": {"min": 1000000, "max": 10000000}})
+    new_prices = engine.PriceSnapshot(prices.prices, prices.last_updated, {"Griffin": {"min": 1000000, "max": 90000000}})
+
+    class Calculator(main.Calculator):
+        def __init__(self):
+            self.prices = old_prices
+            self.rising_celsius_override = False
+
+        def get_prices(self):
+            # the refresher thread swaps in new prices right after they are read
+            prices, self.prices = self.prices, new_prices
+            return prices
+
+    griffin_setup = setups[2]
+    result, = Calculator().evaluate_setups([griffin_setup])
+    assert result.outputs == engine.evaluate(griffin_setup, old_prices, **Calculator().evaluate_settings(old_prices)).outputs
+    assert result["petProfit"] != engine.evaluate(griffin_setup, new_prices, **Calculator().evaluate_settings(new_prices))["petProfit"]
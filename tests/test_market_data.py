@@ -0,0 +1,235 @@
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import minion_engine as engine
+import market_data
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like the bazaar API on /bazaar and like the Coflnet item price API on /price/<ID>."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        return
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        self.server.clients.add(self.client_address)
+        time.sleep(self.server.delay)
+        parts = urllib.parse.urlsplit(self.path)
+        body, status = b"not found", 404
+        if parts.path == "/bazaar":
+            body, status = json.dumps(self.server.bazaar).encode(), 200
+        elif parts.path.startswith("/price/"):
+            tag = parts.path[len("/price/"):]
+            price = self.server.ah_prices.get(tag)
+            if tag.startswith("PET_"):
+                # pet prices go up with the searched pet level
+                price = price * int(urllib.parse.parse_qs(parts.query)["PetLevel"][0])
+            if price is not None:
+                body, status = json.dumps({"mode": price, "min": 1.0, "volume": 10}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def market_server():
+    """Local HTTP server in place of the bazaar and Coflnet APIs."""
+    orders = [{"amount": 640, "pricePerUnit": 3.2, "orders": 2}, {"amount": 64, "pricePerUnit": 3.0, "orders": 1}]
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.bazaar = {"success": True, "lastUpdated": 1700000000000,
+                     "products": {"ENCHANTED_COBBLESTONE": {"product_id": "ENCHANTED_COBBLESTONE", "buy_summary": orders, "sell_summary": orders[::-1],
+                                                            "quick_status": {"buyPrice": 3.2, "sellPrice": 3.0}},
+                                  "NOT_AN_ITEM": {"product_id": "NOT_AN_ITEM", "buy_summary": orders, "sell_summary": []}}}
+    server.ah_prices = {"POSTCARD": 1234567.0, "PET_GOLDEN_DRAGON": 1000.0}
+    server.delay = 0.0
+    server.paths = []
+    server.clients = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def stub_fetcher(server, **kwargs):
+    host, port = server.server_address
+    return market_data.MarketFetcher("tests", bazaar_url=f"http://{host}:{port}/bazaar", coflnet_url=f"http://{host}:{port}/price/", **kwargs)
+
+
+def test_market_fetcher_fetches_everything_over_kept_open_connections(market_server):
+    fetcher = stub_fetcher(market_server, max_connections=2)
+    pets = {"Golden Dragon": market_data.ah_pets["Golden Dragon"]}
+    try:
+        results = fetcher.fetch_all({"ENCHANTED_COBBLESTONE": {}}, ["POSTCARD"], pets)
+    finally:
+        fetcher.close()
+    assert results["bazaar"]["success"] is True
+    assert results["bazaar"]["lastUpdated"] == 1700000000000
+    assert results["bazaar"]["products"] == {"ENCHANTED_COBBLESTONE": {"buy_summary": [{"amount": 640, "pricePerUnit": 3.2}, {"amount": 64, "pricePerUnit": 3.0}],
+                                                                       "sell_summary": [{"amount": 64, "pricePerUnit": 3.0}, {"amount": 640, "pricePerUnit": 3.2}]}}
+    assert results["bazaar_stats"]["products"] == 1
+    assert results["ah"] == {"POSTCARD": 1234567.0}
+    assert results["pets"] == {"Golden Dragon": {"min": 1000.0, "max": 200000.0}}
+    assert len(market_server.paths) == 4
+    # every worker thread keeps its connection open between requests
+    assert len(market_server.clients) <= 2
+
+
+def test_market_fetcher_leaves_out_failed_requests(market_server, capsys):
+    fetcher = stub_fetcher(market_server)
+    try:
+        with pytest.raises(ValueError):
+            fetcher.fetch_ah_price("NOT_ON_AH")
+        results = fetcher.fetch_all({}, ["POSTCARD", "NOT_ON_AH"])
+    finally:
+        fetcher.close()
+    assert results["bazaar"]["products"] == {}
+    assert results["ah"] == {"POSTCARD": 1234567.0}
+    assert "ERROR: Could not finish API call to Coflnet for NOT_ON_AH" in capsys.readouterr().out
+
+
+def test_market_fetcher_times_out_and_recovers(market_server, capsys):
+    fetcher = stub_fetcher(market_server, max_connections=1, timeout=0.1)
+    try:
+        market_server.delay = 0.5
+        results = fetcher.fetch_all({"ENCHANTED_COBBLESTONE": {}})
+        assert results["bazaar"] is None
+        assert "ERROR: Could not finish API call" in capsys.readouterr().out
+        # the timed out connection is dropped, the next call opens a new one
+        market_server.delay = 0.0
+        results = fetcher.fetch_all({"ENCHANTED_COBBLESTONE": {}})
+        assert list(results["bazaar"]["products"]) == ["ENCHANTED_COBBLESTONE"]
+    finally:
+        fetcher.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 65536])
+def test_parse_bazaar_matches_json_loads_for_every_chunk_size(chunk_size):
+    orders = [{"amount": 64000, "pricePerUnit": 1234.5678901, "orders": 12}, {"amount": 1, "pricePerUnit": 1.5e-3, "orders": 1},
+              {"amount": 7, "pricePerUnit": -0.0, "orders": 1}]
+    data = {"success": True, "cause": "caf\u00e9 \"quoted\" {not} [an] object \u2603",
+            "lastUpdated": 1700000000123,
+            "products": {"ENCHANTED_COBBLESTONE": {"product_id": "ENCHANTED_COBBLESTONE", "sell_summary": orders, "buy_summary": orders[::-1],
+                                                   "quick_status": {"buyPrice": 3.2, "sellPrice": 3.0, "note": "} ] \\ \" {"}},
+                         "NOT_AN_ITEM": {"product_id": "NOT_AN_ITEM \u00e9\u2603", "buy_summary": orders * 50, "sell_summary": [],
+                                         "nested": [{"a": ["}", "]", "\\\"", {"b": []}]}]},
+                         "COBBLESTONE": {"product_id": "COBBLESTONE", "buy_summary": [], "sell_summary": orders[:1]},
+                         "EMPTY": {}},
+            "extra": [1, 2.5, "3", None, False, {"x": "y"}]}
+    body = json.dumps(data, indent=1, ensure_ascii=False).encode("utf-8")
+    item_IDs = {"ENCHANTED_COBBLESTONE", "COBBLESTONE"}
+    stats = {}
+    parsed = market_data.parse_bazaar(io.BytesIO(body), item_IDs, chunk_size=chunk_size, stats=stats)
+    reference = json.loads(body)
+    assert parsed == {"success": reference["success"], "cause": reference["cause"], "lastUpdated": reference["lastUpdated"],
+                      "products": {ID: {key: [{"amount": order["amount"], "pricePerUnit": order["pricePerUnit"]} for order in product[key]]
+                                        for key in ["buy_summary", "sell_summary"]}
+                                   for ID, product in reference["products"].items() if ID in item_IDs}}
+    assert (stats["body_bytes"], stats["products"]) == (len(body), 2)
+
+
+def top_percent_price(orders, top_percent):
+    """Scalar reference of the top percent average, the price of one action of one product, None without supply."""
+    top_amount = top_percent * sum([order["amount"] for order in orders])
+    if top_amount == 0:
+        return None
+    counter = top_amount
+    top_sum = 0
+    for order in orders:
+        if counter <= 0:
+            break
+        if counter >= order["amount"]:
+            top_sum += order["amount"] * order["pricePerUnit"]
+            counter -= order["amount"]
+        else:
+            top_sum += counter * order["pricePerUnit"]
+            counter = 0
+            break
+    top_percent_avg_price = top_sum / top_amount
+    top_price = orders[0]["pricePerUnit"]
+    if top_price / top_percent_avg_price >= 2.5:
+        return top_price
+    return top_percent_avg_price
+
+
+@pytest.mark.parametrize("top_percent", [0.1, 0.5, 1.0])
+def test_apply_bazaar_prices_matches_the_scalar_top_percent_average(top_percent):
+    rng = random.Random(9)
+    prices = engine.item_list_snapshot()
+    products = {}
+    for index, ID in enumerate(list(prices.prices)[:300]):
+        products[ID] = {}
+        for action in ["buy", "sell"]:
+            if index % 7 == 0:
+                # some products have one side without orders
+                orders = []
+            else:
+                orders = [{"amount": rng.choice([1, rng.randint(1, 71680)]), "pricePerUnit": round(rng.uniform(0.1, 1.0e6), 1)} for _ in range(rng.randint(1, 30))]
+            if index % 5 == 0 and orders:
+                # a bottom heavy order book, one expensive order on top of many cheap ones
+                orders = [{"amount": 1, "pricePerUnit": 1000.0}] + [{"amount": 1000, "pricePerUnit": 1.0}] * 5
+            products[ID][f"{action}_summary"] = orders
+    market_data.apply_bazaar_prices(prices, products, top_percent)
+    for ID, product in products.items():
+        for action in ["buy", "sell"]:
+            reference = top_percent_price(product[f"{action}_summary"], top_percent)
+            assert prices.prices[ID][f"{action}Price"] == pytest.approx(0.0 if reference is None else reference, rel=1e-9)
+
+
+def test_apply_bazaar_prices_counts_every_item_without_supply(capsys):
+    prices = engine.item_list_snapshot()
+    npc_item = next(ID for ID, item_prices in prices.prices.items() if "npc" in item_prices)
+    orders = [{"amount": 100, "pricePerUnit": 5.0}, {"amount": 10000, "pricePerUnit": 4.0}]
+    products = {npc_item: {"buy_summary": [], "sell_summary": []},
+                "ENCHANTED_COBBLESTONE": {"buy_summary": orders, "sell_summary": orders},
+                "CUSTOM": {"buy_summary": [], "sell_summary": orders[:1]},
+                "NOT_AN_ITEM": {"buy_summary": [], "sell_summary": []}}
+    stats = {}
+    market_data.apply_bazaar_prices(prices, products, 0.1, stats)
+    assert sorted(stats["no_supply"]) == sorted([f"{npc_item} buy", f"{npc_item} sell", "CUSTOM buy"])
+    assert stats["bottom_heavy"] == []
+    # one summary line per update instead of a line per item
+    assert capsys.readouterr().out == "BAZAAR: 3 prices without supply (1 without NPC price), 0 bottom heavy prices taking the top order price\n"
+    # three known products, each with a buy and a sell price
+    assert stats["processing_time_per_product"] == pytest.approx(stats["processing_time"] / 3)
+
+
+def test_snapshot_round_trip(tmp_path, capsys):
+    prices = engine.item_list_snapshot(1700000000.0)
+    for index, (ID, item_prices) in enumerate(prices.prices.items()):
+        if "buyPrice" in item_prices and "sellPrice" in item_prices:
+            item_prices["buyPrice"], item_prices["sellPrice"] = 1.5 * index + 0.1, 1.25 * index
+    for index, (ID, location) in enumerate(market_data.ah_prices.items()):
+        prices.prices[ID][location] = 1000.0 * index + 0.5
+    prices.pet_costs = {"Golden Dragon": {"min": 610000000.0, "max": 800000000.0}}
+    path = str(tmp_path / "bazaar_snapshot.json")
+    market_data.save_snapshot(prices, path)
+    loaded = market_data.load_snapshot(path)
+    assert loaded.last_updated == prices.last_updated
+    assert loaded.prices == prices.prices
+    assert loaded.pet_costs == prices.pet_costs
+    assert loaded.version != prices.version
+
+    # a snapshot of another version, a broken file and a missing file are ignored
+    with open(path) as f:
+        data = json.load(f)
+    data["version"] = market_data.snapshot_version + 1
+    with open(path, "w") as f:
+        json.dump(data, f)
+    assert market_data.load_snapshot(path) is None
+    assert "WARNING: Bazaar snapshot has an unknown version" in capsys.readouterr().out
+    with open(path, "w") as f:
+        f.write('{"version": 1, "lastUp')
+    assert market_data.load_snapshot(path) is None
+    assert "WARNING: Could not load bazaar snapshot" in capsys.readouterr().out
+    assert market_data.load_snapshot(str(tmp_path / "missing.json")) is None
@@ -0,0 +1,62 @@
+import pickle
+import shutil
+import sys
+
+import numpy as np
+
+import HSB_minion_data as md
+import minion_data_cache
+
+
+def write_data_module(folder, value):
+    (folder / "cache_test_data.py").write_text(f"import numpy as np\n\n"
+                                               f"table = {{np.int64(1): {{'ITEM': {value}}}}}\n\n\n"
+                                               f"def total():\n    return sum(table[1].values())\n")
+
+
+def load(folder, monkeypatch):
+    monkeypatch.delitem(sys.modules, "cache_test_data", raising=False)
+    return minion_data_cache.load_minion_data("cache_test_data", folder=str(folder))
+
+
+def test_cache_is_used_until_the_source_changes(tmp_path, monkeypatch, capsys):
+    write_data_module(tmp_path, 2.5)
+    built = load(tmp_path, monkeypatch)
+    assert "BOOTING: Building cache_test_data cache" in capsys.readouterr().out
+    assert (tmp_path / minion_data_cache.cache_file).is_file()
+
+    cached = load(tmp_path, monkeypatch)
+    assert capsys.readouterr().out == ""
+    assert cached is not built
+    assert cached.table == {1: {"ITEM": 2.5}}
+    assert type(next(iter(cached.table))) is np.int64
+    # functions are not cached, they come from the source file
+    assert cached.total() == 2.5
+
+    write_data_module(tmp_path, 4.0)
+    rebuilt = load(tmp_path, monkeypatch)
+    assert "BOOTING: Building cache_test_data cache" in capsys.readouterr().out
+    assert rebuilt.table == {1: {"ITEM": 4.0}}
+    assert load(tmp_path, monkeypatch).table == {1: {"ITEM": 4.0}}
+
+
+def test_cache_with_code_is_refused(tmp_path, monkeypatch, capsys):
+    write_data_module(tmp_path, 2.5)
+    key = minion_data_cache.cache_key(str(tmp_path / "cache_test_data.py"))
+    with open(tmp_path / minion_data_cache.cache_file, "wb") as file:
+        pickle.dump({"key": key, "data": {"table": shutil.rmtree}}, file)
+    module = load(tmp_path, monkeypatch)
+    output = capsys.readouterr().out
+    assert "WARNING: Could not load cache_test_data cache" in output
+    assert "BOOTING: Building cache_test_data cache" in output
+    assert module.table == {1: {"ITEM": 2.5}}
+
+
+def test_cached_minion_data_matches_the_import(tmp_path, monkeypatch):
+    shutil.copy(md.__file__, tmp_path / "HSB_minion_data.py")
+    for attempt in range(2):
+        monkeypatch.delitem(sys.modules, "HSB_minion_data")
+        cached = minion_data_cache.load_minion_data(folder=str(tmp_path))
+    for name in ["itemList", "minionList", "minionCosts", "upgrades_material_cost", "ah_items"]:
+        assert getattr(cached, name) == getattr(md, name)
+    assert cached.minionCostSum("Cobblestone", 5) == md.minionCostSum("Cobblestone", 5)
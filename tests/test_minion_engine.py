@@ -0,0 +1,355 @@
+import copy
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+import minion_engine as engine
+
+
+def test_evaluate_many_serial_matches_parallel(setups, prices):
+    serial = engine.evaluate_many(setups, prices, workers=1)
+    parallel = engine.evaluate_many(setups, prices, workers=2)
+    assert len(serial) == len(parallel) == len(setups)
+    for serial_result, parallel_result in zip(serial, parallel):
+        assert type(parallel_result) is engine.Result
+        assert parallel_result.outputs == serial_result.outputs
+        assert parallel_result.rates == serial_result.rates
+        assert parallel_result.rescale("Weeks", 3.0).outputs == serial_result.rescale("Weeks", 3.0).outputs
+
+
+@pytest.mark.parametrize("often_empty", [True, False])
+def test_rescale_matches_evaluate(setups, prices, often_empty):
+    for setup in setups:
+        setup = {**setup, "often_empty": often_empty}
+        for result in [engine.evaluate(setup, prices), engine.IncrementalEvaluator().evaluate(setup, prices)]:
+            rescaled = result.rescale("Weeks", 3.0)
+            full = engine.evaluate({**setup, "totaltimelength": "Weeks", "totaltimeamount": 3.0}, prices)
+            assert rescaled.outputs.keys() == full.outputs.keys()
+            for key, value in full.outputs.items():
+                if isinstance(value, dict) and key != "notes":
+                    assert rescaled[key] == pytest.approx(value, rel=1e-12), key
+                elif isinstance(value, float):
+                    assert rescaled[key] == pytest.approx(value, rel=1e-12), key
+                else:
+                    assert rescaled[key] == value, key
+            # rescaling back gives the original outputs
+            assert rescaled.rescale(setup["totaltimelength"], setup["totaltimeamount"])["totalProfit"] == pytest.approx(result["totalProfit"], rel=1e-12)
+
+
+def test_incremental_evaluator_matches_evaluate(setups, prices):
+    # each edit is applied on top of the previous ones, so the evaluator reuses stages across many kinds of changes
+    edits = [{"totaltimeamount": 3.0}, {"fuel": "Enchanted Lava Bucket"}, {"upgrade2": "Diamond Spreading"}, {"afk": True},
+             {"mayor": "Derpy"}, {"sellLoc": "Bazaar"}, {"chest": "Large", "often_empty": False}, {"levelingpet": "Griffin"},
+             {"beacon": 3}, {"miniontier": 7}, {"upgrade1": "Super Compactor 3000"}, {"totaltimelength": "Hours"}]
+    evaluator = engine.IncrementalEvaluator()
+    for setup in setups:
+        for edit in [{}] + edits:
+            setup = {**setup, **edit}
+            incremental = evaluator.evaluate(setup, prices)
+            full = engine.evaluate(setup, prices)
+            assert incremental.outputs == full.outputs
+            assert incremental.rates == full.rates
+        # a change of only the total time does not run every stage again
+        evaluator.evaluate({**setup, "totaltimeamount": 5.0}, prices)
+        assert 0 < len(evaluator.last_run) < len(engine.stages)
+
+
+def test_result_cache_removes_the_least_recently_used_result(setups, prices):
+    results = [engine.evaluate(setup, prices) for setup in setups[:4]]
+    cache = engine.ResultCache(max_size=3)
+    for key, result in zip("abc", results):
+        cache.put(key, result)
+    # reading "a" makes "b" the least recently used
+    assert cache.get("a") is results[0]
+    cache.put("d", results[3])
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == [results[0], results[2], results[3]]
+    # storing a key again replaces its Result without removing another one
+    cache.put("c", results[1])
+    assert len(cache.results) == 3
+    assert cache.get("c") is results[1]
+    assert (cache.hits, cache.misses) == (5, 1)
+    cache.clear()
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (5, 2)
+
+
+def test_stage_timers_time_every_stage_without_changing_the_result(setups, prices):
+    for setup in setups:
+        timers = {}
+        timed = engine.evaluate(setup, prices, timers=timers)
+        untimed = engine.evaluate(setup, prices, timers=None)
+        assert list(timers) == [stage_name for stage_name, stage in engine.stages]
+        assert all(seconds >= 0 for seconds in timers.values())
+        assert timed.outputs == untimed.outputs
+        assert timed.rates == untimed.rates
+    # the incremental evaluator only times the stages that ran again
+    evaluator = engine.IncrementalEvaluator()
+    evaluator.evaluate(setups[0], prices)
+    timers = {}
+    evaluator.evaluate({**setups[0], "totaltimeamount": 5.0}, prices, timers=timers)
+    assert list(timers) == evaluator.last_run
+
+
+def test_item_columns_match_the_item_list():
+    assert engine.item_IDs == list(engine.md.itemList)
+    for ID, item_data in engine.md.itemList.items():
+        index = engine.item_index[ID]
+        if "xp" in item_data:
+            ((xp_type, xp_value),) = item_data["xp"].items()
+            assert engine.xp_types[engine.item_xp_type_list[index]] == xp_type
+            assert engine.item_xp_value_list[index] == xp_value
+        else:
+            assert (engine.item_xp_type_list[index], engine.item_xp_value_list[index]) == (-1, 0.0)
+
+
+@pytest.mark.parametrize("pet_xp_boost, xp_boost_pet_item", [(1.0, 1.0), (1.35, 1.0), (1.0, 1.4), (0.3, 1.0)])
+def test_dragon_xp_batch_matches_chained_dragon_xp(pet_xp_boost, xp_boost_pet_item):
+    # skill xp per setup, from below level 100 to past level 200, each skill starts from the left over xp of the previous one
+    gained_xp = np.array([[0.0, 0.0], [1.0e6, 5.0e5], [2.0e7, 3.0e7], [1.0e8, 7.5e7], [4.0e8, 1.0]])
+    start_xp = np.array([0.0, 1.0e6, engine.dragon_lvl_100_xp - 1.0, 1.5e8, 2.0e8])
+    batch_pet_xp, batch_left_over = engine.dragon_xp_batch(gained_xp, pet_xp_boost, xp_boost_pet_item, start_xp)
+    for setup_index in range(len(gained_xp)):
+        left_over_pet_xp = start_xp[setup_index]
+        for skill in range(gained_xp.shape[1]):
+            gained_pet_xp, left_over_pet_xp = engine.dragon_xp(float(gained_xp[setup_index, skill]), left_over_pet_xp, pet_xp_boost, xp_boost_pet_item)
+            assert batch_pet_xp[setup_index, skill] == pytest.approx(gained_pet_xp, rel=1e-12)
+        assert batch_left_over[setup_index] == pytest.approx(left_over_pet_xp, rel=1e-12)
+
+
+def test_dragon_xp_accepts_single_numbers_and_arrays():
+    scalar = engine.dragon_xp(3.0e7, 1.0e6, 1.2, 1.0)
+    zero_dim_pet_xp, zero_dim_left_over = engine.dragon_xp_batch(3.0e7, 1.2, 1.0, 1.0e6)
+    assert np.shape(zero_dim_pet_xp) == np.shape(zero_dim_left_over) == ()
+    assert (float(zero_dim_pet_xp), float(zero_dim_left_over)) == pytest.approx(scalar, rel=1e-12)
+    array_pet_xp, array_left_over = engine.dragon_xp(np.array([3.0e7, 1.0e5]), 1.0e6, 1.2, 1.0)
+    assert array_pet_xp == pytest.approx([scalar[0], engine.dragon_xp(1.0e5, 1.0e6, 1.2, 1.0)[0]], rel=1e-12)
+    assert array_left_over[0] == pytest.approx(scalar[1], rel=1e-12)
+
+
+@pytest.mark.parametrize("pets", [{"levelingpet": "Golden Dragon", "petxpboost": "Epic Combat Exp Boost"},
+                                  {"levelingpet": "Griffin", "expsharepet": "Jade Dragon", "taming": 50.0, "expshareitem": True}])
+def test_pet_leveling_sweep_matches_evaluate(prices, pets):
+    pet_costs = {"Golden Dragon": {"min": 610000000, "max": 800000000}, "Jade Dragon": {"min": 580000000, "max": 720000000},
+                 "Griffin": {"min": 1000000, "max": 10000000}}
+    setup = {**engine.default_setup, "minion": "Tarantula", "miniontier": 11, "often_empty": True, "totaltimeamount": 2.0, "totaltimelength": "Weeks", **pets}
+    amounts = np.arange(1, 32)
+    sweep = engine.pet_leveling_sweep(setup, prices, amounts, pet_costs=pet_costs)
+    for amount, pet_profit in zip(amounts, sweep):
+        assert pet_profit == pytest.approx(engine.evaluate({**setup, "amount": int(amount)}, prices, pet_costs=pet_costs)["petProfit"], rel=1e-12)
+    # scales large enough to level the dragon past level 100 and 200, against the single number pets_stage()
+    xp_scales = np.geomspace(1.0, 1.0e6, 13)
+    sweep = engine.pet_leveling_sweep(setup, prices, xp_scales, pet_costs=pet_costs)
+    for xp_scale, pet_profit in zip(xp_scales, sweep):
+        s = engine.initial_state(setup, prices, pet_costs)
+        for stage_name, stage in engine.stages:
+            if stage_name == "pets":
+                break
+            stage(setup, s["prices"], s)
+        s["xp"] = {skill: amount * float(xp_scale) for skill, amount in s["xp"].items()}
+        engine.pets_stage(setup, s["prices"], s)
+        assert pet_profit == pytest.approx(s["petProfit"], rel=1e-12)
+    assert not np.allclose(np.diff(sweep / xp_scales), 0.0)
+
+
+def test_overlay_matches_a_new_snapshot_and_leaves_the_base_unchanged(prices):
+    base = engine.PriceSnapshot(copy.deepcopy(prices.prices))
+    setup = {**engine.default_setup, "mayor": "Derpy", "bazaar_sell_type": "Insta Sell"}
+    transactions = [(action, location) for action in ["buy", "sell"] for location in ["npc", "bazaar", "custom", "best"]]
+    base_tables = {transaction: dict(base.price_table(setup, *transaction)) for transaction in transactions}
+    base_prices = copy.deepcopy(base.prices)
+    overrides = {"COBBLESTONE": {"npc": 5.0}, "ENCHANTED_COBBLESTONE": {"sellPrice": 200.0}, "INFERNO_FUEL": {"custom": 1000.0}}
+    overlay = base.bind(setup).overlay(overrides)
+    # a new snapshot with the same prices, without any tables built from the base
+    reference = engine.PriceSnapshot({ID: {**base_prices.get(ID, {}), **overrides.get(ID, {})} for ID in base_prices.keys() | overrides.keys()})
+    for transaction in transactions:
+        assert overlay.price_table(setup, *transaction) == reference.price_table(setup, *transaction)
+    assert overlay.bound_setup is setup
+    assert overlay.version != base.version
+    assert base.overlay(overrides).prices is overlay.prices
+    # the base snapshot and its tables are not changed
+    assert base.prices == base_prices
+    assert {transaction: base.price_table(setup, *transaction) for transaction in transactions} == base_tables
+    # an Inferno evaluation overlays the fuel price without changing the prices it was given
+    inferno = {**engine.default_setup, "minion": "Inferno", "miniontier": 11, "fuel": "Inferno Minion Fuel", "often_empty": True}
+    engine.evaluate(inferno, base)
+    assert base.prices == base_prices
+
+
+def uncached_price(setup, prices, ID, action, location, force):
+    """Reference of get_price() without price tables, like getPrice() before the tables were added."""
+    multiplier = 1
+    if location == "bazaar":
+        if action == "buy":
+            location = engine.bazaar_buy_types[setup["bazaar_buy_type"]]
+        elif action == "sell":
+            location = engine.bazaar_sell_types[setup["bazaar_sell_type"]]
+            if setup["bazaar_taxes"]:
+                bazaar_tax = 0.0125 - 0.00125 * setup["bazaar_flipper"]
+                if setup["mayor"] == "Derpy":
+                    bazaar_tax *= 4
+                multiplier = 1 - bazaar_tax
+    elif location == "npc" and action == "buy":
+        multiplier = 2
+    if ID not in prices:
+        return 0
+    if location in prices[ID]:
+        return multiplier * prices[ID][location]
+    elif force:
+        return 0
+    elif "npc" in prices[ID]:
+        return multiplier * prices[ID]["npc"]
+    elif "custom" in prices[ID]:
+        return prices[ID]["custom"]
+    return 0
+
+
+def test_price_tables_match_the_uncached_lookup(prices):
+    item_prices = copy.deepcopy(prices.prices)
+    # bazaar prices on every item that has a bazaar price, and an item without any price
+    for index, ID in enumerate(item_prices):
+        if "buyPrice" in item_prices[ID]:
+            item_prices[ID]["buyPrice"], item_prices[ID]["sellPrice"] = 3.0 * index + 1.0, 2.0 * index
+    item_prices["NO_PRICE_ITEM"] = {}
+    snapshot = engine.PriceSnapshot(item_prices)
+    IDs = list(item_prices) + ["NOT_AN_ITEM"]
+    # taxes, Bazaar Flipper and mayor only matter together, so not every combination is needed
+    settings = itertools.product(engine.bazaar_buy_types, engine.bazaar_sell_types, [(True, 0, "Derpy"), (True, 5, "None"), (False, 0, "Derpy")])
+    for buy_type, sell_type, (taxes, flipper, mayor) in settings:
+        setup = {**engine.default_setup, "bazaar_buy_type": buy_type, "bazaar_sell_type": sell_type, "bazaar_taxes": taxes, "bazaar_flipper": flipper, "mayor": mayor}
+        bound = snapshot.bind(setup)
+        for action, location, force in itertools.product(["buy", "sell"], ["npc", "bazaar", "custom", "best"], [False, True]):
+            reference = [uncached_price(setup, item_prices, ID, action, location, force) for ID in IDs]
+            assert [engine.get_price(setup, snapshot, ID, action, location, force) for ID in IDs] == reference
+            assert [engine.get_price(setup, bound, ID, action, location, force) for ID in IDs] == reference
+
+
+def reference_compact(items, upgrades_types, notes):
+    """Reference of the compactor transforms, the item loops of compactors_stage() before the transforms were compiled."""
+    compacted_items = []
+    if "compact" in upgrades_types:
+        for item, amount in list(items.items()):
+            if item in engine.md.compactorList:
+                compact_amount = int(amount / engine.md.compactorList[item]["per"])
+                if compact_amount == 0:
+                    continue
+                compact_amount *= engine.md.compactorList[item].get("amount", 1)
+                left_over = amount % engine.md.compactorList[item]["per"]
+                if left_over == 0.0:
+                    del items[item]
+                else:
+                    items[item] = left_over
+                items[engine.md.compactorList[item]["makes"]] = compact_amount
+                compacted_items.append({"from": item, **engine.md.compactorList[item]})
+    if "enchant" in upgrades_types:
+        found_enchantable = True
+        safety_lock = 0
+        while found_enchantable is True:
+            safety_lock += 1
+            if safety_lock >= 10:
+                engine.catch_warning(notes, "While-loop overflow, super compactor 3000")
+                break
+            found_enchantable = False
+            for item, amount in list(items.items()):
+                if item in engine.md.enchanterList:
+                    enchanted_name = engine.md.enchanterList[item]["makes"]
+                    enchanted_amount = int(amount / engine.md.enchanterList[item]["per"])
+                    if enchanted_amount == 0:
+                        continue
+                    enchanted_amount *= engine.md.enchanterList[item].get("amount", 1)
+                    left_over = amount % engine.md.enchanterList[item]["per"]
+                    if left_over == 0.0:
+                        del items[item]
+                    else:
+                        items[item] = left_over
+                    items[enchanted_name] = enchanted_amount
+                    compacted_items.append({"from": item, **engine.md.enchanterList[item]})
+                    if enchanted_name in engine.md.enchanterList:
+                        found_enchantable = True
+    return compacted_items
+
+
+@pytest.mark.parametrize("upgrades, upgrades_types", [(("Compactor", "None"), ["compact"]), (("Super Compactor 3000", "None"), ["enchant"]),
+                                                      (("Compactor", "Super Compactor 3000"), ["compact", "enchant"])])
+def test_compactor_transforms_match_the_item_loops(upgrades, upgrades_types):
+    rng = random.Random(14)
+    compactable = sorted(set(engine.md.compactorList) | set(engine.md.enchanterList) | {data["makes"] for data in engine.md.enchanterList.values()})
+    setup = {**engine.default_setup, "upgrade1": upgrades[0], "upgrade2": upgrades[1]}
+    for _ in range(200):
+        IDs = rng.sample(compactable, 6) + ["ROTTEN_FLESH"]
+        items = {ID: rng.choice([rng.randint(0, 2000000), rng.uniform(0.0, 500000.0), 160.0 * rng.randint(1, 500)]) for ID in IDs}
+        reference_items, reference_notes = dict(items), {}
+        reference_records = reference_compact(reference_items, upgrades_types, reference_notes)
+        compacted_items, notes = [], {}
+        for transforms, chained in engine.compactor_plan(setup, upgrades_types):
+            engine.apply_transforms(items, transforms, chained, compacted_items, notes)
+        assert list(items.items()) == list(reference_items.items())
+        assert compacted_items == reference_records
+        assert notes == reference_notes
+
+
+def minion_cost_sum(setup, prices, minion_type, minion_tier):
+    """Reference of the cumulative minion cost, the recipe prices of every tier up to minion_tier added up with uncached_price()."""
+    coins = 0.0
+    extra = {}
+    for tier in range(1, minion_tier + 1):
+        for cost_type, amount in engine.md.extraMinionCosts.get(minion_type, {}).get(tier, {}).items():
+            if cost_type == "COINS":
+                coins += amount
+            else:
+                material = cost_type.replace("_", " ").title()
+                extra[material] = extra.get(material, 0) + amount
+        for item, amount in engine.md.minionCosts[minion_type][tier].items():
+            coins += amount * uncached_price(setup, prices.prices, item, "buy", "bazaar", False)
+    return coins, extra
+
+
+@pytest.fixture
+def bazaar_prices(prices):
+    """Item list prices with different bazaar prices on every bazaar item."""
+    item_prices = copy.deepcopy(prices.prices)
+    for index, ID in enumerate(item_prices):
+        if "buyPrice" in item_prices[ID]:
+            item_prices[ID]["buyPrice"], item_prices[ID]["sellPrice"] = 3.0 * index + 1.0, 2.0 * index
+    return engine.PriceSnapshot(item_prices)
+
+
+@pytest.mark.parametrize("buy_type", ["Buy Order", "Insta Buy"])
+def test_tier_cost_tables_match_minion_cost_sum(bazaar_prices, buy_type):
+    setup = {**engine.default_setup, "bazaar_buy_type": buy_type}
+    for minion_type, costs in engine.md.minionCosts.items():
+        tiered_coin_cost, tiered_extra_cost = engine.tier_costs(setup, bazaar_prices, minion_type)
+        assert list(tiered_coin_cost) == list(costs)
+        for tier in costs:
+            coins, extra = minion_cost_sum(setup, bazaar_prices, minion_type, tier)
+            assert tiered_coin_cost[tier] == pytest.approx(coins, rel=1e-12)
+            assert tiered_extra_cost.get(tier, {}) == extra
+        # the tables are built once per snapshot and bazaar buy setting
+        assert engine.tier_costs(setup, bazaar_prices, minion_type)[0] is tiered_coin_cost
+
+
+@pytest.mark.parametrize("postcard_price", [0.0, 2500000.0])
+def test_free_will_tables_match_the_scalar_solve(bazaar_prices, postcard_price):
+    prices = bazaar_prices.overlay({"POSTCARD": {"custom": postcard_price}})
+    free_will_price = uncached_price(engine.default_setup, prices.prices, "FREE_WILL", "buy", "bazaar", False)
+    final_postcard_cost = postcard_price if postcard_price != 0 else free_will_price
+    for minion_type, costs in engine.md.minionCosts.items():
+        for minion_tier in costs:
+            setup = {**engine.default_setup, "minion": minion_type, "miniontier": minion_tier, "amount": 3, "free_will": True}
+            # Free Will cost per tier the Free Will can be applied on, with E(Free Wills needed) = 1 / p
+            tiered_free_will = {}
+            for tier in range(1, minion_tier + 1):
+                free_wills_needed = 1 / (0.5 + 0.04 * (tier - 1))
+                tier_cost = minion_cost_sum(setup, prices, minion_type, tier)[0]
+                tiered_free_will[tier] = (free_wills_needed - 1) * (tier_cost - final_postcard_cost) + free_wills_needed * free_will_price
+            optimal = min(tiered_free_will, key=tiered_free_will.get)
+            result = engine.evaluate(setup, prices)
+            if not np.isclose(tiered_free_will[optimal], tiered_free_will[result["optimal_tier_free_will"]], rtol=1e-12, atol=0):
+                assert result["optimal_tier_free_will"] == optimal
+            assert result["freewillcost"] == pytest.approx(tiered_free_will[optimal] * 3, rel=1e-12)
+    # the table has every tier of every minion, with infinite costs for missing tiers
+    table = engine.free_will_table(engine.default_setup, prices)
+    assert table["free_will_cost"].shape == (len(engine.md.minionCosts), len(table["tiers"]))
+    assert table["optimal_tier"][table["minion_index"]["Cobblestone"]] in engine.md.minionCosts["Cobblestone"]
@@ -0,0 +1,62 @@
+import copy
+
+import numpy as np
+import pytest
+
+import minion_engine as engine
+import minion_optimizer as optimizer
+
+
+@pytest.mark.parametrize("minion, tier", [("Snow", 11), ("Cobblestone", 5)])
+def test_pruned_search_finds_the_unpruned_best_setup(prices, minion, tier):
+    base = {**engine.default_setup, "minion": minion, "miniontier": tier, "often_empty": True}
+    pruned_setup, pruned_result, pruned_searched = optimizer.optimize_upgrades(base, prices, 3e5, prune=True)
+    full_setup, full_result, full_searched = optimizer.optimize_upgrades(base, prices, 3e5, prune=False)
+    assert pruned_searched < full_searched
+    assert pruned_result["totalProfit"] == full_result["totalProfit"]
+    assert pruned_setup == full_setup
+
+
+def test_pruning_keeps_slower_fuels_with_a_compactor(prices):
+    # worthless diamond blocks, so the diamonds that are not compacted are the only profit and more speed can lower the profit
+    item_prices = copy.deepcopy(prices.prices)
+    item_prices["DIAMOND_BLOCK"] = {location: 0.0 for location in item_prices["DIAMOND_BLOCK"]}
+    compact_prices = engine.PriceSnapshot(item_prices)
+    base = {**engine.default_setup, "minion": "Diamond", "miniontier": 11, "often_empty": True}
+
+    def best_compactor_profit(prune):
+        setups = [setup for setup in optimizer.candidate_setups(base, compact_prices, 1e9, prune)
+                  if {setup["upgrade1"], setup["upgrade2"]} == {"Compactor", "None"}]
+        return max(result["totalProfit"] for result in engine.evaluate_many(setups, compact_prices))
+
+    assert best_compactor_profit(True) == best_compactor_profit(False)
+
+
+def brute_force_frontier(scores):
+    """Indices of the rows of scores (higher is better on every axis) that no other row dominates, of equal rows only the first."""
+    frontier = []
+    for index, score in enumerate(scores):
+        dominated = False
+        for other_index, other in enumerate(scores):
+            if other_index != index and all(other >= score):
+                if any(other > score) or other_index < index:
+                    dominated = True
+                    break
+        if not dominated:
+            frontier.append(index)
+    return frontier
+
+
+@pytest.mark.parametrize("use_fill_time", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_pareto_frontier_matches_brute_force(seed, use_fill_time):
+    rng = np.random.default_rng(seed)
+    amount = int(rng.integers(1, 300))
+    # few distinct values, so there are many ties on every axis
+    profits = rng.integers(0, 12, amount).astype(float)
+    costs = rng.integers(0, 12, amount).astype(float)
+    fill_times = rng.integers(0, 12, amount).astype(float) if use_fill_time else None
+    axes = [-costs, profits] + ([fill_times] if use_fill_time else [])
+    frontier = optimizer.pareto_frontier(profits, costs, fill_times)
+    assert sorted(frontier.tolist()) == brute_force_frontier(np.column_stack(axes))
+    assert np.all(np.diff(costs[frontier]) >= 0)
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import main
+import minion_engine as engine
+import minion_optimizer
+import official_calculator_add_ons as addons
+
+
+class BackgroundCalculator(main.Calculator):
+    """Calculator without a window, the after() callbacks are run by run_after()."""
+
+    def __init__(self, setup, prices):
+        self.setup = setup
+        self.prices = prices
+        self.rising_celsius_override = False
+        self.variables = {key: {"display": key} for key in minion_optimizer.search_inputs}
+        self.outputs = {}
+        self.callbacks = []
+
+    def get_setup(self):
+        return dict(self.setup)
+
+    def collect_addon_output(self, output_name, output_str):
+        self.outputs[output_name] = output_str
+
+    def after(self, ms, func):
+        self.callbacks.append(func)
+
+    def run_after(self):
+        while self.callbacks:
+            time.sleep(0.01)
+            self.callbacks.pop(0)()
+
+
+@pytest.mark.parametrize("pets", [{}, {"levelingpet": "Golden Dragon", "petxpboost": "Epic Combat Exp Boost", "often_empty": False, "totaltimeamount": 30.0, "totaltimelength": "Weeks"}])
+def test_inferno_minion_loop_matches_evaluating_every_amount(prices, pets, capsys):
+    setup = {**engine.default_setup, "often_empty": True, "free_will": True, **pets}
+    calculator = BackgroundCalculator(setup, prices)
+    addons.inferno_minion_loop(calculator)
+    assert calculator.rising_celsius_override is False
+    printed = capsys.readouterr().out.splitlines()
+    printed = printed[printed.index("Tier, Amount : bad luck profit , minion cost, true average profit") + 1:][:10]
+
+    # every tier and amount evaluated on its own, in the order of the loop
+    bad_luck_items = ["INFERNO_APEX", "REAPER_PEPPER", "INFERNO_VERTEX", "GABAGOOL_THE_FISH"]
+    pet_costs = calculator.evaluate_settings(prices)["pet_costs"]
+    rows = []
+    for tier in range(1, 12):
+        for amount in range(1, 32):
+            inferno = {**setup, "minion": "Inferno", "fuel": "Inferno Minion Fuel", "chest": "XX-Large", "miniontier": tier, "amount": amount}
+            result = engine.evaluate(inferno, prices, pet_costs=pet_costs, compact_tolerance=main.compact_tolerance, rising_celsius_override=True)
+            bad_luck_profit = result["totalProfit"] - sum(result["itemtypeProfit"].get(item, 0.0) for item in bad_luck_items)
+            rows.append((tier, amount, result["totalProfit"], bad_luck_profit, result["setupcost"] + result["freewillcost"]))
+    rows = [row for row in rows if row[4] < 10000000000]
+    ranked = sorted(rows, key=lambda row: -row[3])[:10]
+    assert len(printed) == len(ranked)
+    for line, (tier, amount, profit, bad_luck_profit, cost) in zip(printed, ranked):
+        position, values = line.split(" : ")
+        assert position == f"{tier}, {amount}"
+        assert values == f"{calculator.reduced_number(bad_luck_profit)} , {calculator.reduced_number(cost)} , {calculator.reduced_number(profit)}"
+
+
+def test_upgrade_optimizer_runs_in_the_background(prices, monkeypatch):
+    monkeypatch.setattr(addons, "optimizer_budget", 3e5)
+    setup = {**engine.default_setup, "minion": "Snow", "miniontier": 11, "often_empty": True}
+    calculator = BackgroundCalculator(setup, prices)
+    # the search waits until the add-on has returned to the GUI thread
+    release = threading.Event()
+    optimize_upgrades = minion_optimizer.optimize_upgrades
+    monkeypatch.setattr(minion_optimizer, "optimize_upgrades", lambda *args, **kwargs: release.wait() and optimize_upgrades(*args, **kwargs))
+    addons.upgrade_optimizer(calculator)
+    assert calculator.outputs["Upgrade Optimizer"] == "Running"
+    addons.upgrade_optimizer(calculator)
+    assert calculator.outputs["Upgrade Optimizer"] == "Still running"
+    release.set()
+    calculator.run_after()
+    assert "Upgrade Optimizer" not in addons.background_tasks
+    best_setup, best_result, searched = optimize_upgrades(setup, prices, 3e5, **calculator.evaluate_settings(prices))
+    chosen = ", ".join(str(best_setup[key]) for key in minion_optimizer.search_inputs)
+    assert calculator.outputs["Upgrade Optimizer"] == f"{chosen}: {calculator.reduced_number(best_result['totalProfit'])} profit"
+
+
+def test_profit_frontier_runs_in_the_background(prices, capsys):
+    setup = {**engine.default_setup, "often_empty": True}
+    calculator = BackgroundCalculator(setup, prices)
+    addons.profit_frontier(calculator)
+    assert calculator.outputs["Profit Frontier"] == "Running"
+    calculator.run_after()
+    loop_setups = [{**setup, "minion": minion, "miniontier": tier, "fuel": fuel} for minion, minion_data in engine.md.minionList.items() if minion != "Custom"
+                   for tier in minion_data["speed"] for fuel in engine.md.fuel_options]
+    frontier = minion_optimizer.explore_frontier(loop_setups, prices, use_fill_time=addons.frontier_fill_time, **calculator.evaluate_settings(prices))
+    assert calculator.outputs["Profit Frontier"] == f"{len(frontier)} of {len(loop_setups)} setups, see the console"
+    printed = capsys.readouterr().out.splitlines()
+    printed = printed[printed.index(f"Profit Frontier: {len(frontier)} of {len(loop_setups)} setups"):]
+    assert printed[2:2 + len(frontier)] == [f"{setup['minion']}, {setup['miniontier']}, {setup['fuel']} : {calculator.reduced_number(result['totalProfit'])} , {calculator.reduced_number(cost)}"
+                                            for setup, result, cost in frontier]
+
+
+def test_background_errors_are_shown(capsys):
+    calculator = BackgroundCalculator({}, None)
+    addons.run_in_background(calculator, "Failing Add-on", lambda: 1 / 0, print)
+    calculator.run_after()
+    assert calculator.outputs["Failing Add-on"] == "Failed, see the console"
+    assert "ERROR: Failing Add-on failed" in capsys.readouterr().out
+    assert "Failing Add-on" not in addons.background_tasks